@@ -10,10 +10,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 import uuid
 
-from core.database import get_db, Task
+from core.database import get_db, AsyncSessionLocal, Task
+from core.task_codec import encode_payload
 from core import crud
-from services.chrome_manager import chrome_manager
+from services.chrome_manager import chrome_manager, profile_for_task
 from services.facebook_automator import FacebookAutomator
+from services.task_progress import task_progress
+from services.task_scheduler import task_scheduler, priority_for
+from services.task_cancellation import TaskCancelled, task_cancellation, release_browser_session
 from services.activity_logger import log_account_check, log_chrome_session
 
 router = APIRouter(prefix="/api/accounts", tags=["account-checker"])
@@ -27,31 +31,64 @@ class CheckMultipleAccountsRequest(BaseModel):
     account_ids: List[int]
 
 
-async def check_account_task(account_id: int, db: AsyncSession):
-    """Background task to check account status"""
+async def create_check_task(db: AsyncSession, account, priority: str) -> Task:
+    """Pending check_account task, run by the task scheduler in the given lane"""
+    task = Task(
+        task_id=f"check_{account.uid}_{uuid.uuid4().hex[:8]}",
+        account_id=account.id,
+        task_type='check_account',
+        task_name=f'Check Account {account.uid}',
+        priority=priority,
+        status='pending',
+        progress=0
+    )
+    db.add(task)
+    await db.commit()
+    task_progress.track(task.task_id, account.id, 'check_account')
+    return task
+
+
+async def run_check_account(task_id: str, account_id: int, params: dict):
+    """Task scheduler handler for check_account tasks"""
+    async with AsyncSessionLocal() as db:
+        await check_account_task(account_id, db, task_id=task_id)
+
+
+async def check_account_task(account_id: int, db: AsyncSession, task_id: Optional[str] = None):
+    """Check account status (runs the task `task_id`, or creates one)"""
     account = None
     session = None
     task = None
+    cancel_token = task_cancellation.get(task_id)
     
     try:
         # Get account
         account = await crud.get_account(db, account_id)
         if not account:
+            if task_id:
+                await task_progress.finish(task_id, 'failed', error_message=f"Account {account_id} not found")
             return
         
-        # Create task record
-        task_id = f"check_{account.uid}_{uuid.uuid4().hex[:8]}"
-        task = Task(
-            task_id=task_id,
-            account_id=account.id,
-            task_type='check_account',
-            task_name=f'Check Account {account.uid}',
-            status='processing',
-            progress=0,
-            started_at=datetime.now()
-        )
-        db.add(task)
+        if task_id:
+            task = await crud.get_task(db, task_id)
+            task.status = 'processing'
+            task.started_at = task.started_at or datetime.now()
+        else:
+            # Create task record
+            task_id = f"check_{account.uid}_{uuid.uuid4().hex[:8]}"
+            task = Task(
+                task_id=task_id,
+                account_id=account.id,
+                task_type='check_account',
+                task_name=f'Check Account {account.uid}',
+                status='processing',
+                progress=0,
+                started_at=datetime.now()
+            )
+            db.add(task)
         await db.commit()
+        task_progress.track(task_id, account.id, 'check_account')
+        task_progress.update(task_id, progress=0, status='processing', persist=False)
         
         # Get proxy if available
         proxy = None
@@ -66,30 +103,40 @@ async def check_account_task(account_id: int, db: AsyncSession):
                     'protocol': proxy_obj.protocol
                 }
         
-        # Create Chrome session
-        session = await chrome_manager.create_session(
-            account_id=account.id,
-            account_uid=account.uid,
-            cookies=account.cookies,
-            email=account.email,
-            password=account.password,
-            two_fa_key=account.two_fa_key,
-            proxy=proxy,
-            headless=True
-        )
+        # Reuse the account's open session (recycled if over its limits), else create one
+        session = await chrome_manager.get_session(account.id)
+        if not session:
+            session = await chrome_manager.create_session(
+                account_id=account.id,
+                account_uid=account.uid,
+                cookies=account.cookies,
+                email=account.email,
+                password=account.password,
+                two_fa_key=account.two_fa_key,
+                proxy=proxy,
+                headless=True,
+                profile=profile_for_task('check_account')
+            )
+            
+            # Log Chrome session creation
+            await log_chrome_session(db, account.id, "create", headless=True)
         
-        # Log Chrome session creation
-        await log_chrome_session(db, account.id, "create", headless=True)
+        if cancel_token:
+            # Cancelling closes the session (and its proxy) so the check stops right away
+            cancel_token.on_cancel(lambda: release_browser_session(account_id))
+            cancel_token.check()
         
-        # Update task progress
-        task.progress = 30
-        await db.commit()
+        # Progress lives in memory (pushed to clients, flushed write-behind)
+        task_progress.update(task_id, progress=30, message='Checking account')
         
         # Create automator
         automator = FacebookAutomator(session)
         
-        # Check account status
-        result = await automator.check_account_live()
+        # Check account status (the session is not recycled while in use)
+        with session.use():
+            result = await automator.check_account_live()
+        if cancel_token:
+            cancel_token.check()
         
         # Update account status in database
         if result['status'] == 'live':
@@ -109,9 +156,11 @@ async def check_account_task(account_id: int, db: AsyncSession):
         task.status = 'completed'
         task.progress = 100
         task.completed_at = datetime.now()
-        task.result = str(result)
+        task.result = encode_payload(result)
+        task.screenshot = result.get('screenshot')
         
         await db.commit()
+        await task_progress.finish(task_id, 'completed', result=result, persist=False)
         
         # Log account check result
         await log_account_check(
@@ -122,27 +171,41 @@ async def check_account_task(account_id: int, db: AsyncSession):
         )
         
         # Log
-        await crud.create_log(
-            db,
-            level='success' if result['success'] else 'error',
-            message=f"Account check completed: {result['message']}",
-            details=f"Account: {account.uid}, Status: {result['status']}"
-        )
+        await crud.create_log(db, {
+            'account_id': account.id,
+            'task_id': task_id,
+            'action': 'check_account',
+            'level': 'success' if result['success'] else 'error',
+            'message': f"Account check completed: {result['message']}",
+            'metadata': {'account_uid': account.uid, 'status': result['status']}
+        })
         
+    except TaskCancelled:
+        raise
     except Exception as e:
+        if cancel_token and cancel_token.cancelled:
+            # Failure caused by the session closed on cancel
+            raise TaskCancelled(cancel_token.reason) from e
+        
+        if account:
+            await crud.create_log(db, {
+                'account_id': account.id,
+                'task_id': task.task_id if task else None,
+                'action': 'check_account',
+                'level': 'error',
+                'message': f"Account check failed: {str(e)}",
+                'metadata': {'account_uid': account.uid}
+            })
+        
+        if cancel_token:
+            # Run by the task scheduler: the retry policy decides between retry and failed
+            raise
         if task:
             task.status = 'failed'
             task.error_message = str(e)
             task.completed_at = datetime.now()
             await db.commit()
-        
-        if account:
-            await crud.create_log(
-                db,
-                level='error',
-                message=f"Account check failed: {str(e)}",
-                details=f"Account: {account.uid}"
-            )
+            await task_progress.finish(task.task_id, 'failed', error_message=str(e), persist=False)
     
     finally:
         # Keep Chrome session open for potential reuse
@@ -156,19 +219,23 @@ async def check_account_status(
     background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
-    """Check single account status"""
+    """Check single account status (interactive lane: not queued behind bulk work)"""
     try:
         account = await crud.get_account(db, request.account_id)
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
         
-        # Add to background tasks
-        background_tasks.add_task(check_account_task, request.account_id, db)
+        task = await create_check_task(db, account, 'interactive')
+        if task_scheduler.enabled:
+            task_scheduler.notify()
+        else:
+            background_tasks.add_task(run_check_account, task.task_id, account.id, {})
         
         return {
             'success': True,
             'message': f'Started checking account {account.uid}',
-            'account_id': account.id
+            'account_id': account.id,
+            'task_id': task.task_id
         }
         
     except HTTPException:
@@ -183,21 +250,31 @@ async def check_multiple_accounts(
     background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ):
-    """Check multiple accounts status"""
+    """Check multiple accounts status (normal lane, bulk lane for large batches)"""
     try:
+        priority = priority_for('check_account', {'account_ids': request.account_ids})
         accounts = []
+        task_ids = []
         for account_id in request.account_ids:
             account = await crud.get_account(db, account_id)
             if account:
                 accounts.append(account)
-                # Add each check as background task
-                background_tasks.add_task(check_account_task, account_id, db)
+                task = await create_check_task(db, account, priority)
+                task_ids.append(task.task_id)
+                if not task_scheduler.enabled:
+                    background_tasks.add_task(run_check_account, task.task_id, account.id, {})
+        task_scheduler.notify()
         
         return {
             'success': True,
             'message': f'Started checking {len(accounts)} accounts',
-            'account_count': len(accounts)
+            'account_count': len(accounts),
+            'priority': priority,
+            'task_ids': task_ids
         }
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+task_scheduler.register('check_account', run_check_account)
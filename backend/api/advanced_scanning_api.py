@@ -7,14 +7,15 @@ Endpoints for advanced scanning operations
 
 from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
+from sqlalchemy import select, func, update
 from pydantic import BaseModel, Field, validator
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 from datetime import datetime
-import json
 import re
 
 from core.database import get_db, Account, FacebookID, Task, ActivityLog
+from core import crud
+from services.task_scheduler import priority_for
 
 router = APIRouter(prefix="/api/scanning", tags=["Advanced Scanning"])
 
@@ -123,24 +124,17 @@ async def create_scan_task(
     task_type: str,
     params: Dict[str, Any]
 ) -> str:
-    """Create a scanning task"""
-    task_id = f"{task_type}_{int(datetime.now().timestamp())}"
+    """Create a scanning task (an identical pending/processing task is reused)"""
+    task, _ = await crud.create_task_once(db, {
+        'task_id': crud.new_task_id(task_type),
+        'account_id': account_id,
+        'task_type': task_type,
+        'task_name': task_type.replace('_', ' ').title(),
+        'params': params,
+        'priority': priority_for(task_type, params)
+    })
     
-    task = Task(
-        task_id=task_id,
-        account_id=account_id,
-        task_type=task_type,
-        task_name=task_type.replace('_', ' ').title(),
-        params=json.dumps(params),
-        status='pending',
-        progress=0,
-        created_at=datetime.now()
-    )
-    
-    db.add(task)
-    await db.commit()
-    
-    return task_id
+    return task.task_id
 
 async def save_collected_uids(
     db: AsyncSession,
@@ -149,32 +143,62 @@ async def save_collected_uids(
     source: str,
     source_id: str
 ):
-    """Save collected UIDs to database"""
-    saved_count = 0
-    
+    """Save collected UIDs to database (one existence query per batch)"""
+    # uid is required and unique: drop username-only profiles and in-batch duplicates
+    batch = {}
     for uid_data in uids:
-        # Check if UID already exists
-        result = await db.execute(
-            select(FacebookID).where(FacebookID.uid == uid_data['uid'])
-        )
-        existing = result.scalar_one_or_none()
-        
-        if not existing:
-            fb_id = FacebookID(
-                uid=uid_data['uid'],
-                name=uid_data.get('name'),
-                username=uid_data.get('username'),
-                profile_url=uid_data.get('profile_url'),
-                source=source,
-                source_id=source_id,
-                collected_by_account_id=account_id,
-                created_at=datetime.now()
-            )
-            db.add(fb_id)
-            saved_count += 1
+        if uid_data.get('uid') and uid_data['uid'] not in batch:
+            batch[uid_data['uid']] = uid_data
+    if not batch:
+        return 0
     
+    result = await db.execute(
+        select(FacebookID.uid).where(FacebookID.uid.in_(list(batch)))
+    )
+    existing = set(result.scalars().all())
+    
+    new_ids = [
+        FacebookID(
+            uid=uid,
+            name=uid_data.get('name'),
+            username=uid_data.get('username'),
+            profile_url=uid_data.get('profile_url'),
+            source=source,
+            source_id=source_id,
+            collected_by_account_id=account_id,
+            created_at=datetime.now()
+        )
+        for uid, uid_data in batch.items() if uid not in existing
+    ]
+    db.add_all(new_ids)
     await db.commit()
-    return saved_count
+    return len(new_ids)
+
+async def stream_collected_uids(
+    db: AsyncSession,
+    account_id: int,
+    batches: AsyncIterator[List[Dict[str, Any]]],
+    source: str,
+    source_id: str,
+    task_id: Optional[str] = None,
+    max_results: Optional[int] = None
+) -> Dict[str, int]:
+    """
+    Write batches from an incremental scan (FacebookAutomator.iter_*) as they
+    arrive, so only the current batch is held in memory.
+    Updates the task progress after each batch when task_id is given.
+    """
+    found = saved = 0
+    async for batch in batches:
+        found += len(batch)
+        saved += await save_collected_uids(db, account_id, batch, source, source_id)
+        if task_id and max_results:
+            progress = min(int(found * 100 / max_results), 99)
+            await db.execute(
+                update(Task).where(Task.task_id == task_id).values(progress=progress)
+            )
+            await db.commit()
+    return {'found': found, 'saved': saved}
 
 # ============================================
 # SCANNING ENDPOINTS
@@ -11,9 +11,13 @@ from sqlalchemy import select, func
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-import json
 
 from core.database import get_db, Account, Task, ActivityLog
+from core import crud
+from core.task_codec import decode_dict
+from services.task_scheduler import priority_for
+from services.task_progress import task_progress
+from services.task_cancellation import task_cancellation
 
 router = APIRouter(prefix="/api/auto-actions", tags=["Auto Actions"])
 
@@ -122,24 +126,17 @@ async def create_auto_action_task(
     task_type: str,
     params: Dict[str, Any]
 ) -> str:
-    """Create an auto action task"""
-    task_id = f"{task_type}_{int(datetime.now().timestamp())}"
+    """Create an auto action task (an identical pending/processing task is reused)"""
+    task, _ = await crud.create_task_once(db, {
+        'task_id': crud.new_task_id(task_type),
+        'account_id': account_id,
+        'task_type': task_type,
+        'task_name': task_type.replace('_', ' ').title(),
+        'params': params,
+        'priority': priority_for(task_type, params)
+    })
     
-    task = Task(
-        task_id=task_id,
-        account_id=account_id,
-        task_type=task_type,
-        task_name=task_type.replace('_', ' ').title(),
-        params=json.dumps(params),
-        status='pending',
-        progress=0,
-        created_at=datetime.now()
-    )
-    
-    db.add(task)
-    await db.commit()
-    
-    return task_id
+    return task.task_id
 
 # ============================================
 # AUTO ACTIONS ENDPOINTS
@@ -451,7 +448,7 @@ async def get_auto_action_configs(
             configs[task.task_type] = {
                 "task_id": task.task_id,
                 "status": task.status,
-                "params": json.loads(task.params) if task.params else {},
+                "params": decode_dict(task.params, task.payload_version),
                 "created_at": task.created_at.isoformat() if task.created_at else None
             }
         
@@ -479,8 +476,13 @@ async def stop_auto_action(
         # Update task status
         task.status = 'cancelled'
         task.completed_at = datetime.now()
+        task.error_message = "Auto action stopped by user"
         await db.commit()
         
+        # Stop the running handler (frees its browser session)
+        task_progress.update(task_id, status='cancelled', error_message=task.error_message, persist=False)
+        stopped = await task_cancellation.cancel(task_id, task.error_message)
+        
         # Log activity
         await log_activity(
             db,
@@ -493,7 +495,8 @@ async def stop_auto_action(
         return {
             "success": True,
             "message": "Auto action stopped successfully",
-            "task_id": task_id
+            "task_id": task_id,
+            "stopped_running": stopped
         }
         
     except HTTPException:
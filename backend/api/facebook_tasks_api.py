@@ -3,7 +3,7 @@ Facebook Tasks API - Complete Implementation
 Handles all Facebook automation tasks
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, Header
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -14,6 +14,9 @@ import json
 from core.database import get_db
 from core import crud
 from services.telegram_bot import TelegramBot
+from services.task_cancellation import task_cancellation
+from services.task_scheduler import task_scheduler, priority_for
+from services.bulk_jobs import run_bulk_items, AccountActions
 import os
 
 router = APIRouter(prefix="/api/facebook", tags=["facebook-tasks"])
@@ -159,80 +162,101 @@ async def scan_groups(request: GroupScanRequest, db: AsyncSession = Depends(get_
 
 @router.post("/groups/join")
 async def join_groups(
-    request: GroupJoinRequest, 
-    background_tasks: BackgroundTasks,
+    request: GroupJoinRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Join multiple groups with multiple accounts
+
+    One parent task fans out into a join_groups_account child task per
+    account; children run in parallel under the scheduler and the parent's
+    progress / result are aggregated from them (/api/tasks/history).
     """
     try:
         # Validate accounts
-        accounts = []
-        for account_id in request.account_ids:
+        account_ids = list(dict.fromkeys(request.account_ids))
+        if not account_ids or not request.group_ids:
+            raise HTTPException(status_code=400, detail="account_ids and group_ids are required")
+        for account_id in account_ids:
             account = await crud.get_account(db, account_id)
             if not account:
                 raise HTTPException(status_code=404, detail=f"Account {account_id} not found")
             if account.status != "active":
                 raise HTTPException(status_code=400, detail=f"Account {account_id} is not active")
-            accounts.append(account)
-        
-        # Create task
-        task_data = {
-            "task_type": "group_join",
-            "status": "pending",
-            "progress": 0,
-            "total_items": len(request.account_ids) * len(request.group_ids),
-            "completed_items": 0,
-            "failed_items": 0,
-            "config": {
-                "account_ids": request.account_ids,
-                "group_ids": request.group_ids,
-                "delay": request.delay,
-                "max_groups_per_account": request.max_groups_per_account
-            }
-        }
         
-        task = await crud.create_task(db, **task_data)
-        
-        # Log activity
-        await crud.create_log(
+        group_ids = request.group_ids[:request.max_groups_per_account]
+        child_params = {"group_ids": group_ids, "delay": request.delay}
+        parent, created = await crud.create_task_with_children(
             db,
-            level="info",
-            message=f"Started group join task: {len(request.account_ids)} accounts, {len(request.group_ids)} groups",
-            details=f"Task ID: {task.id}"
-        )
-        
-        telegram_bot.send_notification(
-            "Group Join Task Started",
-            f"Joining {len(request.group_ids)} groups with {len(request.account_ids)} accounts",
-            "info",
-            {"Task ID": task.id, "Delay": f"{request.delay}s"}
+            {
+                "task_id": crud.new_task_id("join_groups"),
+                "account_id": account_ids[0],
+                "task_type": "join_groups",
+                "task_name": f"Join {len(group_ids)} groups with {len(account_ids)} accounts",
+                "params": {"account_ids": account_ids, **child_params},
+                "idempotency_key": idempotency_key
+            },
+            [
+                {
+                    "task_id": crud.new_task_id(f"join_groups_account_{account_id}"),
+                    "account_id": account_id,
+                    "task_type": "join_groups_account",
+                    "task_name": f"Join {len(group_ids)} groups",
+                    "params": child_params,
+                    "priority": priority_for("join_groups_account", child_params),
+                    "total_items": len(group_ids)
+                }
+                for account_id in account_ids
+            ]
         )
         
-        # TODO: Process in background
-        # background_tasks.add_task(process_group_join_task, task.id, request, db)
+        if created:
+            task_scheduler.notify()
+            await crud.create_log(db, {
+                "account_id": account_ids[0],
+                "task_id": parent.task_id,
+                "action": "join_groups",
+                "message": f"Started group join task: {len(account_ids)} accounts, {len(group_ids)} groups",
+                "level": "info"
+            })
+            telegram_bot.send_notification(
+                "Group Join Task Started",
+                f"Joining {len(group_ids)} groups with {len(account_ids)} accounts",
+                "info",
+                {"Task ID": parent.task_id, "Delay": f"{request.delay}s"}
+            )
         
         return {
             "success": True,
-            "task_id": task.id,
-            "accounts": len(request.account_ids),
-            "groups": len(request.group_ids),
-            "estimated_time": len(request.account_ids) * len(request.group_ids) * request.delay,
-            "message": "Task created and will be processed in background"
+            "task_id": parent.task_id,
+            "duplicate": not created,
+            "child_count": parent.child_count,
+            "accounts": len(account_ids),
+            "groups": len(group_ids),
+            "estimated_time": len(group_ids) * request.delay,
+            "message": "Task created, accounts join in parallel" if created else "Identical task already exists"
         }
         
     except HTTPException:
         raise
     except Exception as e:
-        await crud.create_log(
-            db,
-            level="error",
-            message=f"Failed to create group join task: {str(e)}"
-        )
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def run_join_groups_account(task_id: str, account_id: int, params: Dict[str, Any]):
+    """Task scheduler handler for a join_groups child: one account joins the groups, resumable"""
+    actions = AccountActions(account_id, 'join_groups', task_id)
+    delay = float(params.get('delay') or 0)
+    await run_bulk_items(
+        task_id,
+        params.get('group_ids') or [],
+        lambda group_id: actions('join_group', group_id=group_id),
+        delay_range=(delay, delay * 1.5),
+        defer_delays=True
+    )
+
+
 @router.post("/groups/leave")
 async def leave_groups(request: GroupLeaveRequest, db: AsyncSession = Depends(get_db)):
     """
@@ -645,6 +669,9 @@ async def cancel_task(task_id: int, db: AsyncSession = Depends(get_db)):
         # Update task status
         await crud.update_task(db, task_id, status="cancelled")
         
+        # Stop the running handler (frees its browser session)
+        await task_cancellation.cancel(task.task_id)
+        
         await crud.create_log(
             db,
             level="warning",
@@ -662,3 +689,6 @@ async def cancel_task(task_id: int, db: AsyncSession = Depends(get_db)):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+task_scheduler.register('join_groups_account', run_join_groups_account)
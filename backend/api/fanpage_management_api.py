@@ -11,10 +11,11 @@ from sqlalchemy import select, func, and_, or_
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime, timedelta
-import json
 import re
 
-from core.database import get_db, Account, Task, ActivityLog
+from core.database import get_db, Account, ActivityLog
+from core import crud
+from services.task_scheduler import priority_for
 
 router = APIRouter(prefix="/api/fanpages", tags=["Fanpage Management"])
 
@@ -139,24 +140,17 @@ async def create_fanpage_task(
     task_type: str,
     params: Dict[str, Any]
 ) -> str:
-    """Create a fanpage management task"""
-    task_id = f"{task_type}_{int(datetime.now().timestamp())}"
+    """Create a fanpage management task (an identical pending/processing task is reused)"""
+    task, _ = await crud.create_task_once(db, {
+        'task_id': crud.new_task_id(task_type),
+        'account_id': account_id,
+        'task_type': task_type,
+        'task_name': task_type.replace('_', ' ').title(),
+        'params': params,
+        'priority': priority_for(task_type, params)
+    })
     
-    task = Task(
-        task_id=task_id,
-        account_id=account_id,
-        task_type=task_type,
-        task_name=task_type.replace('_', ' ').title(),
-        params=json.dumps(params),
-        status='pending',
-        progress=0,
-        created_at=datetime.now()
-    )
-    
-    db.add(task)
-    await db.commit()
-    
-    return task_id
+    return task.task_id
 
 # ============================================
 # FANPAGE MANAGEMENT ENDPOINTS
@@ -7,13 +7,16 @@ Handles friend requests, friend list management, and friend-related operations.
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, func, or_, desc
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field, validator
 import json
 
 from core.database import get_db, Account, FacebookID
+from core import crud
 from services.activity_logger import ActivityLogger
+from services.task_scheduler import task_scheduler, priority_for
+from services.bulk_jobs import AccountActions, run_bulk_items
 
 router = APIRouter(prefix="/api/friends", tags=["Friend Management"])
 
@@ -165,8 +168,22 @@ async def add_friends_bulk(
         if not valid_uids:
             raise HTTPException(status_code=400, detail="No valid UIDs provided")
         
-        # Create task ID
-        task_id = f"add_friends_bulk_{request_data.account_id}_{int(datetime.now().timestamp())}"
+        # Create the bulk task (checkpointed per UID, see run_add_friends_bulk)
+        params = {
+            "target_uids": valid_uids,
+            "delay_min": request_data.delay_min,
+            "delay_max": max(request_data.delay_min, request_data.delay_max)
+        }
+        task, _ = await crud.create_task_once(db, {
+            'task_id': crud.new_task_id(f"add_friends_bulk_{request_data.account_id}"),
+            'account_id': request_data.account_id,
+            'task_type': 'add_friends_bulk',
+            'task_name': f"Add {len(valid_uids)} friends",
+            'params': params,
+            'priority': priority_for('add_friends_bulk', params)
+        })
+        task_id = task.task_id
+        task_scheduler.notify()
         
         # Log activity
         await ActivityLogger.log_activity(
@@ -593,3 +610,17 @@ async def import_friend_list(
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to import: {str(e)}")
+
+
+async def run_add_friends_bulk(task_id: str, account_id: int, params: Dict[str, Any]):
+    """Task scheduler handler for add_friends_bulk: one friend request per UID, resumable"""
+    actions = AccountActions(account_id, 'add_friends_bulk', task_id)
+    await run_bulk_items(
+        task_id,
+        params.get('target_uids') or [],
+        lambda uid: actions('add_friend', profile_id=uid),
+        delay_range=(float(params.get('delay_min') or 0), float(params.get('delay_max') or 0))
+    )
+
+
+task_scheduler.register('add_friends_bulk', run_add_friends_bulk)
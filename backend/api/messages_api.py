@@ -11,9 +11,14 @@ from typing import List, Optional
 from datetime import datetime, timedelta
 from pydantic import BaseModel, Field, validator
 import json
+import uuid
 
-from core.database import get_db, Account, Message, AutoReplyTemplate
+from core.database import get_db, AsyncSessionLocal, Account, Message, AutoReplyTemplate
+from core import crud
 from services.activity_logger import ActivityLogger
+from services.task_progress import task_progress
+from services.task_scheduler import task_scheduler
+from services.delayed_jobs import delayed_jobs
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
 
@@ -283,6 +288,20 @@ async def send_message(
         await db.commit()
         await db.refresh(new_message)
         
+        # Scheduled: delivered by a delayed task at scheduled_at
+        task_id = None
+        if message_data.scheduled_at:
+            task = await crud.create_task(db, {
+                'task_id': f"send_message_{new_message.id}_{uuid.uuid4().hex[:8]}",
+                'account_id': message_data.account_id,
+                'task_type': 'send_message',
+                'task_name': f"Send message to {message_data.receiver_uid}",
+                'params': {'message_id': new_message.id},
+                'run_at': message_data.scheduled_at
+            })
+            task_id = task.task_id
+            delayed_jobs.schedule(task.task_id, task.run_at)
+        
         # Log activity
         await ActivityLogger.log_activity(
             db=db,
@@ -297,7 +316,8 @@ async def send_message(
             "success": True,
             "message": "Message sent successfully",
             "message_id": new_message.id,
-            "scheduled": message_data.scheduled_at is not None
+            "scheduled": message_data.scheduled_at is not None,
+            "task_id": task_id
         }
     
     except HTTPException:
@@ -712,3 +732,18 @@ async def mark_conversation_read(
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Failed to mark conversation as read: {str(e)}")
+
+
+async def deliver_scheduled_message(task_id: str, account_id: int, params: dict):
+    """Task scheduler handler for send_message tasks (scheduled messages)"""
+    async with AsyncSessionLocal() as db:
+        message = await db.get(Message, params.get('message_id'))
+        if not message:
+            raise ValueError(f"Message {params.get('message_id')} not found")
+        if not message.sent_at:
+            message.sent_at = datetime.now()
+            await db.commit()
+    await task_progress.finish(task_id, 'completed', result={'success': True, 'message_id': params.get('message_id')})
+
+
+task_scheduler.register('send_message', deliver_scheduled_message)
@@ -11,10 +11,12 @@ from sqlalchemy import select
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
-import json
 import re
 
 from core.database import get_db, Account, Task, ActivityLog
+from core import crud
+from services.task_scheduler import task_scheduler, priority_for
+from services.bulk_jobs import AccountActions, run_bulk_items
 
 router = APIRouter(prefix="/api/misc", tags=["Miscellaneous Features"])
 
@@ -120,24 +122,17 @@ async def create_misc_task(
     task_type: str,
     params: Dict[str, Any]
 ) -> str:
-    """Create a miscellaneous task"""
-    task_id = f"{task_type}_{int(datetime.now().timestamp())}"
+    """Create a miscellaneous task (an identical pending/processing task is reused)"""
+    task, _ = await crud.create_task_once(db, {
+        'task_id': crud.new_task_id(task_type),
+        'account_id': account_id,
+        'task_type': task_type,
+        'task_name': task_type.replace('_', ' ').title(),
+        'params': params,
+        'priority': priority_for(task_type, params)
+    })
     
-    task = Task(
-        task_id=task_id,
-        account_id=account_id,
-        task_type=task_type,
-        task_name=task_type.replace('_', ' ').title(),
-        params=json.dumps(params),
-        status='pending',
-        progress=0,
-        created_at=datetime.now()
-    )
-    
-    db.add(task)
-    await db.commit()
-    
-    return task_id
+    return task.task_id
 
 # ============================================
 # MISCELLANEOUS ENDPOINTS
@@ -543,3 +538,18 @@ async def get_misc_tasks(
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching tasks: {str(e)}")
+
+
+async def run_join_via_uid(task_id: str, account_id: int, params: Dict[str, Any]):
+    """Task scheduler handler for join_via_uid: joins groups one by one, resumable from the last joined"""
+    actions = AccountActions(account_id, 'join_via_uid', task_id)
+    delay = float(params.get('delay_between') or 0)
+    await run_bulk_items(
+        task_id,
+        params.get('group_uids') or [],
+        lambda group_id: actions('join_group', group_id=group_id),
+        delay_range=(delay, delay)
+    )
+
+
+task_scheduler.register('join_via_uid', run_join_via_uid)
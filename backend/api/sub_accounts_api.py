@@ -6,12 +6,19 @@ REST endpoints for managing sub-accounts (tài khoản phụ)
 from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
-from core.database import get_db, SubAccount, Account
+from core.database import get_db, AsyncSessionLocal, SubAccount, Account, Task
+from core.task_codec import encode_payload
 from services.activity_logger import ActivityLogger
+from services.task_scheduler import task_scheduler, priority_for
+from services.delayed_jobs import delayed_jobs
+from services.bulk_jobs import AccountActions
+from services.task_cancellation import task_cancellation
+from services.task_progress import task_progress
 from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import uuid
 
 router = APIRouter(prefix="/api/sub-accounts", tags=["Sub Accounts"])
 
@@ -71,11 +78,15 @@ class SubAccountStats(BaseModel):
     accounts_with_subs: int
 
 
+# Interactions a sub_account_interact task can perform
+INTERACT_ACTIONS = ('like', 'comment')
+
+
 class SubAccountInteract(BaseModel):
     """Schema cho interaction request"""
     sub_account_ids: List[int] = Field(..., description="Danh sách ID sub accounts")
     target_post_url: str = Field(..., description="URL bài viết cần tương tác")
-    actions: List[str] = Field(..., description="Danh sách hành động: like, comment, share")
+    actions: List[str] = Field(..., description="Danh sách hành động: like, comment")
     comment_text: Optional[str] = Field(None, description="Nội dung comment (nếu có)")
     delay_seconds: int = Field(5, ge=1, le=60, description="Delay giữa các tương tác")
 
@@ -608,12 +619,12 @@ async def interact_with_sub_accounts(
     Body:
     - sub_account_ids: Danh sách ID sub accounts
     - target_post_url: URL bài viết cần tương tác
-    - actions: Danh sách hành động ["like", "comment", "share"]
+    - actions: Danh sách hành động ["like", "comment"]
     - comment_text: Nội dung comment (nếu có action comment)
     - delay_seconds: Delay giữa các tương tác (default: 5)
     
-    Note: Đây là endpoint khởi tạo task, việc tương tác thực tế
-    sẽ được xử lý bởi background task với Selenium
+    Mỗi sub account là một task riêng, hẹn giờ cách nhau delay_seconds
+    (Task.run_at) thay vì sleep giữa các tương tác
     """
     try:
         # Validate sub accounts exist
@@ -631,11 +642,13 @@ async def interact_with_sub_accounts(
             
             sub_accounts.append(sub_acc)
         
-        # Validate actions
-        valid_actions = ['like', 'comment', 'share']
+        # Validate actions (share has no browser action yet)
         for action in interact_data.actions:
-            if action not in valid_actions:
-                raise HTTPException(status_code=400, detail=f"Invalid action: {action}")
+            if action not in INTERACT_ACTIONS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid action: {action}. Must be one of: {', '.join(INTERACT_ACTIONS)}"
+                )
         
         if 'comment' in interact_data.actions and not interact_data.comment_text:
             raise HTTPException(status_code=400, detail="comment_text is required when using comment action")
@@ -654,9 +667,33 @@ async def interact_with_sub_accounts(
             }
         )
         
-        # TODO: Implement actual interaction logic with Selenium
-        # This would be done in a background task
-        # For now, just return success response
+        # One delayed task per sub account, staggered by delay_seconds
+        now = datetime.now()
+        priority = priority_for('sub_account_interact', {'sub_account_ids': interact_data.sub_account_ids})
+        tasks = [
+            Task(
+                task_id=f"sub_interact_{sub_acc.id}_{uuid.uuid4().hex[:8]}",
+                account_id=sub_acc.main_account_id,
+                task_type='sub_account_interact',
+                task_name=f"Sub account {sub_acc.uid} interact",
+                params=encode_payload({
+                    'sub_account_id': sub_acc.id,
+                    'target_post_url': interact_data.target_post_url,
+                    'actions': interact_data.actions,
+                    'comment_text': interact_data.comment_text
+                }),
+                priority=priority,
+                run_at=now + timedelta(seconds=i * interact_data.delay_seconds),
+                status='pending',
+                progress=0
+            )
+            for i, sub_acc in enumerate(sub_accounts)
+        ]
+        db.add_all(tasks)
+        await db.commit()
+        for task in tasks:
+            delayed_jobs.schedule(task.task_id, task.run_at)
+        task_scheduler.notify()
         
         return {
             "success": True,
@@ -664,10 +701,48 @@ async def interact_with_sub_accounts(
             "sub_account_count": len(sub_accounts),
             "actions": interact_data.actions,
             "target_url": interact_data.target_post_url,
-            "note": "This is a task creation endpoint. Actual interaction will be processed in background."
+            "task_ids": [task.task_id for task in tasks],
+            "last_run_at": tasks[-1].run_at.isoformat() if tasks else None
         }
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error creating interaction task: {str(e)}")
+
+
+async def run_sub_account_interact(task_id: str, account_id: int, params: Dict[str, Any]):
+    """Task scheduler handler for sub_account_interact: the sub account likes / comments on the post"""
+    sub_account_id = params.get('sub_account_id')
+    post_url = params.get('target_post_url')
+    if not sub_account_id or not post_url:
+        raise ValueError("sub_account_id and target_post_url are required")
+    
+    actions = AccountActions(account_id, 'sub_account_interact', task_id, sub_account_id=sub_account_id)
+    token = task_cancellation.get(task_id)
+    done = []
+    for action in params.get('actions') or []:
+        if token:
+            token.check()
+        if action == 'like':
+            await actions('react_to_post', post_url=post_url, reaction_type='LIKE')
+        elif action == 'comment':
+            await actions('comment_on_post', post_url=post_url, comment_text=params.get('comment_text') or '')
+        else:
+            raise ValueError(f"Unsupported action: {action}")
+        done.append(action)
+        if token:
+            token.record(actions_done=list(done))
+    
+    async with AsyncSessionLocal() as db:
+        sub_acc = await db.get(SubAccount, sub_account_id)
+        if sub_acc:
+            sub_acc.interaction_count = (sub_acc.interaction_count or 0) + len(done)
+            sub_acc.last_interaction = datetime.now()
+            await db.commit()
+    await task_progress.finish(task_id, 'completed', result={
+        'success': True, 'sub_account_id': sub_account_id, 'post_url': post_url, 'actions_done': done
+    })
+
+
+task_scheduler.register('sub_account_interact', run_sub_account_interact)
@@ -3,19 +3,39 @@ Task Manager API
 Manages task history and Chrome sessions
 """
 
-from fastapi import APIRouter, HTTPException, Depends
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import FileResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc
-from datetime import datetime
+from sqlalchemy import select, desc, func, update, delete, bindparam
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
 
-from core.database import get_db, Task, Account
+from core.database import get_db, Task, TaskItem, Account
 from core import crud
-from services.chrome_manager import chrome_manager
+from core.task_codec import encode_payload, decode_payload
+from services.chrome_manager import chrome_manager, SESSION_PROFILES
+from services.browser_workers import browser_workers
+from services.task_progress import task_progress
+from services.task_cancellation import task_cancellation
+from services.task_retry import task_retry, policy_for
+from services.task_leases import task_leases
+from services.task_nodes import task_nodes
+from services.bulk_jobs import resume_task as resume_bulk_task, item_counts, RESUMABLE_STATUSES
+from services.task_fanout import refresh_parent, cancel_children, resume_children, children_of, child_ids
+from services.task_scheduler import task_scheduler, priority_for, LANES
+from services.delayed_jobs import delayed_jobs
+from services.screenshot_store import screenshot_store, screenshot_url, MEDIA_TYPES
+from services.page_readiness import readiness_stats, ACTION_PROFILES
 
 router = APIRouter(prefix="/api/tasks", tags=["task-manager"])
 
+# Entries accepted by POST /batch
+MAX_BATCH_TASKS = 10000
+
 
 # ============================================
 # PYDANTIC MODELS
@@ -24,6 +44,7 @@ router = APIRouter(prefix="/api/tasks", tags=["task-manager"])
 class ChromeSessionCreate(BaseModel):
     account_id: int
     headless: bool = True
+    profile: str = 'full'  # full, collector
 
 
 class ChromeSessionToggle(BaseModel):
@@ -35,13 +56,32 @@ class TaskCreateRequest(BaseModel):
     task_type: str
     task_name: str
     params: Optional[Dict[str, Any]] = None
+    priority: Optional[str] = None  # interactive, normal, bulk (default from params size)
+    run_at: Optional[datetime] = None  # run later (delayed job)
+    delay_seconds: Optional[float] = None  # or: run this many seconds from now
+    idempotency_key: Optional[str] = None  # or the Idempotency-Key header
+
+
+class TaskBatchEntry(BaseModel):
+    account_id: int
+    task_type: str
+    task_name: Optional[str] = None
+    params: Optional[Dict[str, Any]] = None
+    priority: Optional[str] = None
+    run_at: Optional[datetime] = None
+    idempotency_key: Optional[str] = None
+
+
+class TaskBatchRequest(BaseModel):
+    tasks: List[TaskBatchEntry]
+    delay_seconds: Optional[float] = None  # run_at for entries without one
 
 
 class TaskUpdateStatusRequest(BaseModel):
     status: str  # pending, processing, completed, failed, cancelled
     progress: Optional[int] = None
     error_message: Optional[str] = None
-    result: Optional[str] = None
+    result: Optional[Any] = None  # dict/list, or text
 
 
 class TaskHistoryResponse(BaseModel):
@@ -53,17 +93,40 @@ class TaskHistoryResponse(BaseModel):
     task_type: str
     task_name: str
     status: str
+    priority: Optional[str] = 'normal'
+    run_at: Optional[datetime] = None
     progress: int
     started_at: Optional[datetime]
     completed_at: Optional[datetime]
     created_at: datetime
     error_message: Optional[str]
-    result: Optional[str]
+    result: Optional[Any]
+    target_id: Optional[str] = None
+    result_status: Optional[str] = None
+    result_success: Optional[bool] = None
+    attempts: int = 0
+    last_error: Optional[str] = None
+    error_class: Optional[str] = None
+    total_items: Optional[int] = None
+    completed_items: int = 0
+    failed_items: int = 0
+    parent_task_id: Optional[str] = None
+    child_count: Optional[int] = None
+    children: Optional[List[Any]] = None  # expanded children (TaskHistoryResponse)
+    screenshot_url: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class DeadLetterRequeueRequest(BaseModel):
+    task_ids: Optional[List[str]] = None  # or every dead-lettered task matching the filters
+    task_type: Optional[str] = None
+    error_class: Optional[str] = None
+    reset_attempts: bool = True
+    spread_seconds: float = 0  # stagger run_at over this window so a big requeue does not hit the browsers at once
+
+
 class ChromeSessionResponse(BaseModel):
     account_id: int
     account_uid: str
@@ -73,6 +136,14 @@ class ChromeSessionResponse(BaseModel):
     last_activity: str
     has_proxy: bool
     proxy_ip: Optional[str]
+    profile: str = 'full'
+    persistent_profile: bool = False
+    login_method: Optional[str] = None
+    pages_loaded: int = 0
+    age_minutes: float = 0.0
+    recycles: int = 0
+    in_use: int = 0
+    resources: Optional[Dict[str, Any]] = None
 
 
 # ============================================
@@ -80,12 +151,18 @@ class ChromeSessionResponse(BaseModel):
 # ============================================
 
 @router.post("/create")
-async def create_task(request: TaskCreateRequest, db: AsyncSession = Depends(get_db)):
+async def create_task(
+    request: TaskCreateRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db)
+):
     """
     Create a new task
     
     - Validates account exists
     - Generates unique task_id
+    - Returns the existing task (duplicate=true) for a repeated idempotency key,
+      or when an identical pending/processing task exists
     - Creates task in pending status
     - Logs task creation
     """
@@ -95,33 +172,45 @@ async def create_task(request: TaskCreateRequest, db: AsyncSession = Depends(get
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
         
-        # Generate unique task ID
-        task_id = f"{request.task_type}_{request.account_id}_{int(datetime.now().timestamp())}"
+        if request.priority and request.priority not in LANES:
+            raise HTTPException(status_code=400, detail=f"Invalid priority. Must be one of: {', '.join(LANES)}")
         
-        # Create task
-        task = await crud.create_task(db, {
-            'task_id': task_id,
+        run_at = request.run_at
+        if run_at is None and request.delay_seconds:
+            run_at = datetime.now() + timedelta(seconds=request.delay_seconds)
+        
+        # Create task (or find the identical one)
+        task, created = await crud.create_task_once(db, {
+            'task_id': crud.new_task_id(f"{request.task_type}_{request.account_id}"),
             'account_id': request.account_id,
             'task_type': request.task_type,
             'task_name': request.task_name,
-            'params': str(request.params) if request.params else None,
-            'status': 'pending',
-            'progress': 0
+            'params': request.params,
+            'priority': request.priority or priority_for(request.task_type, request.params),
+            'run_at': run_at,
+            'idempotency_key': idempotency_key or request.idempotency_key
         })
+        task_id = task.task_id
         
-        # Log activity
-        await crud.create_log(db, {
-            'account_id': request.account_id,
-            'task_id': task_id,
-            'action': 'create_task',
-            'message': f"Created task: {request.task_name}",
-            'level': 'info'
-        })
+        if created:
+            if task.run_at:
+                delayed_jobs.schedule(task.task_id, task.run_at)
+            task_scheduler.notify()
+            
+            # Log activity
+            await crud.create_log(db, {
+                'account_id': request.account_id,
+                'task_id': task_id,
+                'action': 'create_task',
+                'message': f"Created task: {request.task_name}",
+                'level': 'info'
+            })
         
         return {
             "success": True,
-            "message": "Task created successfully",
+            "message": "Task created successfully" if created else "Identical task already exists",
             "task_id": task_id,
+            "duplicate": not created,
             "task": {
                 "id": task.id,
                 "task_id": task.task_id,
@@ -129,6 +218,8 @@ async def create_task(request: TaskCreateRequest, db: AsyncSession = Depends(get
                 "task_type": task.task_type,
                 "task_name": task.task_name,
                 "status": task.status,
+                "priority": task.priority,
+                "run_at": task.run_at.isoformat() if task.run_at else None,
                 "created_at": task.created_at.isoformat()
             }
         }
@@ -139,6 +230,86 @@ async def create_task(request: TaskCreateRequest, db: AsyncSession = Depends(get
         raise HTTPException(status_code=500, detail=f"Error creating task: {str(e)}")
 
 
+@router.post("/batch")
+async def create_tasks_batch(request: TaskBatchRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Create many tasks at once (e.g. a nightly run for every account)
+    
+    - Validates all accounts with one query; unknown accounts reject the whole batch
+    - Inserts every new task and one summary log in a single transaction
+    - Duplicates (idempotency key, or identical pending/processing task) are not
+      created again: their existing task_id is returned and duplicate is true
+    - Returns task_ids in the order of the entries
+    """
+    try:
+        entries = request.tasks
+        if not entries:
+            raise HTTPException(status_code=400, detail="tasks is empty")
+        if len(entries) > MAX_BATCH_TASKS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TASKS} tasks per batch")
+        invalid = {entry.priority for entry in entries if entry.priority and entry.priority not in LANES}
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid priority. Must be one of: {', '.join(LANES)}")
+        
+        account_ids = {entry.account_id for entry in entries}
+        missing = sorted(account_ids - await crud.get_existing_account_ids(db, list(account_ids)))
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"{len(missing)} account(s) not found: {', '.join(map(str, missing[:20]))}"
+            )
+        
+        default_run_at = datetime.now() + timedelta(seconds=request.delay_seconds) if request.delay_seconds else None
+        tasks_data = [
+            {
+                'task_id': crud.new_task_id(f"{entry.task_type}_{entry.account_id}"),
+                'account_id': entry.account_id,
+                'task_type': entry.task_type,
+                'task_name': entry.task_name or entry.task_type,
+                'params': entry.params,
+                'priority': entry.priority or priority_for(entry.task_type, entry.params),
+                'run_at': entry.run_at or default_run_at,
+                'idempotency_key': entry.idempotency_key
+            }
+            for entry in entries
+        ]
+        task_types = sorted({entry.task_type for entry in entries})
+        task_ids, duplicates = await crud.create_tasks_bulk(db, tasks_data, log_data={
+            'action': 'create_tasks_batch',
+            'message': f"Batch of {len(entries)} task(s) for {len(account_ids)} account(s): {', '.join(task_types)}",
+            'level': 'info',
+            'metadata': {'tasks': len(entries), 'accounts': len(account_ids), 'task_types': task_types}
+        })
+        
+        created = 0
+        for data, task_id, duplicate in zip(tasks_data, task_ids, duplicates):
+            if duplicate:
+                continue
+            created += 1
+            if data['run_at']:
+                delayed_jobs.schedule(task_id, data['run_at'])
+        if created:
+            task_scheduler.notify()
+        
+        return {
+            "success": True,
+            "message": f"Created {created} task(s), {len(entries) - created} duplicate(s)",
+            "created": created,
+            "duplicates": len(entries) - created,
+            "task_ids": task_ids,
+            "duplicate": duplicates
+        }
+    
+    except HTTPException:
+        raise
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Idempotency key used concurrently, retry the batch")
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error creating tasks: {str(e)}")
+
+
 @router.put("/{task_id}/status")
 async def update_task_status(
     task_id: str,
@@ -180,7 +351,7 @@ async def update_task_status(
             task.error_message = request.error_message
         
         if request.result:
-            task.result = request.result
+            task.result = encode_payload(request.result)
         
         # Set timestamps
         if request.status == 'processing' and not task.started_at:
@@ -192,6 +363,13 @@ async def update_task_status(
         await db.commit()
         await db.refresh(task)
         
+        task_progress.update(
+            task_id, progress=task.progress, status=task.status, error_message=task.error_message,
+            result=decode_payload(task.result, task.payload_version), persist=False
+        )
+        if task.parent_task_id:
+            await refresh_parent(task.parent_task_id)
+        
         # Log activity
         await crud.create_log(db, {
             'account_id': task.account_id,
@@ -212,7 +390,7 @@ async def update_task_status(
                 "started_at": task.started_at.isoformat() if task.started_at else None,
                 "completed_at": task.completed_at.isoformat() if task.completed_at else None,
                 "error_message": task.error_message,
-                "result": task.result
+                "result": decode_payload(task.result, task.payload_version)
             }
         }
     
@@ -230,6 +408,9 @@ async def cancel_task(task_id: str, db: AsyncSession = Depends(get_db)):
     
     - Only cancels tasks that are pending or processing
     - Sets status to cancelled
+    - Stops the running handler and releases its browser session
+      (the partial result is saved when the handler stops)
+    - Cancelling a fan-out parent cancels its pending/processing children
     - Logs cancellation
     """
     try:
@@ -256,6 +437,15 @@ async def cancel_task(task_id: str, db: AsyncSession = Depends(get_db)):
         await db.commit()
         await db.refresh(task)
         
+        task_progress.update(task_id, status='cancelled', error_message=task.error_message, persist=False)
+        stopped = await task_cancellation.cancel(task_id, task.error_message)
+        children = None
+        if task.child_count:
+            children = await cancel_children(db, task_id, task.error_message)
+            stopped = stopped or bool(children['stopped_running'])
+        elif task.parent_task_id:
+            await refresh_parent(task.parent_task_id)
+        
         # Log activity
         await crud.create_log(db, {
             'account_id': task.account_id,
@@ -268,6 +458,8 @@ async def cancel_task(task_id: str, db: AsyncSession = Depends(get_db)):
         return {
             "success": True,
             "message": "Task cancelled successfully",
+            "stopped_running": stopped,
+            "children": children,
             "task": {
                 "id": task.id,
                 "task_id": task.task_id,
@@ -291,7 +483,7 @@ async def retry_task(task_id: str, db: AsyncSession = Depends(get_db)):
     - Only retries failed tasks
     - Resets status to pending
     - Clears error_message
-    - Resets progress to 0
+    - Resets progress to 0 and gives the task a fresh retry budget (attempts = 0)
     - Logs retry action
     """
     try:
@@ -304,6 +496,8 @@ async def retry_task(task_id: str, db: AsyncSession = Depends(get_db)):
             raise HTTPException(status_code=404, detail="Task not found")
         
         # Check if task can be retried
+        if task.child_count:
+            raise HTTPException(status_code=400, detail="Fan-out parent task: resume it to rerun its failed children")
         if task.status != 'failed':
             raise HTTPException(
                 status_code=400,
@@ -317,8 +511,14 @@ async def retry_task(task_id: str, db: AsyncSession = Depends(get_db)):
         task.result = None
         task.started_at = None
         task.completed_at = None
+        task.run_at = None
+        task.attempts = 0
+        task.worker_id = None
+        task.lease_expires_at = None
         
         await db.commit()
+        task_progress.reset(task_id)
+        task_scheduler.notify()
         await db.refresh(task)
         
         # Log activity
@@ -352,52 +552,234 @@ async def retry_task(task_id: str, db: AsyncSession = Depends(get_db)):
 # TASK HISTORY ENDPOINTS
 # ============================================
 
+@router.post("/{task_id}/resume")
+async def resume_task(task_id: str, retry_failed: bool = True, db: AsyncSession = Depends(get_db)):
+    """
+    Resume a failed or cancelled bulk task from its checkpoint
+
+    - Completed items are skipped; failed items are tried again unless retry_failed=false
+    - Returns the exact completed / failed counts it resumes from
+    - A fan-out parent resumes its failed / cancelled children
+    """
+    try:
+        task = (await db.execute(select(Task).filter(Task.task_id == task_id))).scalar_one_or_none()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        if task.status not in RESUMABLE_STATUSES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Cannot resume task with status: {task.status}. Only failed or cancelled tasks can be resumed."
+            )
+        
+        if task.child_count:
+            resumed = await resume_children(db, task_id, retry_failed=retry_failed)
+            if not resumed['resumed']:
+                raise HTTPException(status_code=409, detail="No failed or cancelled child tasks to resume")
+            task_scheduler.notify()
+            await crud.create_log(db, {
+                'account_id': task.account_id,
+                'task_id': task_id,
+                'action': 'resume_task',
+                'message': f"Resumed {resumed['resumed']} child task(s): {task.task_name}",
+                'level': 'info'
+            })
+            return {
+                "success": True,
+                "message": "Child tasks resumed",
+                "task_id": task_id,
+                "resumed_children": resumed['resumed']
+            }
+        
+        counts = await resume_bulk_task(db, task_id, retry_failed=retry_failed)
+        if counts is None:
+            raise HTTPException(status_code=409, detail="Task status changed, try again")
+        task_scheduler.notify()
+        
+        await crud.create_log(db, {
+            'account_id': task.account_id,
+            'task_id': task_id,
+            'action': 'resume_task',
+            'message': f"Task resumed after {counts['completed']} completed item(s): {task.task_name}",
+            'level': 'info'
+        })
+        
+        return {
+            "success": True,
+            "message": "Task resumed",
+            "task_id": task_id,
+            "total_items": task.total_items,
+            "completed_items": counts['completed'],
+            "failed_items": counts['failed']
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error resuming task: {str(e)}")
+
+
+@router.get("/{task_id}/items")
+async def get_task_items(
+    task_id: str,
+    status: Optional[str] = None,
+    limit: int = 200,
+    db: AsyncSession = Depends(get_db)
+):
+    """Checkpoint of a bulk task: exact counts and processed items (status: completed, failed)"""
+    try:
+        task = (await db.execute(select(Task).filter(Task.task_id == task_id))).scalar_one_or_none()
+        if not task:
+            raise HTTPException(status_code=404, detail="Task not found")
+        
+        query = select(TaskItem).where(TaskItem.task_id == task_id)
+        if status:
+            query = query.where(TaskItem.status == status)
+        rows = await db.execute(query.order_by(TaskItem.item_index).limit(limit))
+        counts = await item_counts(db, task_id)
+        
+        return {
+            "success": True,
+            "task_id": task_id,
+            "status": task.status,
+            "total_items": task.total_items,
+            "completed_items": counts['completed'],
+            "failed_items": counts['failed'],
+            "remaining_items": (task.total_items - counts['completed'] - counts['failed']) if task.total_items else None,
+            "items": [
+                {
+                    "index": item.item_index,
+                    "key": item.item_key,
+                    "status": item.status,
+                    "error": item.error,
+                    "updated_at": item.updated_at.isoformat() if item.updated_at else None
+                }
+                for item in rows.scalars().all()
+            ]
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching task items: {str(e)}")
+
+
+def _history_response(task: Task, account: Optional[Account]) -> TaskHistoryResponse:
+    return TaskHistoryResponse(
+        id=task.id,
+        task_id=task.task_id,
+        account_id=task.account_id,
+        account_uid=account.uid if account else "Unknown",
+        account_name=account.name if account else None,
+        task_type=task.task_type,
+        task_name=task.task_name,
+        status=task.status,
+        priority=task.priority,
+        run_at=task.run_at,
+        progress=task.progress,
+        started_at=task.started_at,
+        completed_at=task.completed_at,
+        created_at=task.created_at,
+        error_message=task.error_message,
+        result=decode_payload(task.result, task.payload_version),
+        target_id=task.target_id,
+        result_status=task.result_status,
+        result_success=task.result_success,
+        attempts=task.attempts or 0,
+        last_error=task.last_error,
+        error_class=task.error_class,
+        total_items=task.total_items,
+        completed_items=task.completed_items or 0,
+        failed_items=task.failed_items or 0,
+        parent_task_id=task.parent_task_id,
+        child_count=task.child_count,
+        screenshot_url=screenshot_url(task.screenshot)
+    )
+
+
+async def _accounts_by_id(db: AsyncSession, account_ids) -> Dict[int, Account]:
+    """Accounts of several tasks with one IN query"""
+    account_ids = set(account_ids)
+    if not account_ids:
+        return {}
+    rows = await db.execute(select(Account).where(Account.id.in_(account_ids)))
+    return {account.id: account for account in rows.scalars().all()}
+
+
+async def _with_children(db: AsyncSession, tasks: List[Task]) -> List[TaskHistoryResponse]:
+    """History rows; fan-out parents get their children nested (loaded with one query)"""
+    children = await children_of(db, [task.task_id for task in tasks if task.child_count])
+    accounts = await _accounts_by_id(
+        db, [task.account_id for task in tasks] + [child.account_id for group in children.values() for child in group]
+    )
+    
+    response = []
+    for task in tasks:
+        row = _history_response(task, accounts.get(task.account_id))
+        if task.task_id in children:
+            row.children = [_history_response(child, accounts.get(child.account_id)) for child in children[task.task_id]]
+        response.append(row)
+    return response
+
+
 @router.get("/history", response_model=List[TaskHistoryResponse])
 async def get_task_history(
     limit: int = 50,
     offset: int = 0,
     status: Optional[str] = None,
     task_type: Optional[str] = None,
+    priority: Optional[str] = None,
+    target_id: Optional[str] = None,
+    result_status: Optional[str] = None,
+    success: Optional[bool] = None,
+    parent_task_id: Optional[str] = None,
+    expand_children: bool = False,
     db: AsyncSession = Depends(get_db)
 ):
-    """Get task history with filtering"""
+    """
+    Get task history with filtering (target/result filters use the indexed payload columns)
+    
+    Child tasks of a fan-out are collapsed into their parent (child_count and the
+    aggregated progress); expand_children=true nests them under the parent,
+    parent_task_id=... lists the children of one parent.
+    """
     try:
         query = select(Task).order_by(desc(Task.created_at))
         
+        if parent_task_id:
+            query = query.filter(Task.parent_task_id == parent_task_id)
+        else:
+            query = query.filter(Task.parent_task_id.is_(None))
+        
         if status:
             query = query.filter(Task.status == status)
         
         if task_type:
             query = query.filter(Task.task_type == task_type)
         
+        if priority:
+            query = query.filter(Task.priority == priority)
+        
+        if target_id:
+            query = query.filter(Task.target_id == target_id)
+        
+        if result_status:
+            query = query.filter(Task.result_status == result_status)
+        
+        if success is not None:
+            query = query.filter(Task.result_success == success)
+        
         query = query.limit(limit).offset(offset)
         
         result = await db.execute(query)
         tasks = result.scalars().all()
         
+        if expand_children:
+            return await _with_children(db, tasks)
+        
         # Join with account data
-        response = []
-        for task in tasks:
-            account = await crud.get_account(db, task.account_id)
-            
-            response.append(TaskHistoryResponse(
-                id=task.id,
-                task_id=task.task_id,
-                account_id=task.account_id,
-                account_uid=account.uid if account else "Unknown",
-                account_name=account.name if account else None,
-                task_type=task.task_type,
-                task_name=task.task_name,
-                status=task.status,
-                progress=task.progress,
-                started_at=task.started_at,
-                completed_at=task.completed_at,
-                created_at=task.created_at,
-                error_message=task.error_message,
-                result=task.result
-            ))
-        
-        return response
+        accounts = await _accounts_by_id(db, [task.account_id for task in tasks])
+        return [_history_response(task, accounts.get(task.account_id)) for task in tasks]
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching task history: {str(e)}")
@@ -405,7 +787,7 @@ async def get_task_history(
 
 @router.get("/history/{task_id}")
 async def get_task_detail(task_id: str, db: AsyncSession = Depends(get_db)):
-    """Get detailed information about a specific task"""
+    """Get detailed information about a specific task (a fan-out parent includes its children)"""
     try:
         query = select(Task).filter(Task.task_id == task_id)
         result = await db.execute(query)
@@ -414,26 +796,9 @@ async def get_task_detail(task_id: str, db: AsyncSession = Depends(get_db)):
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
-        account = await crud.get_account(db, task.account_id)
-        
         return {
             "success": True,
-            "task": TaskHistoryResponse(
-                id=task.id,
-                task_id=task.task_id,
-                account_id=task.account_id,
-                account_uid=account.uid if account else "Unknown",
-                account_name=account.name if account else None,
-                task_type=task.task_type,
-                task_name=task.task_name,
-                status=task.status,
-                progress=task.progress,
-                started_at=task.started_at,
-                completed_at=task.completed_at,
-                created_at=task.created_at,
-                error_message=task.error_message,
-                result=task.result
-            )
+            "task": (await _with_children(db, [task]))[0]
         }
         
     except HTTPException:
@@ -444,7 +809,7 @@ async def get_task_detail(task_id: str, db: AsyncSession = Depends(get_db)):
 
 @router.delete("/history/{task_id}")
 async def delete_task_history(task_id: str, db: AsyncSession = Depends(get_db)):
-    """Delete a task from history"""
+    """Delete a task from history (with its children for a fan-out parent)"""
     try:
         query = select(Task).filter(Task.task_id == task_id)
         result = await db.execute(query)
@@ -453,7 +818,12 @@ async def delete_task_history(task_id: str, db: AsyncSession = Depends(get_db)):
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
+        task_ids = [task_id]
+        if task.child_count:
+            task_ids += await child_ids(db, task_id)
+            await db.execute(delete(Task).where(Task.parent_task_id == task_id))
         await db.delete(task)
+        await db.execute(delete(TaskItem).where(TaskItem.task_id.in_(task_ids)))
         await db.commit()
         
         return {
@@ -470,20 +840,25 @@ async def delete_task_history(task_id: str, db: AsyncSession = Depends(get_db)):
 
 @router.post("/history/clear")
 async def clear_task_history(status: Optional[str] = None, db: AsyncSession = Depends(get_db)):
-    """Clear task history (optionally by status)"""
+    """Clear task history (optionally by status; fan-out children go with their parent)"""
     try:
         query = select(Task)
         
         if status:
-            query = query.filter(Task.status == status)
+            query = query.filter(Task.status == status, Task.parent_task_id.is_(None))
         
         result = await db.execute(query)
         tasks = result.scalars().all()
+        if status:
+            children = await children_of(db, [task.task_id for task in tasks if task.child_count])
+            tasks = list(tasks) + [child for group in children.values() for child in group]
         
         count = len(tasks)
         
         for task in tasks:
             await db.delete(task)
+        if tasks:
+            await db.execute(delete(TaskItem).where(TaskItem.task_id.in_([task.task_id for task in tasks])))
         
         await db.commit()
         
@@ -498,6 +873,49 @@ async def clear_task_history(status: Optional[str] = None, db: AsyncSession = De
         raise HTTPException(status_code=500, detail=f"Error clearing history: {str(e)}")
 
 
+# ============================================
+# SCREENSHOTS
+# ============================================
+
+@router.get("/screenshots/stats")
+async def get_screenshot_stats():
+    """Screenshot store usage and retention settings"""
+    try:
+        stats = await asyncio.to_thread(screenshot_store.stats)
+        return {"success": True, **stats}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching screenshot stats: {str(e)}")
+
+
+@router.post("/screenshots/cleanup")
+async def cleanup_screenshots():
+    """Apply screenshot retention (age and size cap) now"""
+    try:
+        removed = await asyncio.to_thread(screenshot_store.cleanup)
+        return {"success": True, "removed": removed}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error cleaning up screenshots: {str(e)}")
+
+
+@router.get("/screenshots/{ref}")
+async def get_screenshot(ref: str):
+    """Serve a stored screenshot (content-addressed, cached by the browser forever)"""
+    path = screenshot_store.open(ref)
+    if not path:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    
+    return FileResponse(
+        path,
+        media_type=MEDIA_TYPES[ref.rsplit('.', 1)[1]],
+        headers={
+            'Cache-Control': 'public, max-age=31536000, immutable',
+            'ETag': f'"{ref.split(".")[0]}"'
+        }
+    )
+
+
 # ============================================
 # CHROME SESSION MANAGEMENT
 # ============================================
@@ -506,6 +924,9 @@ async def clear_task_history(status: Optional[str] = None, db: AsyncSession = De
 async def create_chrome_session(request: ChromeSessionCreate, db: AsyncSession = Depends(get_db)):
     """Create a new Chrome session for an account"""
     try:
+        if request.profile not in SESSION_PROFILES:
+            raise HTTPException(status_code=400, detail=f"Unknown session profile: {request.profile}")
+        
         # Get account info
         account = await crud.get_account(db, request.account_id)
         if not account:
@@ -532,7 +953,8 @@ async def create_chrome_session(request: ChromeSessionCreate, db: AsyncSession =
             email=account.email,
             password=account.password,
             proxy=proxy,
-            headless=request.headless
+            headless=request.headless,
+            profile=request.profile
         )
         
         return ChromeSessionResponse(**session.to_dict())
@@ -547,6 +969,7 @@ async def create_chrome_session(request: ChromeSessionCreate, db: AsyncSession =
 async def get_chrome_sessions():
     """Get all active Chrome sessions"""
     try:
+        await chrome_manager.sample_sessions()
         sessions = chrome_manager.get_all_sessions()
         return [ChromeSessionResponse(**s) for s in sessions]
         
@@ -554,6 +977,74 @@ async def get_chrome_sessions():
         raise HTTPException(status_code=500, detail=f"Error fetching sessions: {str(e)}")
 
 
+@router.get("/chrome/readiness")
+async def get_page_readiness_stats():
+    """Per-action page readiness wait times (how long pages really take)"""
+    try:
+        return {
+            "success": True,
+            "profiles": {
+                action: {"floor_s": floor, "max_wait_s": max_wait}
+                for action, (floor, max_wait) in ACTION_PROFILES.items()
+            },
+            "actions": readiness_stats.to_dict()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching readiness stats: {str(e)}")
+
+
+@router.delete("/chrome/readiness")
+async def reset_page_readiness_stats():
+    """Reset page readiness statistics"""
+    readiness_stats.reset()
+    return {"success": True, "message": "Readiness statistics reset"}
+
+
+@router.get("/chrome/workers")
+async def get_browser_workers():
+    """Browser worker processes, the accounts routed to each and their sessions"""
+    try:
+        return {
+            "success": True,
+            "enabled": browser_workers.enabled,
+            "workers": await browser_workers.status()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching browser workers: {str(e)}")
+
+
+@router.get("/chrome/profiles")
+async def get_chrome_profiles():
+    """Persistent Chrome profile directories (count, disk usage, cap)"""
+    try:
+        stats = await asyncio.to_thread(chrome_manager.profile_store.stats)
+        return {"success": True, **stats}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching Chrome profiles: {str(e)}")
+
+
+@router.delete("/chrome/profiles/{account_id}")
+async def delete_chrome_profile(account_id: int):
+    """Delete an account's persistent profile (next session logs in from cookies)"""
+    try:
+        if await chrome_manager.get_session(account_id):
+            raise HTTPException(status_code=409, detail="Close the account's Chrome session first")
+        
+        removed = await asyncio.to_thread(chrome_manager.profile_store.remove, account_id)
+        if not removed:
+            raise HTTPException(status_code=404, detail="No profile for this account")
+        
+        return {"success": True, "message": f"Profile deleted for account {account_id}"}
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error deleting Chrome profile: {str(e)}")
+
+
 @router.get("/chrome/session/{account_id}")
 async def get_chrome_session(account_id: int):
     """Get specific Chrome session info"""
@@ -653,3 +1144,198 @@ async def get_task_stats(db: AsyncSession = Depends(get_db)):
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching stats: {str(e)}")
+
+
+@router.get("/scheduler")
+async def get_scheduler_stats():
+    """Priority lanes: pending / running / dispatched per lane, weights and reserved capacity"""
+    try:
+        return {
+            "success": True,
+            "scheduler": await task_scheduler.stats(),
+            "cancellation": task_cancellation.stats(),
+            "leases": await task_leases.stats(),
+            "node": task_nodes.stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching scheduler stats: {str(e)}")
+
+
+@router.get("/nodes")
+async def get_task_nodes():
+    """Nodes running tasks on this database: capacity, running tasks, browser sessions, liveness"""
+    try:
+        nodes = await task_nodes.nodes()
+        alive = [node for node in nodes if node['alive']]
+        return {
+            "success": True,
+            "node_id": task_nodes.node_id,
+            "nodes": nodes,
+            "alive": len(alive),
+            "capacity": sum(node['capacity'] for node in alive),
+            "free": sum(node['free'] for node in alive)
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching task nodes: {str(e)}")
+
+
+@router.get("/dead-letter")
+async def get_dead_letter_tasks(
+    task_type: Optional[str] = None,
+    error_class: Optional[str] = None,
+    limit: int = 100,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Tasks that failed for good (retries exhausted or non-retryable error)
+
+    - Counts per task_type / error_class
+    - Latest tasks with attempts and last error
+    """
+    try:
+        filters = [Task.status == 'failed']
+        if task_type:
+            filters.append(Task.task_type == task_type)
+        if error_class:
+            filters.append(Task.error_class == error_class)
+        
+        groups = await db.execute(
+            select(Task.task_type, Task.error_class, func.count(Task.id))
+            .where(*filters)
+            .group_by(Task.task_type, Task.error_class)
+        )
+        rows = await db.execute(
+            select(Task).where(*filters).order_by(Task.completed_at.desc()).limit(limit)
+        )
+        
+        return {
+            "success": True,
+            "groups": [
+                {"task_type": group_type, "error_class": group_class, "count": count}
+                for group_type, group_class, count in groups.all()
+            ],
+            "tasks": [
+                {
+                    "task_id": task.task_id,
+                    "account_id": task.account_id,
+                    "task_type": task.task_type,
+                    "attempts": task.attempts or 0,
+                    "max_attempts": policy_for(task.task_type).max_attempts,
+                    "error_class": task.error_class,
+                    "last_error": task.last_error or task.error_message,
+                    "completed_at": task.completed_at.isoformat() if task.completed_at else None
+                }
+                for task in rows.scalars().all()
+            ],
+            "retry": task_retry.stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching dead-letter tasks: {str(e)}")
+
+
+@router.post("/dead-letter/requeue")
+async def requeue_dead_letter_tasks(request: DeadLetterRequeueRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Put dead-lettered tasks back to pending (selected IDs, or all matching the filters)
+
+    - reset_attempts gives them a fresh retry budget
+    - spread_seconds staggers their run_at over a window
+    - a fan-out parent never runs itself: a matching parent resumes its
+      failed children (like /resume), requeued children refresh their parent
+    """
+    try:
+        filters = [Task.status == 'failed']
+        if request.task_ids:
+            filters.append(Task.task_id.in_(request.task_ids))
+        if request.task_type:
+            filters.append(Task.task_type == request.task_type)
+        if request.error_class:
+            filters.append(Task.error_class == request.error_class)
+        if len(filters) == 1:
+            raise HTTPException(status_code=400, detail="Give task_ids, task_type or error_class")
+        
+        resumed_children = 0
+        parents = (await db.execute(
+            select(Task.task_id).where(*filters, Task.child_count.isnot(None))
+        )).scalars().all()
+        for parent_task_id in parents:
+            resumed_children += (await resume_children(db, parent_task_id))['resumed']
+        if parents and request.reset_attempts:
+            await db.execute(
+                update(Task)
+                .where(Task.parent_task_id.in_(parents), Task.status == 'pending')
+                .values(attempts=0)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        
+        rows = (await db.execute(
+            select(Task.task_id, Task.parent_task_id).where(*filters, Task.child_count.is_(None))
+        )).all()
+        if not rows:
+            if resumed_children:
+                task_scheduler.notify()
+            return {"success": True, "requeued": 0, "resumed_children": resumed_children}
+        task_ids = [task_id for task_id, _ in rows]
+        parent_ids = {parent_task_id for _, parent_task_id in rows if parent_task_id}
+        
+        now = datetime.now()
+        step = request.spread_seconds / len(task_ids) if request.spread_seconds > 0 else 0
+        values = dict(status='pending', progress=0, error_message=None, result=None,
+                      result_status=None, result_success=None, started_at=None, completed_at=None,
+                      worker_id=None, lease_expires_at=None)
+        if request.reset_attempts:
+            values['attempts'] = 0
+        await db.execute(
+            update(Task.__table__)
+            .where(Task.__table__.c.task_id == bindparam('key'), Task.__table__.c.status == 'failed')
+            .values(run_at=bindparam('new_run_at'), **values),
+            [
+                {'key': task_id, 'new_run_at': now + timedelta(seconds=i * step) if step else None}
+                for i, task_id in enumerate(task_ids)
+            ]
+        )
+        await db.commit()
+        
+        for i, task_id in enumerate(task_ids):
+            task_progress.reset(task_id)
+            if step:
+                delayed_jobs.schedule(task_id, now + timedelta(seconds=i * step))
+        for parent_task_id in parent_ids:
+            await refresh_parent(parent_task_id)
+        task_scheduler.notify()
+        
+        await crud.create_log(db, {
+            'action': 'requeue_dead_letter',
+            'message': f"Requeued {len(task_ids)} failed task(s)",
+            'level': 'info'
+        })
+        
+        return {
+            "success": True,
+            "requeued": len(task_ids),
+            "task_ids": task_ids,
+            "resumed_children": resumed_children
+        }
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error requeuing tasks: {str(e)}")
+
+
+@router.get("/delayed")
+async def get_delayed_jobs_stats():
+    """Delayed/scheduled tasks: count and next run_at in the DB, entries held in memory"""
+    try:
+        return {
+            "success": True,
+            "delayed": await delayed_jobs.stats()
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching delayed jobs: {str(e)}")
@@ -1,17 +1,87 @@
 """
 Task Status API
-Real-time task status updates via polling
+Real-time task status: live progress pushed over WebSocket (/ws) or SSE
+(/events), batched status lookups, and the polling endpoints
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_
 from core.database import get_db, Task, Account
+from core.task_codec import decode_payload
+from services.task_progress import task_progress, TERMINAL_STATUSES
+from services.task_fanout import children_of
+from services.task_scheduler import task_scheduler, priority_for, LANES
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 
 router = APIRouter(prefix="/api/task", tags=["Task Status"])
 
+# SSE keep-alive comment interval (seconds)
+EVENTS_KEEPALIVE = 15
+MAX_BATCH_TASK_IDS = 500
+
+
+class TaskStatusBatchRequest(BaseModel):
+    task_ids: List[str]
+
+
+def _task_status(task: Task) -> Dict[str, Any]:
+    """Status of a task row, with the in-memory progress when it is newer"""
+    data = {
+        "task_id": task.task_id,
+        "task_type": task.task_type,
+        "priority": task.priority,
+        "task_name": task.task_name,
+        "status": task.status,
+        "progress": task.progress,
+        "message": None,
+        "started_at": task.started_at.isoformat() if task.started_at else None,
+        "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+        "created_at": task.created_at.isoformat(),
+        "result": decode_payload(task.result, task.payload_version),
+        "error_message": task.error_message,
+        "account_id": task.account_id
+    }
+    live = task_progress.get(task.task_id)
+    # A finished row (e.g. cancelled from the UI) wins over a stale running state
+    if live and task.status not in TERMINAL_STATUSES:
+        for key in ("status", "progress", "message", "started_at", "completed_at", "error_message"):
+            if live[key] is not None:
+                data[key] = live[key]
+        if live["result"] is not None:
+            data["result"] = live["result"]
+    return data
+
+
+def _log_entry(task: Task) -> Dict[str, Any]:
+    return {
+        "task_id": task.task_id,
+        "task_type": task.task_type,
+        "priority": task.priority,
+        "task_name": task.task_name,
+        "status": task.status,
+        "progress": task.progress,
+        "started_at": task.started_at.isoformat() if task.started_at else None,
+        "completed_at": task.completed_at.isoformat() if task.completed_at else None,
+        "created_at": task.created_at.isoformat(),
+        "result": decode_payload(task.result, task.payload_version),
+        "error_message": task.error_message,
+        "account_id": task.account_id,
+        "parent_task_id": task.parent_task_id,
+        "child_count": task.child_count
+    }
+
+
+def _parse_task_ids(task_ids: Optional[str]) -> Optional[List[str]]:
+    ids = [task_id.strip() for task_id in (task_ids or '').split(',') if task_id.strip()]
+    return ids or None
+
 
 @router.get("/{task_id}/status")
 async def get_task_status(
@@ -39,18 +109,39 @@ async def get_task_status(
         if not task:
             raise HTTPException(status_code=404, detail="Task not found")
         
+        return _task_status(task)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/status/batch")
+async def get_task_statuses(
+    request: TaskStatusBatchRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Status của nhiều task trong một request (một query IN thay vì poll từng task)
+    
+    Body: {"task_ids": [...]} (tối đa 500)
+    Returns: tasks (task_id -> status), missing (ID không tồn tại)
+    """
+    try:
+        task_ids = list(dict.fromkeys(request.task_ids))
+        if len(task_ids) > MAX_BATCH_TASK_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_TASK_IDS} task IDs per request")
+        
+        statuses = {}
+        if task_ids:
+            result = await db.execute(select(Task).where(Task.task_id.in_(task_ids)))
+            statuses = {task.task_id: _task_status(task) for task in result.scalars().all()}
+        
         return {
-            "task_id": task.task_id,
-            "task_type": task.task_type,
-            "task_name": task.task_name,
-            "status": task.status,
-            "progress": task.progress,
-            "started_at": task.started_at.isoformat() if task.started_at else None,
-            "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-            "created_at": task.created_at.isoformat(),
-            "result": task.result,
-            "error_message": task.error_message,
-            "account_id": task.account_id
+            "success": True,
+            "tasks": statuses,
+            "missing": [task_id for task_id in task_ids if task_id not in statuses]
         }
         
     except HTTPException:
@@ -59,11 +150,90 @@ async def get_task_status(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/events")
+async def stream_task_events(
+    task_ids: Optional[str] = Query(None, description="Comma separated task IDs (default: all tasks)")
+):
+    """
+    Server-Sent Events: một event mỗi khi progress/status của task thay đổi
+    
+    Event đầu tiên (snapshot) chứa trạng thái hiện tại của các task đang theo dõi.
+    """
+    ids = _parse_task_ids(task_ids)
+    queue = task_progress.subscribe(ids)
+    
+    async def events():
+        try:
+            snapshot = task_progress.snapshot(ids) if ids else {s['task_id']: s for s in task_progress.active()}
+            yield f"event: snapshot\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: task\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            task_progress.unsubscribe(queue)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/ws")
+async def task_events_websocket(websocket: WebSocket, task_ids: Optional[str] = None):
+    """
+    WebSocket: {"type": "snapshot"|"task", ...} messages for task changes.
+    The client can change its filter by sending {"subscribe": [task_ids]}
+    (an empty list means all tasks).
+    """
+    await websocket.accept()
+    ids = _parse_task_ids(task_ids)
+    queue = task_progress.subscribe(ids)
+    
+    async def send_snapshot(task_filter):
+        snapshot = task_progress.snapshot(task_filter) if task_filter else {s['task_id']: s for s in task_progress.active()}
+        await websocket.send_text(json.dumps({"type": "snapshot", "tasks": snapshot}, default=str))
+    
+    async def receive():
+        while True:
+            message = await websocket.receive_json()
+            if isinstance(message, dict) and 'subscribe' in message:
+                task_filter = [str(task_id) for task_id in message['subscribe'] or []] or None
+                task_progress.resubscribe(queue, task_filter)
+                await send_snapshot(task_filter)
+    
+    receiver = asyncio.create_task(receive())
+    try:
+        await send_snapshot(ids)
+        while True:
+            getter = asyncio.create_task(queue.get())
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                # Client disconnected (or sent something that is not JSON)
+                getter.cancel()
+                break
+            await websocket.send_text(json.dumps({"type": "task", **getter.result()}, default=str))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        receiver.cancel()
+        task_progress.unsubscribe(queue)
+
+
 @router.get("/logs")
 async def get_task_logs(
     task_id: Optional[str] = Query(None, description="Filter by task ID"),
     account_id: Optional[int] = Query(None, description="Filter by account ID"),
     status: Optional[str] = Query(None, description="Filter by status"),
+    priority: Optional[str] = Query(None, description="Filter by lane (interactive, normal, bulk)"),
+    target_id: Optional[str] = Query(None, description="Filter by target (group_id, uid, post_url ...)"),
+    result_status: Optional[str] = Query(None, description="Filter by result status (live, die, checkpoint ...)"),
+    parent_task_id: Optional[str] = Query(None, description="Children of a fan-out parent task"),
+    expand_children: bool = Query(False, description="Nest child tasks under their parent"),
     limit: int = Query(50, ge=1, le=200, description="Max number of logs"),
     offset: int = Query(0, ge=0, description="Offset for pagination"),
     db: AsyncSession = Depends(get_db)
@@ -75,6 +245,11 @@ async def get_task_logs(
     - task_id: Filter theo task ID
     - account_id: Filter theo account ID
     - status: Filter theo status
+    - priority: Filter theo lane (interactive, normal, bulk)
+    - target_id: Filter theo đối tượng của task (cột đã index)
+    - result_status: Filter theo trạng thái kết quả (cột đã index)
+    - parent_task_id: Các task con của một task cha (fan-out)
+    - expand_children: Lồng task con vào task cha (mặc định task con được thu gọn vào cha)
     - limit: Số lượng tối đa (default 50, max 200)
     - offset: Bỏ qua bao nhiêu records
     """
@@ -82,12 +257,23 @@ async def get_task_logs(
         query = select(Task).order_by(Task.created_at.desc())
         
         conditions = []
+        if parent_task_id:
+            conditions.append(Task.parent_task_id == parent_task_id)
+        elif not task_id:
+            # Children are collapsed into their parent
+            conditions.append(Task.parent_task_id.is_(None))
         if task_id:
             conditions.append(Task.task_id == task_id)
         if account_id:
             conditions.append(Task.account_id == account_id)
         if status:
             conditions.append(Task.status == status)
+        if priority:
+            conditions.append(Task.priority == priority)
+        if target_id:
+            conditions.append(Task.target_id == target_id)
+        if result_status:
+            conditions.append(Task.result_status == result_status)
         
         if conditions:
             query = query.where(and_(*conditions))
@@ -97,21 +283,12 @@ async def get_task_logs(
         result = await db.execute(query)
         tasks = result.scalars().all()
         
-        logs = []
-        for task in tasks:
-            logs.append({
-                "task_id": task.task_id,
-                "task_type": task.task_type,
-                "task_name": task.task_name,
-                "status": task.status,
-                "progress": task.progress,
-                "started_at": task.started_at.isoformat() if task.started_at else None,
-                "completed_at": task.completed_at.isoformat() if task.completed_at else None,
-                "created_at": task.created_at.isoformat(),
-                "result": task.result,
-                "error_message": task.error_message,
-                "account_id": task.account_id
-            })
+        logs = [_log_entry(task) for task in tasks]
+        if expand_children:
+            children = await children_of(db, [task.task_id for task in tasks if task.child_count])
+            for entry in logs:
+                if entry["task_id"] in children:
+                    entry["children"] = [_log_entry(child) for child in children[entry["task_id"]]]
         
         return {
             "success": True,
@@ -149,15 +326,19 @@ async def get_running_tasks(
                 select(Account).where(Account.id == task.account_id)
             )
             account = account_result.scalar_one_or_none()
+            live = task_progress.get(task.task_id) or {}
             
             running_tasks.append({
                 "task_id": task.task_id,
                 "task_type": task.task_type,
+                "priority": task.priority,
                 "task_name": task.task_name,
-                "status": task.status,
-                "progress": task.progress,
+                "status": live.get("status") or task.status,
+                "progress": live.get("progress", task.progress),
                 "started_at": task.started_at.isoformat() if task.started_at else None,
                 "created_at": task.created_at.isoformat(),
+                "worker_id": task.worker_id,
+                "lease_expires_at": task.lease_expires_at.isoformat() if task.lease_expires_at else None,
                 "account": {
                     "id": account.id,
                     "uid": account.uid,
@@ -202,6 +383,7 @@ async def get_recent_tasks(
             recent_tasks.append({
                 "task_id": task.task_id,
                 "task_type": task.task_type,
+                "priority": task.priority,
                 "task_name": task.task_name,
                 "status": task.status,
                 "progress": task.progress,
@@ -234,47 +416,53 @@ async def run_task(
     - task_type: Type of task (check_account, join_groups, etc.)
     - account_id: ID of account to use
     - params: Task parameters (optional)
+    - idempotency_key: repeated requests with the same key return the same task (optional)
+    
+    An identical pending/processing task is returned instead of a new one (duplicate=true).
     """
     try:
         from core import crud
-        import uuid
         
         task_type = task_data.get('task_type')
         account_id = task_data.get('account_id')
-        params = task_data.get('params', {})
+        params = task_data.get('params') or {}
         
         if not task_type or not account_id:
             raise HTTPException(status_code=400, detail="task_type and account_id are required")
+        if not isinstance(params, dict):
+            raise HTTPException(status_code=422, detail="params must be an object")
+        priority = task_data.get('priority') or priority_for(task_type, params)
+        if priority not in LANES:
+            raise HTTPException(status_code=400, detail=f"priority must be one of: {', '.join(LANES)}")
         
         # Check if account exists
         account = await crud.get_account(db, account_id)
         if not account:
             raise HTTPException(status_code=404, detail="Account not found")
         
-        # Create task
-        task_id = f"{task_type}_{uuid.uuid4().hex[:8]}"
-        task = Task(
-            task_id=task_id,
-            account_id=account_id,
-            task_type=task_type,
-            task_name=task_type.replace('_', ' ').title(),
-            params=str(params),
-            status='pending',
-            progress=0,
-            created_at=datetime.now()
-        )
-        
-        db.add(task)
-        await db.commit()
-        await db.refresh(task)
+        # Create task (or find the identical one)
+        task, created = await crud.create_task_once(db, {
+            'task_id': crud.new_task_id(task_type),
+            'account_id': account_id,
+            'task_type': task_type,
+            'task_name': task_type.replace('_', ' ').title(),
+            'params': params,
+            'priority': priority,
+            'idempotency_key': task_data.get('idempotency_key')
+        })
+        task_id = task.task_id
+        if created:
+            task_scheduler.notify()
         
         return {
             "success": True,
             "task_id": task_id,
-            "message": f"Task {task_type} created successfully",
+            "duplicate": not created,
+            "message": f"Task {task_type} created successfully" if created else f"Task {task_type} already exists",
             "task": {
                 "task_id": task.task_id,
                 "task_type": task.task_type,
+                "priority": task.priority,
                 "status": task.status,
                 "progress": task.progress,
                 "created_at": task.created_at.isoformat()
@@ -0,0 +1,354 @@
+"""
+Bi Ads - API Load & Benchmark Suite
+Author: Bi Ads Team
+Version: 3.0.0
+
+Seeds a configurable dataset into a scratch database (via
+data/generate_dataset.py), drives the main read and write endpoints with
+concurrent in-process clients and reports p50/p95/p99 latency, throughput
+and peak RSS per endpoint.
+
+Usage (from backend/):
+    python -m benchmarks.api_benchmark --accounts 50000 --proxies 10000 \\
+        --logs 1000000 --messages 2000000 --facebook-ids 5000000 \\
+        --concurrency 20 --requests 500 --output bench_results.json
+
+    python -m benchmarks.api_benchmark --compare old.json --output new.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+# ============================================
+# MEMORY SAMPLING
+# ============================================
+
+def current_rss_mb() -> float:
+    """Current resident set size of this process in MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss / (1024 * 1024) if sys.platform == 'darwin' else maxrss / 1024
+
+
+class RSSSampler:
+    """Samples RSS in the background and keeps the peak value"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.peak_mb = current_rss_mb()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> float:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+        return self.peak_mb
+
+
+# ============================================
+# SCENARIOS
+# ============================================
+
+class Scenario:
+    """One endpoint to benchmark"""
+
+    def __init__(self, name: str, method: str, build: Callable[[random.Random, int], Dict[str, Any]]):
+        self.name = name
+        self.method = method
+        self.build = build  # (rng, request_no) -> {'url': ..., 'json': ...}
+
+
+def build_scenarios(sizes: Dict[str, int]) -> List[Scenario]:
+    """Main read and write endpoints of the API"""
+    n_accounts = max(sizes['accounts'], 1)
+
+    def account_id(rng):
+        return rng.randint(1, n_accounts)
+
+    return [
+        # Reads
+        Scenario('GET /api/accounts', 'GET', lambda rng, i: {'url': '/api/accounts?limit=100'}),
+        Scenario('GET /api/accounts/{id}', 'GET', lambda rng, i: {'url': f"/api/accounts/{account_id(rng)}"}),
+        Scenario('GET /api/proxies', 'GET', lambda rng, i: {'url': '/api/proxies?limit=100'}),
+        Scenario('GET /api/tasks', 'GET', lambda rng, i: {'url': '/api/tasks?limit=100'}),
+        Scenario('GET /api/tasks/history', 'GET', lambda rng, i: {'url': '/api/tasks/history?limit=50'}),
+        Scenario('GET /api/logs', 'GET', lambda rng, i: {'url': '/api/logs?limit=100'}),
+        Scenario('GET /api/activity/', 'GET', lambda rng, i: {'url': '/api/activity/?limit=100'}),
+        Scenario('GET /api/messages/', 'GET', lambda rng, i: {'url': f"/api/messages/?account_id={account_id(rng)}&limit=50"}),
+        Scenario('GET /api/facebook-ids/', 'GET', lambda rng, i: {'url': '/api/facebook-ids/?limit=100'}),
+        Scenario('GET /api/stats', 'GET', lambda rng, i: {'url': '/api/stats'}),
+        # Writes
+        Scenario('POST /api/tasks', 'POST', lambda rng, i: {
+            'url': '/api/tasks',
+            'json': {'task_type': 'check_account', 'account_id': account_id(rng), 'params': {'n': i}}
+        }),
+        Scenario('POST /api/task/run', 'POST', lambda rng, i: {
+            'url': '/api/task/run',
+            'json': {'task_type': 'join_groups', 'account_id': account_id(rng), 'params': {'group_list': [str(i)]}}
+        }),
+        Scenario('POST /api/activity/', 'POST', lambda rng, i: {
+            'url': '/api/activity/',
+            'json': {'action': 'benchmark', 'message': f"Benchmark log {i}", 'level': 'info'}
+        }),
+    ]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[k]
+
+
+async def run_scenario(client, scenario: Scenario, total_requests: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    """Fire `total_requests` requests with `concurrency` parallel clients"""
+    latencies: List[float] = []
+    status_counts: Dict[str, int] = {}
+    counter = iter(range(total_requests))
+
+    async def worker(worker_no: int):
+        rng = random.Random(seed * 1000 + worker_no)
+        for i in counter:
+            req = scenario.build(rng, i)
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, req['url'], json=req.get('json'))
+                status = str(response.status_code)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            status_counts[status] = status_counts.get(status, 0) + 1
+
+    sampler = RSSSampler()
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    peak_rss = await sampler.stop()
+
+    latencies.sort()
+    errors = sum(count for status, count in status_counts.items() if not status.startswith('2'))
+
+    return {
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'min': round(latencies[0], 2) if latencies else 0.0,
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0,
+            'mean': round(sum(latencies) / len(latencies), 2) if latencies else 0.0
+        },
+        'errors': errors,
+        'status_counts': status_counts,
+        'peak_rss_mb': round(peak_rss, 1)
+    }
+
+
+# ============================================
+# REPORTING
+# ============================================
+
+def git_revision() -> Optional[str]:
+    """Current git commit of the repo, if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    """Print a results table"""
+    print(f"\n{'Endpoint':<32} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>6} {'RSS MB':>8}")
+    print("-" * 88)
+    for name, r in results.items():
+        lat = r['latency_ms']
+        print(f"{name:<32} {r['throughput_rps']:>9.1f} {lat['p50']:>9.2f} {lat['p95']:>9.2f} "
+              f"{lat['p99']:>9.2f} {r['errors']:>6} {r['peak_rss_mb']:>8.1f}")
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], threshold_pct: float) -> List[str]:
+    """Return human readable regressions between two result files"""
+    regressions = []
+    for name, cur in current['endpoints'].items():
+        old = baseline.get('endpoints', {}).get(name)
+        if not old:
+            continue
+        for key in ('p50', 'p95', 'p99'):
+            before, after = old['latency_ms'][key], cur['latency_ms'][key]
+            if before > 0 and (after - before) / before * 100 > threshold_pct:
+                regressions.append(f"{name} {key}: {before:.2f}ms -> {after:.2f}ms (+{(after - before) / before * 100:.0f}%)")
+        before, after = old['throughput_rps'], cur['throughput_rps']
+        if before > 0 and (before - after) / before * 100 > threshold_pct:
+            regressions.append(f"{name} throughput: {before:.1f} -> {after:.1f} req/s")
+    return regressions
+
+
+# ============================================
+# MAIN
+# ============================================
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    """Seed database, start the app in-process and run all scenarios"""
+    db_path = Path(args.database) if args.database else Path(tempfile.mkdtemp(prefix='bi_ads_bench_')) / 'bench.db'
+    reuse = db_path.exists() and args.reuse_database
+    if db_path.exists() and not reuse:
+        db_path.unlink()
+
+    # Must be set before core.database creates the engine
+    os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{db_path}"
+
+    import httpx
+    from core.database import engine, init_db
+    from data.generate_dataset import generate_dataset
+    from main import app
+
+    engine.sync_engine.echo = False
+
+    sizes = {
+        'accounts': args.accounts,
+        'proxies': args.proxies,
+        'tasks': args.tasks,
+        'logs': args.logs,
+        'messages': args.messages,
+        'facebook_ids': args.facebook_ids
+    }
+
+    if not reuse:
+        print(f"\n🎲 Seeding dataset into {db_path} ...")
+        started = time.perf_counter()
+        await asyncio.to_thread(generate_dataset, f"sqlite:///{db_path}", {
+            'accounts': sizes['accounts'],
+            'proxies': sizes['proxies'],
+            'tasks': sizes['tasks'],
+            'activity_logs': sizes['logs'],
+            'messages': sizes['messages'],
+            'facebook_ids': sizes['facebook_ids']
+        }, args.seed)
+        print(f"✅ Seeded in {time.perf_counter() - started:.1f}s")
+    await init_db()
+
+    scenarios = build_scenarios(sizes)
+    if args.only:
+        scenarios = [s for s in scenarios if any(key in s.name for key in args.only)]
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+        for scenario in scenarios:
+            if args.warmup:
+                await run_scenario(client, scenario, args.warmup, 1, args.seed)
+            print(f"⏱  {scenario.name} ...")
+            results[scenario.name] = await run_scenario(
+                client, scenario, args.requests, args.concurrency, args.seed
+            )
+
+    await engine.dispose()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': str(db_path),
+            'seed': args.seed,
+            'dataset': sizes,
+            'requests_per_endpoint': args.requests,
+            'concurrency': args.concurrency
+        },
+        'endpoints': results
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bi Ads API load & benchmark suite")
+    parser.add_argument('--accounts', type=int, default=50000)
+    parser.add_argument('--proxies', type=int, default=10000)
+    parser.add_argument('--tasks', type=int, default=100000)
+    parser.add_argument('--logs', type=int, default=1000000)
+    parser.add_argument('--messages', type=int, default=2000000)
+    parser.add_argument('--facebook-ids', type=int, default=5000000)
+    parser.add_argument('--concurrency', type=int, default=20, help="Concurrent in-process clients")
+    parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint")
+    parser.add_argument('--warmup', type=int, default=10, help="Warm-up requests per endpoint (not measured)")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for data and request mix")
+    parser.add_argument('--database', help="SQLite file to use (default: temporary file)")
+    parser.add_argument('--reuse-database', action='store_true', help="Skip seeding if --database exists")
+    parser.add_argument('--only', nargs='*', help="Only run endpoints whose name contains one of these")
+    parser.add_argument('--output', default='bench_results.json', help="Where to save JSON results")
+    parser.add_argument('--compare', help="Baseline JSON results to compare against")
+    parser.add_argument('--regression-threshold', type=float, default=20.0, help="Allowed slowdown in percent")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("🏁 Bi Ads API Benchmark")
+    print("=" * 60)
+
+    report = asyncio.run(run_benchmark(args))
+    print_results(report['endpoints'])
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.regression_threshold)
+        if regressions:
+            print(f"\n⚠️  {len(regressions)} regression(s) vs {args.compare}:")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"\n🎉 No regressions vs {args.compare}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
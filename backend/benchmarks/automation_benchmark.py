@@ -0,0 +1,320 @@
+"""
+Bi Ads - Automation Pipeline Benchmark
+Author: Bi Ads Team
+Version: 3.0.0
+
+Runs the account checker, group join, group scan and timeline post flows
+against the simulated browser backend (services/fake_browser.py) so the
+task pipeline's own cost - session management, Task rows, activity logs,
+DB commits - can be measured without Chrome.
+
+Page readiness floors (minimum pause per action) are multiplied by
+--floor-scale (0 = none) so the run measures pipeline and DB overhead
+instead of human-like delays.
+
+With --workers N the browsers run in N worker processes
+(services/browser_workers.py) and this process only schedules tasks and
+records results, like the API with BROWSER_WORKERS=N.
+
+Usage (from backend/):
+    python -m benchmarks.automation_benchmark --tasks 2000 --concurrency 50
+    python -m benchmarks.automation_benchmark --workers 4 --latency-ms 20
+
+    python -m benchmarks.automation_benchmark --latency-ms 50 --failure-rate 0.02 \\
+        --states live=0.85,checkpoint=0.1,die=0.05 --output automation_results.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.api_benchmark import RSSSampler, git_revision, percentile
+
+FLOWS = ('check_account', 'join_group', 'scan_groups', 'post_to_timeline')
+
+# flow -> (FacebookAutomator method, kwargs for task n)
+FLOW_ACTIONS = {
+    'check_account': ('check_account_live', lambda n: {}),
+    'join_group': ('join_group', lambda n: {'group_id': str(10**14 + n)}),
+    'scan_groups': ('scan_groups', lambda n: {'keyword': f"keyword {n % 50}", 'max_results': 20}),
+    'post_to_timeline': ('post_to_timeline', lambda n: {'content': f"Benchmark post #{n}"})
+}
+
+
+# ============================================
+# FLOWS
+# ============================================
+
+async def run_automation_task(flow: str, account_id: int, n: int, pool=None) -> str:
+    """Run one automation flow the way a worker would; returns the task outcome"""
+    from core import crud
+    from core.database import AsyncSessionLocal
+    from services.chrome_manager import chrome_manager
+    from services.facebook_automator import FacebookAutomator
+    from api.account_checker_api import check_account_task
+
+    async with AsyncSessionLocal() as db:
+        if flow == 'check_account' and pool is None:
+            await check_account_task(account_id, db)
+            return 'done'
+
+        account = await crud.get_account(db, account_id)
+        task_id = f"bench_{flow}_{n}"
+        await crud.create_task(db, {
+            'task_id': task_id,
+            'account_id': account_id,
+            'task_type': flow,
+            'task_name': f"Benchmark {flow} #{n}",
+            'params': {'n': n}
+        })
+
+        try:
+            await crud.update_task_status(db, task_id, 'processing', progress=0)
+            action, kwargs = FLOW_ACTIONS[flow][0], FLOW_ACTIONS[flow][1](n)
+
+            if pool is not None:
+                # Browser work happens in a worker process
+                result = await pool.run(account.id, action, {
+                    'account_uid': account.uid,
+                    'cookies': account.cookies,
+                    'email': account.email,
+                    'password': account.password,
+                    'headless': True
+                }, **kwargs)
+            else:
+                session = await chrome_manager.get_session(account_id)
+                if not session:
+                    session = await chrome_manager.create_session(
+                        account_id=account.id,
+                        account_uid=account.uid,
+                        cookies=account.cookies,
+                        email=account.email,
+                        password=account.password,
+                        headless=True
+                    )
+                result = await getattr(FacebookAutomator(session), action)(**kwargs)
+
+            if flow == 'scan_groups':
+                result = {'success': True, 'groups': result}
+
+            status = 'completed' if result.get('success') else 'failed'
+            await crud.update_task_status(
+                db, task_id, status, progress=100,
+                result=result, error_message=None if status == 'completed' else result.get('message')
+            )
+            return status
+        except Exception as e:
+            await crud.update_task_status(db, task_id, 'failed', error_message=str(e))
+            return 'failed'
+
+
+async def run_flow(flow: str, account_ids: List[int], total: int, concurrency: int, seed: int,
+                   pool=None) -> Dict[str, Any]:
+    """Run `total` tasks of one flow with `concurrency` workers"""
+    latencies: List[float] = []
+    outcomes: Counter = Counter()
+    counter = iter(range(total))
+
+    async def worker(worker_no: int):
+        rng = random.Random(seed * 1000 + worker_no)
+        for n in counter:
+            started = time.perf_counter()
+            try:
+                outcome = await run_automation_task(flow, rng.choice(account_ids), n, pool)
+            except Exception as e:
+                outcome = type(e).__name__
+            latencies.append((time.perf_counter() - started) * 1000)
+            outcomes[outcome] += 1
+
+    sampler = RSSSampler()
+    sampler.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    peak_rss = await sampler.stop()
+
+    latencies.sort()
+    return {
+        'tasks': len(latencies),
+        'concurrency': concurrency,
+        'duration_s': round(elapsed, 3),
+        'tasks_per_min': round(len(latencies) / elapsed * 60, 1) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 2),
+            'p95': round(percentile(latencies, 95), 2),
+            'p99': round(percentile(latencies, 99), 2),
+            'max': round(latencies[-1], 2) if latencies else 0.0
+        },
+        'outcomes': dict(outcomes),
+        'peak_rss_mb': round(peak_rss, 1)
+    }
+
+
+async def task_status_counts(flow: str) -> Dict[str, int]:
+    """Task rows written by a flow, grouped by status"""
+    from sqlalchemy import select, func
+    from core.database import AsyncSessionLocal, Task
+
+    async with AsyncSessionLocal() as db:
+        rows = await db.execute(
+            select(Task.status, func.count(Task.id)).where(Task.task_type == flow).group_by(Task.status)
+        )
+        return {status: count for status, count in rows.all()}
+
+
+async def run_benchmark(args) -> Dict[str, Any]:
+    """Seed accounts, switch to the fake browser and run every flow"""
+    db_path = Path(args.database) if args.database else Path(tempfile.mkdtemp(prefix='bi_ads_auto_')) / 'bench.db'
+    if db_path.exists():
+        db_path.unlink()
+
+    # Must be set before core.database / services.chrome_manager are imported
+    os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{db_path}"
+    os.environ['BROWSER_BACKEND'] = 'fake'
+    os.environ['PAGE_READY_FLOOR_SCALE'] = str(args.floor_scale)
+    # Worker processes build their fake browser from the environment
+    os.environ.update({
+        'FAKE_BROWSER_LATENCY_MS': str(args.latency_ms),
+        'FAKE_BROWSER_JITTER_MS': str(args.jitter_ms),
+        'FAKE_BROWSER_FAILURE_RATE': str(args.failure_rate),
+        'FAKE_BROWSER_STARTUP_MS': str(args.startup_ms),
+        'FAKE_BROWSER_STATES': args.states,
+        'FAKE_BROWSER_SEED': str(args.seed)
+    })
+
+    from core.database import engine, init_db
+    from data.generate_dataset import generate_dataset
+    from services.chrome_manager import chrome_manager
+    from services.browser_workers import BrowserWorkerPool
+    from services.fake_browser import FakeBrowserFactory, parse_state_weights
+    from services.page_readiness import readiness_stats
+
+    engine.sync_engine.echo = False
+    factory = FakeBrowserFactory(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        startup_ms=args.startup_ms,
+        state_weights=parse_state_weights(args.states),
+        seed=args.seed
+    )
+    chrome_manager.driver_factory = factory
+
+    await asyncio.to_thread(generate_dataset, f"sqlite:///{db_path}", {
+        'accounts': args.accounts,
+        'proxies': max(args.accounts // 5, 1)
+    }, args.seed, log=lambda msg: None)
+    await init_db()
+
+    account_ids = list(range(1, args.accounts + 1))
+    flows = [flow for flow in FLOWS if not args.only or any(key in flow for key in args.only)]
+
+    pool = None
+    if args.workers:
+        pool = BrowserWorkerPool(size=args.workers)
+        await pool.start()
+
+    results = {}
+    for flow in flows:
+        print(f"⏱  {flow} ...")
+        await chrome_manager.close_all_sessions()
+        results[flow] = await run_flow(flow, account_ids, args.tasks, args.concurrency, args.seed, pool)
+        results[flow]['task_rows'] = await task_status_counts(flow)
+
+    if pool:
+        await pool.stop()
+    await chrome_manager.close_all_sessions()
+    await engine.dispose()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': str(db_path),
+            'seed': args.seed,
+            'accounts': args.accounts,
+            'tasks_per_flow': args.tasks,
+            'concurrency': args.concurrency,
+            'workers': args.workers,
+            'floor_scale': args.floor_scale,
+            'browser': {
+                'latency_ms': args.latency_ms,
+                'jitter_ms': args.jitter_ms,
+                'failure_rate': args.failure_rate,
+                'startup_ms': args.startup_ms,
+                'states': factory.state_weights,
+                'drivers_created': factory.drivers_created
+            }
+        },
+        'flows': results,
+        'readiness': readiness_stats.to_dict()
+    }
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    """Print a results table"""
+    print(f"\n{'Flow':<20} {'tasks/min':>10} {'p50':>9} {'p95':>9} {'p99':>9} {'RSS MB':>8}  outcomes")
+    print("-" * 96)
+    for name, r in results.items():
+        lat = r['latency_ms']
+        outcomes = ', '.join(f"{k}={v}" for k, v in sorted(r['outcomes'].items()))
+        print(f"{name:<20} {r['tasks_per_min']:>10.1f} {lat['p50']:>9.2f} {lat['p95']:>9.2f} "
+              f"{lat['p99']:>9.2f} {r['peak_rss_mb']:>8.1f}  {outcomes}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bi Ads automation pipeline benchmark (fake browser)")
+    parser.add_argument('--accounts', type=int, default=500)
+    parser.add_argument('--tasks', type=int, default=1000, help="Tasks per flow")
+    parser.add_argument('--concurrency', type=int, default=20, help="Concurrent workers")
+    parser.add_argument('--workers', type=int, default=0,
+                        help="Browser worker processes (0 = browsers in this process)")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Simulated page load time")
+    parser.add_argument('--jitter-ms', type=float, default=0, help="Random +/- added to page load time")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="Probability a page load times out")
+    parser.add_argument('--startup-ms', type=float, default=0, help="Simulated browser start time")
+    parser.add_argument('--states', default='live=0.85,checkpoint=0.1,die=0.05',
+                        help="Account state weights for the fake browser")
+    parser.add_argument('--floor-scale', type=float, default=0.0,
+                        help="Multiplier for page readiness floors (1 = production pauses)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help="SQLite file to use (default: temporary file)")
+    parser.add_argument('--only', nargs='*', help="Only run flows whose name contains one of these")
+    parser.add_argument('--output', default='automation_results.json', help="Where to save JSON results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("🤖 Bi Ads Automation Benchmark (fake browser)")
+    print("=" * 60)
+
+    report = asyncio.run(run_benchmark(args))
+    print_results(report['flows'])
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,282 @@
+"""
+Bi Ads - Real-Chrome Extraction Benchmark
+Author: Bi Ads Team
+Version: 3.0.0
+
+Starts the local fixture server (benchmarks/fixture_server.py), points
+FACEBOOK_BASE_URL at it and drives FacebookAutomator with real Chrome
+sessions. Reports pages/second, navigation vs DOM extraction time per flow
+and browser memory per session. No network access needed.
+
+DOM time = flow time - navigation (driver.get) time, i.e. readiness waits
+plus extraction, with the readiness floors removed (--floor-scale 0).
+
+Usage (from backend/):
+    python -m benchmarks.extraction_benchmark --sessions 2 --iterations 20 --groups 300
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+from benchmarks.api_benchmark import git_revision, percentile
+from benchmarks.fixture_server import FixtureServer
+from services.process_monitor import browser_rss_mb
+
+FLOWS = (
+    'check_account', 'scan_groups', 'scan_group_members', 'scan_followers', 'scan_friends',
+    'join_group', 'add_friend', 'react_to_post', 'comment_on_post', 'post_to_timeline'
+)
+
+
+# ============================================
+# SESSION WORKER
+# ============================================
+
+class NavigationTimer:
+    """Wraps driver.get to count page loads and time navigation"""
+
+    def __init__(self, driver):
+        self.pages = 0
+        self.elapsed = 0.0
+        self._get = driver.get
+        driver.get = self.get
+
+    def get(self, url: str):
+        started = time.perf_counter()
+        try:
+            return self._get(url)
+        finally:
+            self.elapsed += time.perf_counter() - started
+            self.pages += 1
+
+
+async def run_flow_once(automator, flow: str, base_url: str, n: int) -> bool:
+    """Run one automator flow against the fixtures; returns whether it succeeded"""
+    if flow == 'check_account':
+        result = await automator.check_account_live()
+        return result.get('status') == 'live'
+    if flow == 'scan_groups':
+        groups = await automator.scan_groups(f"keyword {n}", max_results=1000)
+        return len(groups) > 0
+    if flow == 'scan_group_members':
+        return len(await automator.scan_group_members(str(n), max_results=200)) > 0
+    if flow == 'scan_followers':
+        return len(await automator.scan_followers(str(10**14 + n), max_results=200)) > 0
+    if flow == 'scan_friends':
+        return len(await automator.scan_friends(f"user.{n}", max_results=200)) > 0
+    if flow == 'join_group':
+        return (await automator.join_group(str(10**14 + n))).get('success', False)
+    if flow == 'add_friend':
+        return (await automator.add_friend(str(10**14 + n))).get('success', False)
+    if flow == 'react_to_post':
+        return (await automator.react_to_post(f"{base_url}/fixture/posts/{n}")).get('success', False)
+    if flow == 'comment_on_post':
+        return (await automator.comment_on_post(f"{base_url}/fixture/posts/{n}", f"Comment {n}")).get('success', False)
+    return (await automator.post_to_timeline(f"Benchmark post {n}")).get('success', False)
+
+
+def compare_extraction(driver, base_url: str, links: int, rounds: int = 5) -> Dict[str, Any]:
+    """Per-element WebDriver calls vs one execute_script on the same results page"""
+    from selenium.webdriver.common.by import By
+    from services.dom_extractor import extract_links, GROUP_LINK_SELECTOR
+
+    driver.get(f"{base_url}/search/groups/?q=compare&count={links}&batch={links}")
+    legacy, single = [], []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        items = [
+            (link.get_attribute('href'), link.text.strip())
+            for link in driver.find_elements(By.CSS_SELECTOR, GROUP_LINK_SELECTOR)
+        ]
+        legacy.append((time.perf_counter() - t0) * 1000)
+
+        t0 = time.perf_counter()
+        extracted = extract_links(driver, GROUP_LINK_SELECTOR, limit=links * 2)
+        single.append((time.perf_counter() - t0) * 1000)
+
+    legacy_ms, single_ms = min(legacy), min(single)
+    return {
+        'links': len(items),
+        'extracted': len(extracted),
+        'per_element_ms': round(legacy_ms, 2),
+        'single_script_ms': round(single_ms, 2),
+        'speedup': round(legacy_ms / single_ms, 1) if single_ms else None
+    }
+
+
+def run_session(session_no: int, flows: List[str], iterations: int, base_url: str, headless: bool,
+                compare_links: int = 0) -> Dict[str, Any]:
+    """Run every flow `iterations` times in one Chrome session (own thread + event loop)"""
+    from services.chrome_manager import ChromeSession, ChromeDriverFactory
+    from services.facebook_automator import FacebookAutomator
+
+    session = ChromeSession(session_no, f"fixture_{session_no}", driver_factory=ChromeDriverFactory())
+    started = time.perf_counter()
+    session.create_driver(headless=headless)
+    startup_ms = (time.perf_counter() - started) * 1000
+
+    timer = NavigationTimer(session.driver)
+    automator = FacebookAutomator(session)
+    samples: Dict[str, Dict[str, list]] = {flow: {'total': [], 'nav': [], 'ok': []} for flow in flows}
+    peak_rss = browser_rss_mb(session.driver) or 0.0
+
+    async def work():
+        nonlocal peak_rss
+        for flow in flows:
+            for i in range(iterations):
+                nav_before, pages_before = timer.elapsed, timer.pages
+                t0 = time.perf_counter()
+                ok = await run_flow_once(automator, flow, base_url, session_no * 100000 + i)
+                samples[flow]['total'].append(time.perf_counter() - t0)
+                samples[flow]['nav'].append(timer.elapsed - nav_before)
+                samples[flow]['ok'].append((ok, timer.pages - pages_before))
+            peak_rss = max(peak_rss, browser_rss_mb(session.driver) or 0.0)
+
+    try:
+        asyncio.run(work())
+        comparison = compare_extraction(session.driver, base_url, compare_links) if compare_links else None
+    finally:
+        session.close()
+
+    return {'startup_ms': startup_ms, 'peak_rss_mb': peak_rss, 'samples': samples, 'extraction_compare': comparison}
+
+
+def summarize(flow: str, sessions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate one flow's samples across sessions"""
+    totals, navs, extracts = [], [], []
+    pages = successes = 0
+    for s in sessions:
+        data = s['samples'][flow]
+        totals.extend(t * 1000 for t in data['total'])
+        navs.extend(n * 1000 for n in data['nav'])
+        extracts.extend((t - n) * 1000 for t, n in zip(data['total'], data['nav']))
+        pages += sum(p for _, p in data['ok'])
+        successes += sum(1 for ok, _ in data['ok'] if ok)
+    busy_s = sum(totals) / 1000
+    for values in (totals, navs, extracts):
+        values.sort()
+    return {
+        'runs': len(totals),
+        'successes': successes,
+        'pages': pages,
+        'pages_per_s_per_session': round(pages / busy_s, 2) if busy_s else 0.0,
+        'flow_ms': {'p50': round(percentile(totals, 50), 2), 'p95': round(percentile(totals, 95), 2)},
+        'navigation_ms': {'p50': round(percentile(navs, 50), 2), 'p95': round(percentile(navs, 95), 2)},
+        'extraction_ms': {'p50': round(percentile(extracts, 50), 2), 'p95': round(percentile(extracts, 95), 2)}
+    }
+
+
+def run_benchmark(args) -> Dict[str, Any]:
+    server = FixtureServer(port=args.port, groups=args.groups).start()
+    # Must be set before services.chrome_manager is imported
+    os.environ['FACEBOOK_BASE_URL'] = server.url
+    os.environ['BROWSER_BACKEND'] = 'chrome'
+    os.environ['PAGE_READY_FLOOR_SCALE'] = str(args.floor_scale)
+
+    flows = [flow for flow in FLOWS if not args.only or any(key in flow for key in args.only)]
+    print(f"🧪 Fixture server on {server.url}, {args.sessions} Chrome session(s)")
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [
+            pool.submit(run_session, n + 1, flows, args.iterations, server.url, not args.headed,
+                        args.compare_links if n == 0 else 0)
+            for n in range(args.sessions)
+        ]
+        sessions = [f.result() for f in futures]
+    elapsed = time.perf_counter() - started
+    server.stop()
+
+    from services.page_readiness import readiness_stats
+
+    results = {flow: summarize(flow, sessions) for flow in flows}
+    total_pages = sum(r['pages'] for r in results.values())
+
+    return {
+        'meta': {
+            'timestamp': datetime.now().isoformat(),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sessions': args.sessions,
+            'iterations': args.iterations,
+            'groups_per_search': args.groups,
+            'floor_scale': args.floor_scale,
+            'headless': not args.headed
+        },
+        'totals': {
+            'duration_s': round(elapsed, 3),
+            'pages': total_pages,
+            'pages_per_s': round(total_pages / elapsed, 2) if elapsed else 0.0,
+            'browser_startup_ms': [round(s['startup_ms'], 1) for s in sessions],
+            'browser_peak_rss_mb': [round(s['peak_rss_mb'], 1) for s in sessions]
+        },
+        'flows': results,
+        'extraction_compare': sessions[0]['extraction_compare'] if sessions else None,
+        'readiness': readiness_stats.to_dict()
+    }
+
+
+def print_results(report: Dict[str, Any]):
+    print(f"\n{'Flow':<18} {'runs':>5} {'ok':>5} {'pages/s':>8} {'flow p50':>9} {'nav p50':>9} {'dom p50':>9} {'dom p95':>9}")
+    print("-" * 80)
+    for name, r in report['flows'].items():
+        print(f"{name:<18} {r['runs']:>5} {r['successes']:>5} {r['pages_per_s_per_session']:>8.1f} "
+              f"{r['flow_ms']['p50']:>9.1f} {r['navigation_ms']['p50']:>9.1f} "
+              f"{r['extraction_ms']['p50']:>9.1f} {r['extraction_ms']['p95']:>9.1f}")
+    compare = report.get('extraction_compare')
+    if compare:
+        print(f"\nExtraction of {compare['links']} links: per-element {compare['per_element_ms']}ms, "
+              f"single script {compare['single_script_ms']}ms (x{compare['speedup']})")
+    totals = report['totals']
+    print(f"\nTotal: {totals['pages']} pages in {totals['duration_s']}s ({totals['pages_per_s']} pages/s), "
+          f"browser RSS per session: {totals['browser_peak_rss_mb']} MB")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bi Ads real-Chrome extraction benchmark (local fixtures)")
+    parser.add_argument('--sessions', type=int, default=1, help="Parallel Chrome sessions")
+    parser.add_argument('--iterations', type=int, default=10, help="Runs per flow per session")
+    parser.add_argument('--groups', type=int, default=200, help="Group search results per query")
+    parser.add_argument('--port', type=int, default=0, help="Fixture server port (0 = random)")
+    parser.add_argument('--floor-scale', type=float, default=0.0,
+                        help="Multiplier for page readiness floors (1 = production pauses)")
+    parser.add_argument('--compare-links', type=int, default=500,
+                        help="Links on the page for per-element vs single-script extraction (0 = skip)")
+    parser.add_argument('--headed', action='store_true', help="Show the browser windows")
+    parser.add_argument('--only', nargs='*', help="Only run flows whose name contains one of these")
+    parser.add_argument('--output', default='extraction_results.json', help="Where to save JSON results")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print("🔬 Bi Ads Extraction Benchmark (real Chrome, local fixtures)")
+    print("=" * 60)
+
+    report = run_benchmark(args)
+    print_results(report)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+Bi Ads - Local Facebook Fixture Server
+Author: Bi Ads Team
+Version: 3.0.0
+
+Serves static fixture pages with the DOM shapes FacebookAutomator targets
+(profile header, group search results with infinite scroll, Join / Add
+Friend buttons, composer, post with Like and comment box, checkpoint and
+login pages). Point the automation at it with FACEBOOK_BASE_URL to measure
+extraction in a real browser without network access.
+
+Usage (from backend/):
+    python -m benchmarks.fixture_server --port 8800 --groups 300
+    FACEBOOK_BASE_URL=http://127.0.0.1:8800 python main.py
+"""
+
+import argparse
+import html
+import json
+import sys
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Filler markup per card, roughly the nesting depth of real feed/search cards
+_CARD_FILLER = ''.join(f'<div class="x{i}"><span class="y{i}"></span>' for i in range(8)) + '</div>' * 8
+
+_BASE_TEMPLATE = """<!DOCTYPE html>
+<html lang="en"><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:sans-serif;margin:0}} .card{{height:120px;border-bottom:1px solid #ddd;padding:8px}}</style>
+</head><body>
+{navigation}
+<div role="main">{body}</div>
+{script}
+</body></html>"""
+
+_NAVIGATION = '<div role="navigation"><a href="/">Home</a><a href="/me">Profile</a><a href="/groups/feed/">Groups</a></div>'
+
+_SCROLL_SCRIPT = """<script>
+(function () {
+  var total = %(total)d, batch = %(batch)d, loaded = 0, query = %(query)s, base = %(base)d;
+  var feed = document.getElementById('results');
+  function load() {
+    var html = '';
+    for (var i = loaded; i < Math.min(loaded + batch, total); i++) {
+      var id = String(100000000000000 + base * 1000 + i);
+      html += '<div role="article" class="card">' + %(item)s + %(filler)s + '</div>';
+    }
+    loaded = Math.min(loaded + batch, total);
+    feed.insertAdjacentHTML('beforeend', html);
+  }
+  load();
+  window.addEventListener('scroll', function () {
+    if (window.innerHeight + window.scrollY >= document.body.scrollHeight - 200 && loaded < total) load();
+  });
+})();
+</script>"""
+
+_CLICK_SCRIPT = """<script>
+document.querySelectorAll('[data-after]').forEach(function (el) {
+  el.addEventListener('click', function () {
+    var span = el.querySelector('span') || el;
+    span.textContent = el.getAttribute('data-after');
+    el.removeAttribute('aria-label');
+  });
+});
+var box = document.querySelector('[data-comment]');
+if (box) {
+  box.addEventListener('keydown', function (e) {
+    if (e.key === 'Enter') {
+      e.preventDefault();
+      var li = document.createElement('li');
+      li.textContent = box.textContent;
+      document.getElementById('comments').appendChild(li);
+      box.textContent = '';
+    }
+  });
+}
+</script>"""
+
+
+# JS expressions (using `id`, `i`, `query`) for one infinite-scroll result
+_GROUP_ITEM = "'<a href=\"/groups/' + id + '/\" role=\"link\">' + query + ' group ' + (i + 1) + '</a>'"
+_MEMBER_ITEM = "'<a href=\"/groups/' + query + '/user/' + id + '/\" role=\"link\">Member ' + (i + 1) + '</a>'"
+_PROFILE_ITEM = "'<a href=\"/profile.php?id=' + id + '\" role=\"link\">' + query + ' ' + (i + 1) + '</a>'"
+
+
+def _scroll_list(query: dict, keyword: str, item: str, default_count: int, batch: int) -> str:
+    return _SCROLL_SCRIPT % {
+        'total': int(query.get('count', [default_count])[0]),
+        'batch': int(query.get('batch', [batch])[0]),
+        'query': json.dumps(html.escape(keyword)),
+        'base': zlib.crc32(keyword.encode()) % 10**6,
+        'item': item,
+        'filler': json.dumps(_CARD_FILLER)
+    }
+
+
+def render_page(path: str, query: dict, groups: int = 200, batch: int = 20) -> tuple:
+    """Return (status, html) for a fixture path"""
+    path = path.rstrip('/') or '/'
+    title = 'Facebook'
+    navigation = _NAVIGATION
+    script = _CLICK_SCRIPT
+    section = query.get('sk', [''])[0]
+
+    if path == '/':
+        body = (
+            '<div class="composer"><div role="button"><span>What\'s on your mind?</span></div>'
+            '<div contenteditable="true" role="textbox" aria-label="Create a public post"></div>'
+            '<div role="button" data-after="Posted"><span>Post</span></div></div>'
+            + ''.join(f'<div role="article" class="card">Feed story {i}{_CARD_FILLER}</div>' for i in range(20))
+        )
+    elif path == '/me':
+        body = '<h1>Fixture User</h1>' + ''.join(
+            f'<div role="article" class="card">Timeline post {i}{_CARD_FILLER}</div>' for i in range(10)
+        )
+    elif path == '/search/groups':
+        body = '<div id="results" role="feed"></div>'
+        script = _scroll_list(query, query.get('q', [''])[0], _GROUP_ITEM, groups, batch)
+    elif path.startswith('/groups/') and path.endswith('/members'):
+        body = '<h2>Members</h2><div id="results" role="list"></div>'
+        script = _scroll_list(query, path.split('/')[2], _MEMBER_ITEM, groups, batch)
+    elif path.endswith(('/followers', '/friends')) or section in ('followers', 'friends'):
+        label = 'Follower' if path.endswith('/followers') or section == 'followers' else 'Friend'
+        body = f'<h2>{label}s</h2><div id="results" role="list"></div>'
+        script = _scroll_list(query, label, _PROFILE_ITEM, groups, batch)
+    elif path.startswith('/groups/'):
+        group_id = html.escape(path.split('/')[2])
+        title = f'Group {group_id}'
+        body = (
+            f'<h1>Fixture Group {group_id}</h1>'
+            '<div role="button" aria-label="Join group" data-after="Joined"><span>Join group</span></div>'
+            + ''.join(f'<div role="article" class="card">Group post {i}{_CARD_FILLER}</div>' for i in range(10))
+        )
+    elif path.startswith('/checkpoint'):
+        navigation = ''
+        body = '<h2>Your account has been locked</h2><div role="button"><span>Get started</span></div>'
+    elif path.startswith('/login'):
+        navigation = ''
+        body = ('<form><input id="email" name="email"><input id="pass" name="pass" type="password">'
+                '<button name="login" type="submit">Log In</button></form>')
+    elif '/posts/' in path or path.startswith('/permalink'):
+        body = (
+            f'<div role="article"><p>Fixture post {html.escape(path)}</p>{_CARD_FILLER}'
+            '<div role="button" aria-label="Like" data-after="Liked"><span>Like</span></div>'
+            '<div class="reactions"><span aria-label="Love"></span><span aria-label="Haha"></span>'
+            '<span aria-label="Wow"></span><span aria-label="Sad"></span><span aria-label="Angry"></span></div>'
+            '<ul id="comments"></ul>'
+            '<div contenteditable="true" role="textbox" aria-label="Write a comment" data-comment="1"></div></div>'
+        )
+    elif path.count('/') == 1:
+        profile_id = html.escape(path[1:])
+        title = f'Profile {profile_id}'
+        body = (
+            f'<h1>Profile {profile_id}</h1>'
+            '<div role="button" aria-label="Add Friend" data-after="Friends"><span>Add Friend</span></div>'
+            + ''.join(f'<div role="article" class="card">Profile post {i}{_CARD_FILLER}</div>' for i in range(10))
+        )
+    else:
+        return 404, '<html><body><h1>Not found</h1></body></html>'
+
+    return 200, _BASE_TEMPLATE.format(title=title, navigation=navigation, body=body, script=script)
+
+
+class FixtureRequestHandler(BaseHTTPRequestHandler):
+    """Serves rendered fixture pages"""
+
+    server_version = 'BiAdsFixture/3.0'
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == '/favicon.ico':
+            self.send_response(204)
+            self.end_headers()
+            return
+
+        status, page = render_page(parsed.path, parse_qs(parsed.query), self.server.groups)
+        body = page.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """Fixture HTTP server running in a background thread"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, groups: int = 200):
+        self.httpd = ThreadingHTTPServer((host, port), FixtureRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.groups = groups
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FixtureServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Bi Ads local Facebook fixture server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--groups', type=int, default=200, help="Group search results per query")
+    args = parser.parse_args(argv)
+
+    server = FixtureServer(args.host, args.port, args.groups)
+    print(f"🧪 Fixture server on {server.url} (FACEBOOK_BASE_URL={server.url})")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,17 +4,21 @@ Author: Bi Ads Team
 Version: 2.0.0
 """
 
-from sqlalchemy import select, update, delete
+from sqlalchemy import select, update, delete, insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime
+import asyncio
 import json
+import uuid
 
 from .database import (
     Account, Proxy, Task, ActivityLog, Settings,
     SubAccount, FacebookID, IPAddress, WhitelistAccount, PostedContent, Message, AutoReplyTemplate
 )
+from .task_codec import PAYLOAD_VERSION, encode_payload, params_hash, indexed_fields
 
 # ============================================
 # ACCOUNT CRUD
@@ -47,6 +51,13 @@ async def get_account(db: AsyncSession, account_id: int) -> Optional[Account]:
     )
     return result.scalar_one_or_none()
 
+async def get_existing_account_ids(db: AsyncSession, account_ids: List[int]) -> set:
+    """ID tài khoản tồn tại trong danh sách (một truy vấn IN)"""
+    if not account_ids:
+        return set()
+    result = await db.execute(select(Account.id).where(Account.id.in_(set(account_ids))))
+    return set(result.scalars().all())
+
 async def get_account_by_uid(db: AsyncSession, uid: str) -> Optional[Account]:
     """Lấy thông tin tài khoản theo UID"""
     result = await db.execute(
@@ -283,21 +294,230 @@ async def delete_proxy(db: AsyncSession, proxy_id: int) -> bool:
 # TASK CRUD
 # ============================================
 
-async def create_task(db: AsyncSession, task_data: Dict[str, Any]) -> Task:
-    """Tạo tác vụ mới"""
-    task = Task(
+def _new_task(task_data: Dict[str, Any], **columns) -> Task:
+    return Task(
         task_id=task_data['task_id'],
         account_id=task_data['account_id'],
         task_type=task_data['task_type'],
         task_name=task_data.get('task_name'),
-        params=json.dumps(task_data.get('params', {})),
-        status='pending'
+        params=encode_payload(task_data.get('params') or {}),
+        priority=task_data.get('priority') or 'normal',
+        run_at=task_data.get('run_at'),
+        idempotency_key=task_data.get('idempotency_key'),
+        status='pending',
+        **columns
     )
+
+async def create_task(db: AsyncSession, task_data: Dict[str, Any]) -> Task:
+    """Tạo tác vụ mới"""
+    task = _new_task(task_data)
     db.add(task)
     await db.commit()
     await db.refresh(task)
     return task
 
+# Statuses in which an identical task is coalesced instead of created again
+DEDUP_STATUSES = ('pending', 'processing')
+
+# Serializes check-then-insert in create_task_once within this process
+_task_create_lock = asyncio.Lock()
+
+def new_task_id(prefix: str = 'task') -> str:
+    """Task ID unique even for tasks created in the same second"""
+    return f"{prefix}_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:8]}"
+
+async def find_duplicate_task(
+    db: AsyncSession,
+    account_id: int,
+    task_type: str,
+    params: Optional[Dict[str, Any]] = None,
+    idempotency_key: Optional[str] = None
+) -> Optional[Task]:
+    """
+    Tác vụ đã tồn tại cho cùng một yêu cầu: theo idempotency key (mọi trạng
+    thái), hoặc cùng account/task_type/params đang pending/processing
+    """
+    if idempotency_key:
+        result = await db.execute(select(Task).where(Task.idempotency_key == idempotency_key))
+        task = result.scalar_one_or_none()
+        if task is not None:
+            return task
+
+    result = await db.execute(
+        select(Task)
+        .where(
+            Task.account_id == account_id,
+            Task.task_type == task_type,
+            Task.params_hash == params_hash(params),
+            Task.status.in_(DEDUP_STATUSES)
+        )
+        .order_by(Task.created_at)
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+async def create_task_once(db: AsyncSession, task_data: Dict[str, Any]) -> Tuple[Task, bool]:
+    """
+    Tạo tác vụ trừ khi đã có tác vụ giống hệt (xem find_duplicate_task).
+    Returns (task, created); created=False means the existing task was returned.
+    """
+    async with _task_create_lock:
+        existing = await find_duplicate_task(
+            db, task_data['account_id'], task_data['task_type'],
+            task_data.get('params'), task_data.get('idempotency_key')
+        )
+        if existing is not None:
+            return existing, False
+        try:
+            return await create_task(db, task_data), True
+        except IntegrityError:
+            # Same idempotency key inserted by another process in between
+            await db.rollback()
+            if not task_data.get('idempotency_key'):
+                raise
+            existing = await find_duplicate_task(
+                db, task_data['account_id'], task_data['task_type'],
+                task_data.get('params'), task_data['idempotency_key']
+            )
+            if existing is None:
+                raise
+            return existing, False
+
+async def create_task_with_children(
+    db: AsyncSession,
+    parent_data: Dict[str, Any],
+    children_data: List[Dict[str, Any]]
+) -> Tuple[Task, bool]:
+    """
+    Tạo tác vụ cha cùng các tác vụ con trong một transaction (các con được
+    insert bằng một câu lệnh bulk). Tác vụ cha không có handler: trạng thái
+    và tiến độ của nó được tổng hợp từ các con (services.task_fanout).
+    Returns (parent, created); created=False means the existing parent was returned.
+    """
+    async with _task_create_lock:
+        existing = await find_duplicate_task(
+            db, parent_data['account_id'], parent_data['task_type'],
+            parent_data.get('params'), parent_data.get('idempotency_key')
+        )
+        if existing is not None:
+            return existing, False
+        planned_items = [child.get('total_items') for child in children_data]
+        parent = _new_task(
+            parent_data, child_count=len(children_data),
+            total_items=sum(planned_items) if all(planned_items) else None
+        )
+        db.add(parent)
+        db.add_all([
+            _new_task(child, parent_task_id=parent.task_id, total_items=child.get('total_items'))
+            for child in children_data
+        ])
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            if not parent_data.get('idempotency_key'):
+                raise
+            existing = await find_duplicate_task(
+                db, parent_data['account_id'], parent_data['task_type'],
+                parent_data.get('params'), parent_data['idempotency_key']
+            )
+            if existing is None:
+                raise
+            return existing, False
+        await db.refresh(parent)
+        return parent, True
+
+def _task_row(task_data: Dict[str, Any], created_at: datetime) -> Dict[str, Any]:
+    """Column values of a new task for a Core bulk insert (what the Task insert listener would set)"""
+    params = task_data.get('params') or {}
+    return {
+        'task_id': task_data['task_id'],
+        'account_id': task_data['account_id'],
+        'task_type': task_data['task_type'],
+        'task_name': task_data.get('task_name'),
+        'params': encode_payload(params),
+        'params_hash': params_hash(params),
+        'payload_version': PAYLOAD_VERSION,
+        'priority': task_data.get('priority') or 'normal',
+        'run_at': task_data.get('run_at'),
+        'idempotency_key': task_data.get('idempotency_key'),
+        'status': 'pending',
+        'progress': 0,
+        'created_at': created_at,
+        **indexed_fields(params, None)
+    }
+
+async def create_tasks_bulk(
+    db: AsyncSession,
+    tasks_data: List[Dict[str, Any]],
+    log_data: Optional[Dict[str, Any]] = None
+) -> Tuple[List[str], List[bool]]:
+    """
+    Tạo nhiều tác vụ trong một transaction: một câu lệnh insert cho mọi tác
+    vụ mới và (tuỳ chọn) một log tổng hợp. Tác vụ trùng (idempotency key, hoặc
+    cùng account/task_type/params đang pending/processing, kể cả trùng nhau
+    trong cùng lô) không được tạo lại.
+    Returns (task_ids, duplicates) in the order of tasks_data.
+    """
+    async with _task_create_lock:
+        keys = {data['idempotency_key'] for data in tasks_data if data.get('idempotency_key')}
+        existing_by_key: Dict[str, str] = {}
+        if keys:
+            rows = await db.execute(
+                select(Task.idempotency_key, Task.task_id).where(Task.idempotency_key.in_(keys))
+            )
+            existing_by_key = dict(rows.all())
+        
+        hashes = [params_hash(data.get('params')) for data in tasks_data]
+        existing_by_hash: Dict[Tuple[int, str, str], str] = {}
+        rows = await db.execute(
+            select(Task.account_id, Task.task_type, Task.params_hash, Task.task_id)
+            .where(
+                Task.account_id.in_({data['account_id'] for data in tasks_data}),
+                Task.task_type.in_({data['task_type'] for data in tasks_data}),
+                Task.params_hash.in_(set(hashes)),
+                Task.status.in_(DEDUP_STATUSES)
+            )
+            .order_by(Task.created_at.desc())
+        )
+        for account_id, task_type, row_hash, task_id in rows.all():
+            existing_by_hash[(account_id, task_type, row_hash)] = task_id
+        
+        created_at = datetime.now()
+        task_ids: List[str] = []
+        duplicates: List[bool] = []
+        new_rows: List[Dict[str, Any]] = []
+        for data, data_hash in zip(tasks_data, hashes):
+            key = data.get('idempotency_key')
+            identity = (data['account_id'], data['task_type'], data_hash)
+            existing = existing_by_key.get(key) if key else None
+            existing = existing or existing_by_hash.get(identity)
+            if existing:
+                task_ids.append(existing)
+                duplicates.append(True)
+                continue
+            row = _task_row(data, created_at)
+            new_rows.append(row)
+            existing_by_hash[identity] = row['task_id']
+            if key:
+                existing_by_key[key] = row['task_id']
+            task_ids.append(row['task_id'])
+            duplicates.append(False)
+        
+        if new_rows:
+            await db.execute(insert(Task), new_rows)
+        if log_data:
+            db.add(ActivityLog(
+                account_id=log_data.get('account_id'),
+                task_id=log_data.get('task_id'),
+                action=log_data['action'],
+                message=log_data['message'],
+                level=log_data.get('level', 'info'),
+                extra_data=json.dumps(log_data.get('metadata', {}))
+            ))
+        await db.commit()
+        return task_ids, duplicates
+
 async def get_task(db: AsyncSession, task_id: str) -> Optional[Task]:
     """Lấy thông tin tác vụ"""
     result = await db.execute(
@@ -342,7 +562,7 @@ async def update_task_status(
     if progress is not None:
         task.progress = progress
     if result:
-        task.result = json.dumps(result)
+        task.result = encode_payload(result)
     if error_message:
         task.error_message = error_message
     
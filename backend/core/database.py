@@ -4,13 +4,16 @@ Author: Bi Ads Team
 Version: 2.0.0
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy import create_engine, event, inspect, text, Column, Index, Integer, String, Text, DateTime, Boolean, ForeignKey
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
 from sqlalchemy.pool import StaticPool
 from datetime import datetime
 import os
 
+from .task_codec import PAYLOAD_VERSION, encode_payload, decode_payload, indexed_fields, params_hash
+
 # Database URL - Using SQLite for simplicity, can be changed to PostgreSQL
 # Database is stored in data/ directory
 from pathlib import Path
@@ -19,10 +22,15 @@ DATA_DIR.mkdir(exist_ok=True)
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite+aiosqlite:///{DATA_DIR}/bi_ads.db")
 
 # Create async engine
+# A single shared connection (StaticPool) is only needed for an in-memory
+# database: with a file database concurrent sessions (scheduler workers)
+# would share one transaction and roll back each other's writes
+_SQLITE_MEMORY = "sqlite" in DATABASE_URL and (":memory:" in DATABASE_URL or DATABASE_URL.endswith("://"))
 engine = create_async_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in DATABASE_URL else {},
-    poolclass=StaticPool if "sqlite" in DATABASE_URL else None,
+    # timeout: wait for a concurrent writer's lock instead of failing with "database is locked"
+    connect_args={"check_same_thread": False, "timeout": 30} if "sqlite" in DATABASE_URL else {},
+    poolclass=StaticPool if _SQLITE_MEMORY else None,
     echo=True  # Set to False in production
 )
 
@@ -56,6 +64,8 @@ class Account(Base):
     created_at = Column(DateTime, default=datetime.now)
     updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
     last_used = Column(DateTime, nullable=True)
+    # Node (TASK_WORKER_ID) holding this account's browser session - its tasks are routed there
+    session_node_id = Column(String(100), nullable=True, index=True)
     
     # Relationships
     proxy = relationship("Proxy", back_populates="accounts")
@@ -90,17 +100,112 @@ class Task(Base):
     account_id = Column(Integer, ForeignKey('accounts.id'), nullable=False)
     task_type = Column(String(100), nullable=False)  # join_groups, add_friends, etc.
     task_name = Column(String(255))
-    params = Column(Text)  # JSON string
+    params = Column(Text)  # compact JSON (core/task_codec.py)
     status = Column(String(50), default='pending')  # pending, processing, completed, failed, cancelled
+    priority = Column(String(20), default='normal', server_default='normal')  # interactive, normal, bulk lane
     progress = Column(Integer, default=0)  # 0-100
-    result = Column(Text, nullable=True)  # JSON string
+    result = Column(Text, nullable=True)  # compact JSON (core/task_codec.py)
     error_message = Column(Text, nullable=True)
+    screenshot = Column(String(80), nullable=True)  # screenshot store reference (services/screenshot_store.py)
+    # Encoding version of params/result and keys copied out of them for filtering
+    payload_version = Column(Integer, nullable=True)
+    target_id = Column(String(255), nullable=True, index=True)  # group_id / uid / post_url ... from params
+    result_status = Column(String(50), nullable=True, index=True)  # result['status'] (live, die, checkpoint ...)
+    result_success = Column(Boolean, nullable=True, index=True)  # result['success']
+    # Duplicate suppression (crud.create_task_once)
+    params_hash = Column(String(64), nullable=True)  # task_codec.params_hash of params
+    idempotency_key = Column(String(100), nullable=True)
+    # Automatic retries (services.task_retry)
+    attempts = Column(Integer, default=0, server_default='0')  # failed attempts so far
+    last_error = Column(Text, nullable=True)
+    error_class = Column(String(50), nullable=True)  # proxy, timeout, network, browser, auth, worker_lost, unknown
+    # Worker lease while processing (services.task_leases)
+    worker_id = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    # Bulk tasks: item counts kept exact by the checkpoint (services.bulk_jobs)
+    total_items = Column(Integer, nullable=True)
+    completed_items = Column(Integer, default=0, server_default='0')
+    failed_items = Column(Integer, default=0, server_default='0')
+    # Fan-out (services.task_fanout): children point to their parent; a parent has child_count set
+    # and its status, progress, item counts and result are aggregated from the children
+    parent_task_id = Column(String(100), nullable=True)
+    child_count = Column(Integer, nullable=True)
+    run_at = Column(DateTime, nullable=True)  # not before this time (services/delayed_jobs.py)
     started_at = Column(DateTime, nullable=True)
     completed_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, default=datetime.now)
     
     # Relationships
     account = relationship("Account", back_populates="tasks")
+    
+    __table_args__ = (
+        # Scheduler claim: oldest pending task of a lane
+        Index('ix_tasks_status_priority_created', 'status', 'priority', 'created_at'),
+        # Delayed jobs: pending tasks coming due
+        Index('ix_tasks_status_run_at', 'status', 'run_at'),
+        # Identical work already queued: same account, type and params
+        Index('ix_tasks_dedup', 'account_id', 'task_type', 'params_hash', 'status'),
+        # A unique index (not a column constraint) so existing databases get it too
+        Index('ix_tasks_idempotency_key', 'idempotency_key', unique=True),
+        # Reaper: processing tasks whose lease expired
+        Index('ix_tasks_status_lease', 'status', 'lease_expires_at'),
+        # Children of a parent by status (aggregation, expanding listings)
+        Index('ix_tasks_parent_status', 'parent_task_id', 'status'),
+    )
+
+@event.listens_for(Task, 'before_insert')
+@event.listens_for(Task, 'before_update')
+def _index_task_payload(mapper, connection, task):
+    """Normalize params/result to the codec format and refresh the indexed columns"""
+    state = inspect(task)
+    changed = [
+        name for name in ('params', 'result')
+        if state.pending or state.attrs[name].history.has_changes()
+    ]
+    if not changed:
+        return
+    # New rows hold values or codec text; loaded rows carry their own version
+    version = PAYLOAD_VERSION if state.pending else task.payload_version
+    params = decode_payload(task.params, version)
+    result = decode_payload(task.result, version)
+    for name, value in (('params', params), ('result', result)):
+        if name in changed:
+            setattr(task, name, encode_payload(value))
+    if 'params' in changed:
+        task.params_hash = params_hash(params)
+    for name, value in indexed_fields(params, result).items():
+        setattr(task, name, value)
+    task.payload_version = PAYLOAD_VERSION
+
+class TaskItem(Base):
+    """Checkpoint của bulk task: một dòng cho mỗi phần tử đã xử lý (chưa xử lý = không có dòng)"""
+    __tablename__ = "task_items"
+    
+    id = Column(Integer, primary_key=True)
+    task_id = Column(String(100), nullable=False)
+    item_index = Column(Integer, nullable=False)  # position in the task's item list
+    item_key = Column(String(255), nullable=True)  # e.g. group UID / target UID
+    status = Column(String(20), nullable=False)  # completed, failed
+    error = Column(String(500), nullable=True)
+    updated_at = Column(DateTime, default=datetime.now)
+    
+    __table_args__ = (
+        Index('ix_task_items_task_index', 'task_id', 'item_index', unique=True),
+    )
+
+class WorkerNode(Base):
+    """Node chạy task (services.task_nodes): năng lực và heartbeat của từng process"""
+    __tablename__ = "worker_nodes"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    node_id = Column(String(100), unique=True, index=True, nullable=False)  # TASK_WORKER_ID
+    hostname = Column(String(255))
+    capacity = Column(Integer, default=0)  # scheduler slots (TASK_WORKERS)
+    running = Column(Integer, default=0)
+    sessions = Column(Integer, default=0)  # browser sessions held
+    task_types = Column(Text, nullable=True)  # JSON list of handled task types
+    started_at = Column(DateTime, default=datetime.now)
+    last_seen = Column(DateTime, default=datetime.now, index=True)
 
 class ActivityLog(Base):
     """Nhật ký hoạt động"""
@@ -287,10 +392,67 @@ async def get_db():
             await session.close()
 
 # Initialize database
+def _add_missing_columns(sync_conn):
+    """
+    Additive schema upgrade for existing databases: create_all() only creates
+    missing tables, so columns/indexes added to a model later are added here
+    """
+    inspector = inspect(sync_conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+                sync_conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {ddl}')
+        for index in table.indexes:
+            index.create(sync_conn, checkfirst=True)
+
+def _upgrade_task_payloads(sync_conn, batch_size: int = 500):
+    """
+    Rewrite tasks stored before the payload codec (str(dict) / JSON with
+    whitespace), fill their indexed columns and params_hash. Codec rows
+    without params_hash (written before deduplication) are only hashed.
+    Runs once per row.
+    """
+    while True:
+        rows = sync_conn.execute(
+            text(
+                "SELECT id, params, result, payload_version FROM tasks "
+                "WHERE payload_version IS NULL OR params_hash IS NULL LIMIT :limit"
+            ),
+            {'limit': batch_size}
+        ).fetchall()
+        if not rows:
+            return
+        updates = []
+        for row_id, raw_params, raw_result, version in rows:
+            params = decode_payload(raw_params, version)
+            result = decode_payload(raw_result, version)
+            updates.append({
+                'row_id': row_id,
+                'params': encode_payload(params),
+                'result': encode_payload(result),
+                'payload_version': PAYLOAD_VERSION,
+                'params_hash': params_hash(params),
+                **indexed_fields(params, result)
+            })
+        sync_conn.execute(
+            text(
+                "UPDATE tasks SET params = :params, result = :result, payload_version = :payload_version, "
+                "params_hash = :params_hash, target_id = :target_id, result_status = :result_status, "
+                "result_success = :result_success WHERE id = :row_id"
+            ),
+            updates
+        )
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_upgrade_task_payloads)
     print("✅ Database initialized successfully!")
 
 # Drop all tables (for development only)
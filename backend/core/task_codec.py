@@ -0,0 +1,128 @@
+"""
+Bi Ads - Task Payload Codec
+Author: Bi Ads Team
+Version: 2.0.0
+
+One encoding for Task.params / Task.result: compact JSON (no whitespace,
+UTF-8 kept, non-JSON values stringified), tagged with PAYLOAD_VERSION in
+Task.payload_version. Commonly filtered keys are copied into indexed
+columns on write so task queries filter in SQL instead of parsing rows.
+
+Rows written before the codec (Python repr from str(dict), double-encoded
+JSON, no payload_version) are decoded by decode_legacy and rewritten once
+by init_db; only those rows are ever re-decoded.
+"""
+
+import ast
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+PAYLOAD_VERSION = 1
+
+# Params keys that identify what a task works on, first match wins
+TARGET_KEYS = (
+    'target_id', 'group_id', 'page_id', 'fanpage_id', 'post_id', 'uid', 'target_uid',
+    'source_id', 'profile_id', 'post_url', 'keyword'
+)
+# Result keys copied to Task.result_status
+STATUS_KEYS = ('status', 'state')
+
+
+def encode_payload(data: Any) -> Optional[str]:
+    """
+    Compact JSON text for a decoded params/result value (None stays None).
+    A str is a value, not text to parse: it is stored as a JSON string.
+    """
+    if data is None:
+        return None
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False, default=str)
+
+
+def decode_payload(raw: Optional[str], payload_version: Optional[int] = PAYLOAD_VERSION) -> Any:
+    """
+    Params/result value from stored text. Codec rows (payload_version set)
+    are plain JSON: a JSON string value stays a string even when it looks
+    like a number or a list. Plain text that is not JSON is returned as is.
+    Rows without payload_version go through decode_legacy.
+    """
+    if payload_version is None:
+        return decode_legacy(raw)
+    if raw is None or raw == '':
+        return None
+    if not isinstance(raw, str):
+        return raw
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def decode_legacy(raw: Optional[str]) -> Any:
+    """
+    Params/result value of a row written before the codec: legacy JSON,
+    Python repr of a dict/list, double-encoded JSON or plain text
+    """
+    if raw is None or raw == '':
+        return None
+    if not isinstance(raw, str):
+        return raw
+    try:
+        value = json.loads(raw)
+    except ValueError:
+        try:
+            value = ast.literal_eval(raw)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return raw
+    # Double-encoded rows: json.dumps(str(params)) / json.dumps(json.dumps(...))
+    if isinstance(value, str) and value != raw and value[:1] in ('{', '['):
+        return decode_legacy(value)
+    return value
+
+
+def decode_dict(raw: Optional[str], payload_version: Optional[int] = PAYLOAD_VERSION) -> Dict[str, Any]:
+    """Decoded payload when it is a dict, else {}"""
+    value = decode_payload(raw, payload_version)
+    return value if isinstance(value, dict) else {}
+
+
+def params_hash(params: Any) -> str:
+    """
+    Content hash of decoded params: canonical JSON (sorted keys, compact,
+    surrounding whitespace stripped from strings). Equal hashes for the same
+    account and task_type mean the same work.
+    """
+    def normalize(value):
+        if isinstance(value, dict):
+            return {str(key): normalize(item) for key, item in value.items() if item is not None}
+        if isinstance(value, (list, tuple)):
+            return [normalize(item) for item in value]
+        if isinstance(value, str):
+            return value.strip()
+        return value
+
+    canonical = json.dumps(normalize(params or {}), sort_keys=True, separators=(',', ':'),
+                           ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _short(value: Any, length: int) -> Optional[str]:
+    if value is None or isinstance(value, (dict, list)):
+        return None
+    return str(value)[:length]
+
+
+def indexed_fields(params: Any, result: Any) -> Dict[str, Any]:
+    """Values of the indexed Task columns for decoded params/result"""
+    params = params if isinstance(params, dict) else {}
+    result = result if isinstance(result, dict) else {}
+
+    target_id = next((params[key] for key in TARGET_KEYS if params.get(key) not in (None, '')), None)
+    status = next((result[key] for key in STATUS_KEYS if result.get(key) not in (None, '')), None)
+    success = result.get('success')
+
+    return {
+        'target_id': _short(target_id, 255),
+        'result_status': _short(status, 50),
+        'result_success': bool(success) if success is not None else None
+    }
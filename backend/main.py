@@ -4,7 +4,7 @@ Author: Bi Ads Team
 Version: 2.0.0
 """
 
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Request, Query
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
@@ -14,13 +14,14 @@ import uvicorn
 from datetime import datetime
 from contextlib import asynccontextmanager
 import os
+import asyncio
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 # Import database and CRUD
-from core.database import get_db, init_db, Account as DBAccount, Proxy as DBProxy
+from core.database import get_db, init_db, engine, Account as DBAccount, Proxy as DBProxy
 from core import crud
 from services.file_parser import (
     parse_via_txt, 
@@ -33,6 +34,15 @@ from services.file_parser import (
 # Import webhook and telegram integrations
 from services.facebook_webhook import FacebookWebhook, WebhookEventHandler
 from services.telegram_bot import TelegramBot
+from services.sql_profiler import sql_profiler, SQLProfilerMiddleware
+from services.chrome_manager import chrome_manager
+from services.browser_workers import browser_workers
+from services.screenshot_store import screenshot_store
+from services.task_progress import task_progress
+from services.task_scheduler import task_scheduler, priority_for, LANES
+from services.delayed_jobs import delayed_jobs
+from services.task_leases import task_leases
+from services.task_nodes import task_nodes
 
 # Initialize global instances
 facebook_webhook = FacebookWebhook(
@@ -55,6 +65,31 @@ async def lifespan(app: FastAPI):
     await init_db()
     print("✅ Database ready!")
     
+    # Watch Chrome session memory/age and recycle bloated browsers
+    chrome_manager.start_monitor()
+    
+    # Browser worker processes (BROWSER_WORKERS > 0)
+    await browser_workers.start()
+    
+    # Write-behind flush of in-memory task progress
+    task_progress.start()
+    
+    # Requeue tasks left "processing" by a crashed/restarted worker, then keep leases alive
+    await task_leases.reconcile()
+    task_leases.start()
+    
+    # Advertise this node (capacity, browser sessions) to the other nodes on the database
+    task_nodes.start()
+    
+    # Run pending tasks in priority lanes (interactive / normal / bulk)
+    task_scheduler.start()
+    
+    # Release delayed/scheduled tasks (Task.run_at) when due
+    delayed_jobs.start()
+    
+    # Screenshot retention
+    await asyncio.to_thread(screenshot_store.cleanup)
+    
     # Send startup notification
     telegram_bot.send_notification(
         "Hệ thống khởi động",
@@ -69,6 +104,14 @@ async def lifespan(app: FastAPI):
     
     yield
     
+    await chrome_manager.stop_monitor()
+    await delayed_jobs.stop()
+    await task_scheduler.stop()
+    await task_leases.stop()
+    await task_nodes.stop()
+    await browser_workers.stop()
+    await task_progress.stop()
+    
     # Send shutdown notification
     telegram_bot.send_notification(
         "Hệ thống đang tắt",
@@ -91,8 +134,21 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-DB-Query-Count", "X-DB-Time-Ms", "X-DB-Repeated-Max"],
 )
 
+# SQL profiler middleware (opt-in, for finding N+1 queries and slow endpoints)
+SQL_PROFILER_ENABLED = os.getenv('SQL_PROFILER', 'false').lower() == 'true'
+if SQL_PROFILER_ENABLED:
+    sql_profiler.slow_request_ms = float(os.getenv('SQL_PROFILER_SLOW_MS', '500'))
+    sql_profiler.repeat_threshold = int(os.getenv('SQL_PROFILER_REPEAT_THRESHOLD', '5'))
+    sql_profiler.install(engine)
+    app.add_middleware(
+        SQLProfilerMiddleware,
+        profiler=sql_profiler,
+        add_headers=os.getenv('SQL_PROFILER_HEADERS', 'true').lower() == 'true'
+    )
+
 # Import and include all API routers
 from api.advanced_api import router as advanced_router
 from api.settings_api import router as settings_router
@@ -198,12 +254,16 @@ class TaskRequest(BaseModel):
     task_type: str
     account_id: int
     params: Optional[Dict[str, Any]] = None
+    priority: Optional[str] = None  # interactive, normal, bulk (default from params size)
+    run_at: Optional[datetime] = None  # run later (delayed job)
+    idempotency_key: Optional[str] = None  # or the Idempotency-Key header
 
 class TaskResponse(BaseModel):
     success: bool
     task_id: str
     message: str
     status: str = "processing"
+    duplicate: bool = False  # an identical task already existed and was returned
 
 # ============================================
 # BASIC ROUTES
@@ -232,6 +292,25 @@ async def health_check():
         "telegram_configured": bool(telegram_bot.bot_token)
     }
 
+# ============================================
+# SQL PROFILER REPORT
+# ============================================
+
+@app.get("/api/debug/sql-profile")
+async def get_sql_profile_report():
+    """Báo cáo các request chậm / nghi ngờ N+1 query"""
+    if not SQL_PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="SQL profiler is disabled (set SQL_PROFILER=true)")
+    return {"success": True, "report": sql_profiler.get_report()}
+
+@app.delete("/api/debug/sql-profile")
+async def reset_sql_profile_report():
+    """Xóa dữ liệu báo cáo SQL profiler"""
+    if not SQL_PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="SQL profiler is disabled (set SQL_PROFILER=true)")
+    sql_profiler.reset_report()
+    return {"success": True, "message": "SQL profile report cleared"}
+
 # ============================================
 # FACEBOOK WEBHOOK ENDPOINTS
 # ============================================
@@ -707,23 +786,43 @@ async def auto_assign_proxies(db: AsyncSession = Depends(get_db)):
 # ============================================
 
 @app.post("/api/tasks", response_model=TaskResponse)
-async def create_task(task_req: TaskRequest, db: AsyncSession = Depends(get_db)):
-    """Tạo tác vụ mới"""
+async def create_task(
+    task_req: TaskRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Tạo tác vụ mới (yêu cầu trùng trả về tác vụ đang có)"""
     try:
         # Check if account exists
         account = await crud.get_account(db, task_req.account_id)
         if not account:
             raise HTTPException(status_code=404, detail="Không tìm thấy tài khoản")
+        if task_req.priority and task_req.priority not in LANES:
+            raise HTTPException(status_code=400, detail=f"priority phải là một trong: {', '.join(LANES)}")
         
         # Create task
-        task_id = f"{task_req.task_type}_{int(datetime.now().timestamp())}"
-        task = await crud.create_task(db, {
-            'task_id': task_id,
+        task, created = await crud.create_task_once(db, {
+            'task_id': crud.new_task_id(task_req.task_type),
             'account_id': task_req.account_id,
             'task_type': task_req.task_type,
             'task_name': task_req.task_type.replace('_', ' ').title(),
-            'params': task_req.params or {}
+            'params': task_req.params or {},
+            'priority': task_req.priority or priority_for(task_req.task_type, task_req.params),
+            'run_at': task_req.run_at,
+            'idempotency_key': idempotency_key or task_req.idempotency_key
         })
+        task_id = task.task_id
+        if not created:
+            return {
+                "success": True,
+                "task_id": task_id,
+                "message": f"Tác vụ {task_req.task_type} đã tồn tại",
+                "status": task.status,
+                "duplicate": True
+            }
+        if task.run_at:
+            delayed_jobs.schedule(task.task_id, task.run_at)
+        task_scheduler.notify()
         
         # Create log
         await crud.create_log(db, {
@@ -760,11 +859,16 @@ async def get_task_status(task_id: str, db: AsyncSession = Depends(get_db)):
     if not task:
         raise HTTPException(status_code=404, detail="Không tìm thấy tác vụ")
     
+    status, progress = task.status, task.progress
+    live = task_progress.get(task_id)
+    if live and status not in ('completed', 'failed', 'cancelled'):
+        status, progress = live['status'], live['progress']
+    
     return {
         "task_id": task.task_id,
-        "status": task.status,
-        "progress": task.progress,
-        "message": f"Tác vụ đang {task.status}"
+        "status": status,
+        "progress": progress,
+        "message": f"Tác vụ đang {status}"
     }
 
 @app.get("/api/tasks")
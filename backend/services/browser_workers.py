@@ -0,0 +1,391 @@
+"""
+Browser Worker Pool
+Runs Chrome sessions in separate OS processes. Each worker process owns a
+subset of sessions (its own chrome_manager) and executes FacebookAutomator
+actions; the API process only routes requests and records results.
+
+Each worker has its own pipe to the API process (a killed worker cannot
+leave a shared queue locked for the others). Workers are pinged
+periodically and restarted when they crash or stop answering (hung
+chromedriver call). Sessions of a restarted worker are re-created on the
+next request for their account.
+
+BROWSER_WORKERS=0 (default) keeps browsers in the API process.
+"""
+
+import asyncio
+import itertools
+import logging
+import multiprocessing
+import multiprocessing.connection
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_workers_env = os.getenv('BROWSER_WORKERS', '0').lower()
+BROWSER_WORKERS = (os.cpu_count() or 1) if _workers_env == 'auto' else int(_workers_env)
+CALL_TIMEOUT = float(os.getenv('BROWSER_WORKER_CALL_TIMEOUT', '300'))
+HEARTBEAT_INTERVAL = float(os.getenv('BROWSER_WORKER_HEARTBEAT', '5'))
+# No ping answer within this long = worker hung (a blocking WebDriver call can take up to the page load timeout)
+HANG_TIMEOUT = float(os.getenv('BROWSER_WORKER_HANG_TIMEOUT', '120'))
+
+# FacebookAutomator methods a worker may run
+ACTIONS = {
+    'check_account_live', 'scan_groups', 'scan_group_members', 'scan_followers', 'scan_friends',
+    'join_group', 'add_friend', 'post_to_timeline', 'comment_on_post', 'react_to_post'
+}
+
+
+class WorkerCrashed(Exception):
+    """Worker process died or was restarted while handling the request"""
+
+
+class SessionNotFound(Exception):
+    """The worker has no session for the account"""
+
+
+# ============================================
+# WORKER PROCESS
+# ============================================
+
+def _worker_main(worker_no: int, conn):
+    """Entry point of a worker process"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'[browser-worker-{worker_no}] %(levelname)s %(name)s: %(message)s'
+    )
+    try:
+        asyncio.run(_serve(worker_no, conn))
+    except KeyboardInterrupt:
+        pass
+
+
+async def _serve(worker_no: int, conn):
+    """Handle requests concurrently until a None sentinel arrives or the pipe closes"""
+    from services.chrome_manager import chrome_manager
+
+    chrome_manager.start_monitor()
+    loop = asyncio.get_running_loop()
+    running = set()
+    logger.info(f"Browser worker {worker_no} started (pid {os.getpid()})")
+
+    while True:
+        try:
+            message = await loop.run_in_executor(None, conn.recv)
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        task = asyncio.create_task(_handle(chrome_manager, message, conn))
+        running.add(task)
+        task.add_done_callback(running.discard)
+
+    for task in list(running):
+        task.cancel()
+    await chrome_manager.stop_monitor()
+    await chrome_manager.close_all_sessions()
+
+
+async def _handle(manager, message: Dict, conn):
+    """Run one command and send back {'id', 'ok', 'result'|'error'}"""
+    request_id = message['id']
+    try:
+        result = await _run_command(manager, message['command'], message.get('payload') or {})
+        reply = {'id': request_id, 'ok': True, 'result': result}
+    except Exception as e:
+        reply = {'id': request_id, 'ok': False, 'error': f"{type(e).__name__}: {e}"}
+    try:
+        conn.send(reply)
+    except (OSError, ValueError) as e:
+        logger.error(f"Failed to send result {request_id}: {e}")
+
+
+async def _run_command(manager, command: str, payload: Dict) -> Any:
+    if command == 'ping':
+        return {'pid': os.getpid(), 'sessions': manager.get_session_count()}
+
+    if command == 'create_session':
+        session = await manager.create_session(**payload)
+        return session.to_dict()
+
+    if command == 'close_session':
+        await manager.close_session(payload['account_id'])
+        return True
+
+    if command == 'sessions':
+        await manager.sample_sessions()
+        return manager.get_all_sessions()
+
+    if command == 'run':
+        from services.facebook_automator import FacebookAutomator
+
+        action = payload['action']
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action: {action}")
+        session = await manager.get_session(payload['account_id'])
+        if not session:
+            raise SessionNotFound(f"No session for account {payload['account_id']}")
+        automator = FacebookAutomator(session)
+        with session.use():
+            return await getattr(automator, action)(**(payload.get('kwargs') or {}))
+
+    raise ValueError(f"Unknown command: {command}")
+
+
+# ============================================
+# API PROCESS SIDE
+# ============================================
+
+class BrowserWorker:
+    """Handle on one worker process"""
+
+    def __init__(self, worker_no: int):
+        self.worker_no = worker_no
+        self.process: Optional[multiprocessing.Process] = None
+        self.conn = None  # API side of the worker's pipe
+        self.accounts: set = set()
+        self.restarts = 0
+        self.started_at: Optional[float] = None
+        self.last_heartbeat: Optional[float] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            'worker_no': self.worker_no,
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'accounts': sorted(self.accounts),
+            'restarts': self.restarts,
+            'uptime_s': round(time.monotonic() - self.started_at, 1) if self.started_at else None,
+            'last_heartbeat_s': round(time.monotonic() - self.last_heartbeat, 1) if self.last_heartbeat else None
+        }
+
+
+class BrowserWorkerPool:
+    """Supervised pool of browser worker processes with sticky account routing"""
+
+    def __init__(self, size: int = BROWSER_WORKERS, call_timeout: float = CALL_TIMEOUT,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL, hang_timeout: float = HANG_TIMEOUT):
+        self.size = size
+        self.call_timeout = call_timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.hang_timeout = hang_timeout
+        self.workers: List[BrowserWorker] = []
+        self.assignments: Dict[int, int] = {}  # account_id -> worker_no
+        self._ctx = multiprocessing.get_context('spawn')
+        self._pending: Dict[int, tuple] = {}  # request id -> (future, worker_no)
+        self._ids = itertools.count(1)
+        self._account_locks: Dict[int, asyncio.Lock] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader: Optional[threading.Thread] = None
+        self._supervisor: Optional[asyncio.Task] = None
+        self._running = False
+
+    @property
+    def enabled(self) -> bool:
+        return self.size > 0
+
+    async def start(self):
+        """Spawn the workers, the result reader and the supervisor"""
+        if not self.enabled or self._running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._running = True
+        self.workers = [BrowserWorker(n) for n in range(self.size)]
+        for worker in self.workers:
+            self._spawn(worker)
+
+        self._reader = threading.Thread(target=self._read_results, name='browser-worker-results', daemon=True)
+        self._reader.start()
+        self._supervisor = asyncio.create_task(self._supervise())
+        logger.info(f"Browser worker pool started with {self.size} processes")
+
+    async def stop(self):
+        """Ask workers to close their sessions and exit"""
+        if not self._running:
+            return
+        self._running = False
+        if self._supervisor:
+            self._supervisor.cancel()
+        for worker in self.workers:
+            if worker.process and worker.process.is_alive():
+                self._send(worker, None)
+        for worker in self.workers:
+            if worker.process:
+                await asyncio.to_thread(worker.process.join, 30)
+                if worker.process.is_alive():
+                    worker.process.kill()
+            worker.conn.close()
+        self._fail_pending(None, WorkerCrashed("Worker pool stopped"))
+        self.assignments.clear()
+
+    # ---------- process management ----------
+
+    def _spawn(self, worker: BrowserWorker):
+        api_conn, worker_conn = self._ctx.Pipe()
+        worker.process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker.worker_no, worker_conn),
+            name=f'browser-worker-{worker.worker_no}',
+            daemon=True
+        )
+        worker.process.start()
+        worker_conn.close()
+        worker.conn = api_conn
+        worker.started_at = time.monotonic()
+        worker.last_heartbeat = None
+
+    def _restart(self, worker: BrowserWorker, reason: str):
+        """Kill and respawn a worker; its sessions are gone"""
+        logger.warning(f"Restarting browser worker {worker.worker_no}: {reason}")
+        if worker.process and worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join(5)
+        worker.conn.close()
+        for account_id in worker.accounts:
+            self.assignments.pop(account_id, None)
+        worker.accounts = set()
+        self._fail_pending(worker.worker_no, WorkerCrashed(f"Browser worker {worker.worker_no} {reason}"))
+        worker.restarts += 1
+        self._spawn(worker)
+
+    async def _supervise(self):
+        """Restart workers that died or stopped answering pings"""
+        while self._running:
+            await asyncio.sleep(self.heartbeat_interval)
+            for worker in self.workers:
+                if not worker.process.is_alive():
+                    self._restart(worker, f"exited with code {worker.process.exitcode}")
+            await asyncio.gather(*(self._heartbeat(worker) for worker in self.workers))
+
+    async def _heartbeat(self, worker: BrowserWorker):
+        try:
+            await self.call(worker.worker_no, 'ping', timeout=self.hang_timeout)
+            worker.last_heartbeat = time.monotonic()
+        except asyncio.TimeoutError:
+            self._restart(worker, f"did not answer for {self.hang_timeout:.0f}s")
+        except WorkerCrashed:
+            pass
+
+    # ---------- request/response ----------
+
+    def _read_results(self):
+        """Thread: hand results from every worker pipe to waiting futures"""
+        while self._running:
+            conns = [w.conn for w in self.workers if w.conn is not None and not w.conn.closed]
+            try:
+                ready = multiprocessing.connection.wait(conns, timeout=0.2)
+            except (OSError, ValueError):
+                # A pipe was closed by a restart while waiting
+                continue
+            for conn in ready:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError, ValueError):
+                    # Worker died; the supervisor restarts it with a new pipe
+                    time.sleep(0.05)
+                    continue
+                self._loop.call_soon_threadsafe(self._resolve, message)
+
+    def _send(self, worker: BrowserWorker, message: Optional[Dict]):
+        try:
+            worker.conn.send(message)
+        except (OSError, ValueError) as e:
+            raise WorkerCrashed(f"Browser worker {worker.worker_no} pipe closed: {e}")
+
+    def _resolve(self, message: Dict):
+        entry = self._pending.pop(message['id'], None)
+        if not entry or entry[0].done():
+            return
+        future = entry[0]
+        if message['ok']:
+            future.set_result(message['result'])
+        elif message['error'].startswith('SessionNotFound'):
+            future.set_exception(SessionNotFound(message['error']))
+        else:
+            future.set_exception(RuntimeError(message['error']))
+
+    def _fail_pending(self, worker_no: Optional[int], error: Exception):
+        for request_id, (future, owner) in list(self._pending.items()):
+            if worker_no is None or owner == worker_no:
+                self._pending.pop(request_id, None)
+                if not future.done():
+                    future.set_exception(error)
+
+    async def call(self, worker_no: int, command: str, timeout: Optional[float] = None, **payload) -> Any:
+        """Send a command to one worker and wait for its result"""
+        if not self._running:
+            raise WorkerCrashed("Worker pool is not running")
+        request_id = next(self._ids)
+        future = self._loop.create_future()
+        self._pending[request_id] = (future, worker_no)
+        try:
+            self._send(self.workers[worker_no], {'id': request_id, 'command': command, 'payload': payload})
+            return await asyncio.wait_for(future, timeout or self.call_timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    # ---------- sessions / actions ----------
+
+    def _least_loaded(self) -> int:
+        return min(self.workers, key=lambda w: (len(w.accounts), w.worker_no)).worker_no
+
+    async def ensure_session(self, account_id: int, login: Dict) -> int:
+        """Worker holding the account's session, creating the session if needed"""
+        lock = self._account_locks.setdefault(account_id, asyncio.Lock())
+        async with lock:
+            worker_no = self.assignments.get(account_id)
+            if worker_no is not None:
+                return worker_no
+            worker_no = self._least_loaded()
+            worker = self.workers[worker_no]
+            # Count the account on the worker right away so concurrent logins spread out
+            worker.accounts.add(account_id)
+            try:
+                await self.call(worker_no, 'create_session', account_id=account_id, **login)
+            except Exception:
+                worker.accounts.discard(account_id)
+                raise
+            self.assignments[account_id] = worker_no
+            return worker_no
+
+    async def run(self, account_id: int, action: str, login: Dict, **kwargs) -> Any:
+        """
+        Run a FacebookAutomator action for an account in its worker.
+        `login` holds create_session arguments (account_uid, cookies, email,
+        password, two_fa_key, proxy, headless, profile).
+        """
+        for attempt in range(2):
+            worker_no = await self.ensure_session(account_id, login)
+            try:
+                return await self.call(worker_no, 'run', account_id=account_id, action=action, kwargs=kwargs)
+            except SessionNotFound:
+                # Session closed in the worker (failed recycle) - log in again once
+                self.assignments.pop(account_id, None)
+                self.workers[worker_no].accounts.discard(account_id)
+                if attempt:
+                    raise
+
+    async def close_session(self, account_id: int):
+        worker_no = self.assignments.pop(account_id, None)
+        if worker_no is not None:
+            self.workers[worker_no].accounts.discard(account_id)
+            await self.call(worker_no, 'close_session', account_id=account_id)
+
+    async def status(self) -> List[Dict]:
+        """Workers with their live sessions"""
+        statuses = []
+        for worker in self.workers:
+            info = worker.to_dict()
+            try:
+                info['sessions'] = await self.call(worker.worker_no, 'sessions', timeout=10)
+            except (asyncio.TimeoutError, WorkerCrashed, RuntimeError):
+                info['sessions'] = None
+            statuses.append(info)
+        return statuses
+
+
+# Global worker pool (started from the app lifespan when BROWSER_WORKERS > 0)
+browser_workers = BrowserWorkerPool()
@@ -0,0 +1,317 @@
+"""
+Bulk Jobs
+Checkpointed execution of tasks that work through a list of items (join
+groups by UID, bulk friend requests, ...). Every processed item is recorded
+in task_items (completed / failed, unprocessed items have no row) together
+with exact Task.completed_items / failed_items counts, written in batches
+of TASK_CHECKPOINT_BATCH items. When the task runs again - retry after a
+crash, lease reaped, resume after cancel - completed items are skipped.
+"""
+
+import asyncio
+import os
+import random
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select, update
+
+from core.database import AsyncSessionLocal, SubAccount, Task, TaskItem
+from core import crud
+from services.task_cancellation import TaskCancelled, task_cancellation, release_browser_session
+from services.task_progress import task_progress
+from services.task_retry import classify_error
+
+logger = logging.getLogger(__name__)
+
+# Processed items buffered before the checkpoint is written
+TASK_CHECKPOINT_BATCH = int(os.getenv('TASK_CHECKPOINT_BATCH', '20'))
+# Consecutive item failures of a retryable class (proxy, network...) that fail the whole
+# task - it is then retried with backoff and resumes - instead of burning through the list
+TASK_BULK_MAX_CONSECUTIVE_FAILURES = int(os.getenv('TASK_BULK_MAX_CONSECUTIVE_FAILURES', '5'))
+
+# Statuses a bulk task can be resumed from
+RESUMABLE_STATUSES = ('failed', 'cancelled')
+
+
+class BulkCheckpoint:
+    """Completed/failed item indexes of one task, written in batches"""
+
+    def __init__(self, task_id: str, total: int, batch_size: int = TASK_CHECKPOINT_BATCH, session_factory=None):
+        self.task_id = task_id
+        self.total = total
+        self.batch_size = max(batch_size, 1)
+        self._session_factory = session_factory or AsyncSessionLocal
+        self.completed: set = set()
+        self.failed: set = set()
+        self.resumed = 0
+        self._pending: List[Dict[str, Any]] = []
+
+    async def load(self, retry_failed: bool = True):
+        """Read the checkpoint; failed items are forgotten (tried again) when retry_failed"""
+        async with self._session_factory() as db:
+            if retry_failed:
+                await db.execute(delete(TaskItem).where(TaskItem.task_id == self.task_id, TaskItem.status == 'failed'))
+            rows = await db.execute(
+                select(TaskItem.item_index, TaskItem.status).where(TaskItem.task_id == self.task_id)
+            )
+            for index, status in rows.all():
+                (self.completed if status == 'completed' else self.failed).add(index)
+            await db.execute(
+                update(Task).where(Task.task_id == self.task_id)
+                .values(total_items=self.total, completed_items=len(self.completed), failed_items=len(self.failed))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        self.resumed = len(self.completed) + len(self.failed)
+
+    def done(self, index: int) -> bool:
+        return index in self.completed or index in self.failed
+
+    def mark(self, index: int, key: Optional[str], ok: bool, error: Optional[str] = None):
+        (self.completed if ok else self.failed).add(index)
+        self._pending.append({
+            'task_id': self.task_id,
+            'item_index': index,
+            'item_key': str(key)[:255] if key is not None else None,
+            'status': 'completed' if ok else 'failed',
+            'error': error[:500] if error else None,
+            'updated_at': datetime.now()
+        })
+
+    @property
+    def due(self) -> bool:
+        return len(self._pending) >= self.batch_size
+
+    @property
+    def percent(self) -> int:
+        return int((len(self.completed) + len(self.failed)) * 100 / self.total) if self.total else 100
+
+    async def flush(self) -> int:
+        """Write buffered items and the exact counts in one transaction"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        try:
+            async with self._session_factory() as db:
+                await db.execute(insert(TaskItem), pending)
+                await db.execute(
+                    update(Task).where(Task.task_id == self.task_id)
+                    .values(completed_items=len(self.completed), failed_items=len(self.failed),
+                            progress=min(self.percent, 99))
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+        except Exception:
+            self._pending = pending + self._pending
+            raise
+        return len(pending)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'total': self.total,
+            'completed': len(self.completed),
+            'failed': len(self.failed),
+            'remaining': self.total - len(self.completed) - len(self.failed),
+            'resumed_from': self.resumed
+        }
+
+
+async def run_bulk_items(
+    task_id: str,
+    items: Sequence[Any],
+    process: Callable[[Any], Awaitable[Any]],
+    key: Callable[[Any], Optional[str]] = str,
+    delay_range: Tuple[float, float] = (0, 0),
+    retry_failed: bool = True,
+    batch_size: int = TASK_CHECKPOINT_BATCH,
+    defer_delays: bool = False
+) -> Dict[str, Any]:
+    """
+    Process `items` one by one with `process(item)`, skipping items the
+    checkpoint has as done, and finish the task as completed with the counts.
+    An item that raises is recorded as failed and the job goes on; a run of
+    retryable failures (proxy/network down) fails the task so its retry
+    policy applies. Cancel is checked between items and during delays.
+    With defer_delays the delay after a completed item puts the task back to
+    pending until it is over (delayed_jobs) instead of holding its worker
+    slot; the next run continues from the checkpoint. Delays after a failed
+    item are still slept so a run of failures is counted.
+    """
+    token = task_cancellation.get(task_id)
+    checkpoint = BulkCheckpoint(task_id, len(items), batch_size)
+    await checkpoint.load(retry_failed)
+    if checkpoint.resumed:
+        logger.info(f"Task {task_id}: resuming after {checkpoint.resumed}/{len(items)} items")
+
+    consecutive_failures = 0
+    try:
+        for index, item in enumerate(items):
+            if checkpoint.done(index):
+                continue
+            if token:
+                token.check()
+            try:
+                await process(item)
+                checkpoint.mark(index, key(item), ok=True)
+                consecutive_failures = 0
+            except TaskCancelled:
+                raise
+            except Exception as e:
+                if token and token.cancelled:
+                    raise TaskCancelled(token.reason) from e
+                checkpoint.mark(index, key(item), ok=False, error=str(e))
+                consecutive_failures = consecutive_failures + 1 if classify_error(e) != 'unknown' else 0
+                if consecutive_failures >= TASK_BULK_MAX_CONSECUTIVE_FAILURES:
+                    raise
+
+            if checkpoint.due:
+                await checkpoint.flush()
+            summary = checkpoint.summary()
+            if token:
+                token.record(**summary)
+            task_progress.update(
+                task_id, progress=min(checkpoint.percent, 99),
+                message=f"{summary['completed'] + summary['failed']}/{summary['total']} items", persist=False
+            )
+
+            delay = random.uniform(*delay_range) if delay_range[1] else 0
+            if delay and summary['remaining']:
+                if defer_delays and not consecutive_failures:
+                    # Imported here: delayed_jobs imports the task scheduler, which imports this module
+                    from services.delayed_jobs import defer_task
+
+                    await checkpoint.flush()
+                    async with AsyncSessionLocal() as db:
+                        run_at = await defer_task(db, task_id, delay)
+                    return {**summary, 'resumes_at': run_at.isoformat()}
+                await (token.sleep(delay) if token else asyncio.sleep(delay))
+    except BaseException:
+        # Keep what was done for the resume, without hiding why the job stopped
+        try:
+            await checkpoint.flush()
+        except Exception as e:
+            logger.error(f"Task {task_id}: checkpoint flush failed after the job stopped: {e}")
+        raise
+    await checkpoint.flush()
+
+    summary = checkpoint.summary()
+    await task_progress.finish(task_id, 'completed', result={'success': summary['failed'] == 0, **summary})
+    return summary
+
+
+class AccountActions:
+    """
+    FacebookAutomator actions of one account in its browser session, opened
+    on first use. With sub_account_id the sub account (cookies login, the
+    main account's proxy) acts in its own session.
+    """
+
+    def __init__(self, account_id: int, task_type: str, task_id: Optional[str] = None,
+                 sub_account_id: Optional[int] = None):
+        self.account_id = account_id
+        self.task_type = task_type
+        self.sub_account_id = sub_account_id
+        # Sessions are keyed by account ID; sub accounts use negative keys so they never share one
+        self.session_key = -sub_account_id if sub_account_id else account_id
+        self.token = task_cancellation.get(task_id)
+        self._login: Optional[Dict[str, Any]] = None
+
+    async def _login_args(self) -> Dict[str, Any]:
+        from services.chrome_manager import profile_for_task
+
+        async with AsyncSessionLocal() as db:
+            account = await crud.get_account(db, self.account_id)
+            if not account:
+                raise ValueError(f"Account {self.account_id} not found")
+            sub_account = None
+            if self.sub_account_id:
+                sub_account = await db.get(SubAccount, self.sub_account_id)
+                if not sub_account:
+                    raise ValueError(f"Sub account {self.sub_account_id} not found")
+            proxy = None
+            if account.proxy_id:
+                proxy_obj = await crud.get_proxy(db, account.proxy_id)
+                if proxy_obj:
+                    proxy = {
+                        'ip': proxy_obj.ip,
+                        'port': proxy_obj.port,
+                        'username': proxy_obj.username,
+                        'password': proxy_obj.password,
+                        'protocol': proxy_obj.protocol
+                    }
+        if self.token:
+            # Cancelling closes the session (and its proxy) so a blocked action stops
+            self.token.on_cancel(lambda: release_browser_session(self.session_key))
+        if sub_account is not None:
+            return {
+                'account_uid': sub_account.uid,
+                'cookies': sub_account.cookies,
+                'email': None,
+                'password': None,
+                'two_fa_key': None,
+                'proxy': proxy,
+                'headless': True,
+                'profile': profile_for_task(self.task_type)
+            }
+        return {
+            'account_uid': account.uid,
+            'cookies': account.cookies,
+            'email': account.email,
+            'password': account.password,
+            'two_fa_key': account.two_fa_key,
+            'proxy': proxy,
+            'headless': True,
+            'profile': profile_for_task(self.task_type)
+        }
+
+    async def __call__(self, action: str, **kwargs) -> Any:
+        from services.browser_workers import browser_workers
+        from services.chrome_manager import chrome_manager
+        from services.facebook_automator import FacebookAutomator
+
+        if self._login is None:
+            self._login = await self._login_args()
+        if browser_workers.enabled:
+            result = await browser_workers.run(self.session_key, action, self._login, **kwargs)
+        else:
+            session = await chrome_manager.get_session(self.session_key)
+            if not session:
+                session = await chrome_manager.create_session(account_id=self.session_key, **self._login)
+            with session.use():
+                result = await getattr(FacebookAutomator(session), action)(**kwargs)
+        if isinstance(result, dict) and result.get('success') is False:
+            raise RuntimeError(result.get('message') or f"{action} failed")
+        return result
+
+
+async def resume_task(db, task_id: str, retry_failed: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Put a failed/cancelled bulk task back to pending; it continues after its
+    completed items. Returns the checkpoint counts (None if not resumable).
+    """
+    if retry_failed:
+        await db.execute(delete(TaskItem).where(TaskItem.task_id == task_id, TaskItem.status == 'failed'))
+    counts = await item_counts(db, task_id)
+    result = await db.execute(
+        update(Task)
+        .where(Task.task_id == task_id, Task.status.in_(RESUMABLE_STATUSES))
+        .values(status='pending', run_at=None, started_at=None, completed_at=None, error_message=None,
+                worker_id=None, lease_expires_at=None,
+                completed_items=counts['completed'], failed_items=counts['failed'])
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    if not result.rowcount:
+        return None
+    task_progress.reset(task_id)
+    return counts
+
+
+async def item_counts(db, task_id: str) -> Dict[str, int]:
+    rows = await db.execute(
+        select(TaskItem.status, func.count()).where(TaskItem.task_id == task_id).group_by(TaskItem.status)
+    )
+    counts = {status: count for status, count in rows.all()}
+    return {'completed': counts.get('completed', 0), 'failed': counts.get('failed', 0)}
@@ -5,35 +5,77 @@ Manages Chrome instances with Selenium WebDriver for Facebook automation
 
 import asyncio
 import json
+import os
+from contextlib import contextmanager
 from typing import Dict, Optional, List
 from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
 import logging
 
+from services.profile_store import ProfileStore
+from services.process_monitor import ProcessSampler
+from services.page_readiness import (
+    PageReadiness, element_present, element_gone, url_changed, url_contains, any_of, dom_ready
+)
+
 logger = logging.getLogger(__name__)
 
 
-class ChromeSession:
-    """Represents a Chrome browser session for a Facebook account"""
+# Base URL of Facebook pages opened by the automation (point at a local fixture server for benchmarks)
+FACEBOOK_BASE_URL = os.getenv('FACEBOOK_BASE_URL', 'https://www.facebook.com').rstrip('/')
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# URL patterns blocked through DevTools (Network.setBlockedURLs)
+IMAGE_URL_PATTERNS = ['*.jpg*', '*.jpeg*', '*.png*', '*.gif*', '*.webp*', '*.ico*', '*.bmp*']
+MEDIA_URL_PATTERNS = ['*.mp4*', '*.webm*', '*.m4a*', '*.m4v*', '*.mp3*', '*.m3u8*', '*.mpd*']
+FONT_URL_PATTERNS = ['*.woff*', '*.ttf*', '*.otf*', '*.eot*']
+
+# Session profiles
+# full: everything loaded, desktop viewport (posting, commenting, visible sessions)
+# collector: no images/media/fonts, smaller viewport (scanning, status checks)
+SESSION_PROFILES: Dict[str, Dict] = {
+    'full': {
+        'window_size': (1920, 1080),
+        'blocked_urls': []
+    },
+    'collector': {
+        'window_size': (1280, 800),
+        'blocked_urls': IMAGE_URL_PATTERNS + MEDIA_URL_PATTERNS + FONT_URL_PATTERNS
+    }
+}
+
+DEFAULT_SESSION_PROFILE = os.getenv('SESSION_PROFILE_DEFAULT', 'full')
+
+# Session recycling: restart the browser once a session passes any limit (0 = no limit)
+SESSION_MAX_RSS_MB = float(os.getenv('SESSION_MAX_RSS_MB', '1500'))
+SESSION_MAX_PAGES = int(os.getenv('SESSION_MAX_PAGES', '500'))
+SESSION_MAX_AGE_MINUTES = float(os.getenv('SESSION_MAX_AGE_MINUTES', '240'))
+SESSION_MONITOR_INTERVAL = float(os.getenv('SESSION_MONITOR_INTERVAL', '30'))
+
+# Task types that only read pages
+COLLECTOR_TASK_TYPES = {'check_account', 'check_live', 'auto_view_news'}
+
+
+def profile_for_task(task_type: Optional[str]) -> str:
+    """Session profile for a task type: read-only scans use 'collector', the rest 'full'"""
+    if task_type and (task_type.startswith('scan_') or task_type in COLLECTOR_TASK_TYPES):
+        return 'collector'
+    return 'full'
+
+
+class ChromeDriverFactory:
+    """Creates real Chrome WebDriver instances (default browser backend)"""
     
-    def __init__(self, account_id: int, account_uid: str, proxy: Optional[Dict] = None):
-        self.account_id = account_id
-        self.account_uid = account_uid
-        self.proxy = proxy
-        self.driver: Optional[webdriver.Chrome] = None
-        self.is_headless = True
-        self.created_at = datetime.now()
-        self.last_activity = datetime.now()
-        self.status = 'initializing'  # initializing, ready, busy, error, closed
-        
-    def create_driver(self, headless: bool = True) -> webdriver.Chrome:
-        """Create Chrome WebDriver instance"""
+    name = 'chrome'
+    
+    def create(self, session: 'ChromeSession', headless: bool = True) -> webdriver.Chrome:
+        """Create Chrome WebDriver instance for a session"""
         chrome_options = Options()
         
         # Basic options
@@ -47,19 +89,26 @@ class ChromeSession:
         chrome_options.add_experimental_option('useAutomationExtension', False)
         
         # User agent
-        chrome_options.add_argument('--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+        chrome_options.add_argument(f'--user-agent={DEFAULT_USER_AGENT}')
+        
+        # Persistent per-account profile (resumes the previous login)
+        if session.user_data_dir:
+            chrome_options.add_argument(f'--user-data-dir={session.user_data_dir}')
+            chrome_options.add_argument(f'--disk-cache-size={session.disk_cache_mb * 1024 * 1024}')
         
         # Proxy configuration
-        if self.proxy:
-            proxy_string = self._build_proxy_string()
+        if session.proxy:
+            proxy_string = session._build_proxy_string()
             chrome_options.add_argument(f'--proxy-server={proxy_string}')
         
-        # Window size
-        chrome_options.add_argument('--window-size=1920,1080')
+        # Window size from the session profile
+        width, height = SESSION_PROFILES[session.profile]['window_size']
+        chrome_options.add_argument(f'--window-size={width},{height}')
         
-        # Disable images for faster loading (optional)
-        # prefs = {"profile.managed_default_content_settings.images": 2}
-        # chrome_options.add_experimental_option("prefs", prefs)
+        # Media never autoplays; image/media/font blocking is applied per profile
+        # through DevTools so a running session can switch profiles
+        chrome_options.add_argument('--autoplay-policy=user-gesture-required')
+        chrome_options.add_argument('--mute-audio')
         
         # Create driver
         service = Service(ChromeDriverManager().install())
@@ -70,16 +119,162 @@ class ChromeSession:
         
         # Execute CDP commands to hide webdriver
         driver.execute_cdp_cmd('Network.setUserAgentOverride', {
-            "userAgent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+            "userAgent": DEFAULT_USER_AGENT
         })
         driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
         
+        return driver
+
+
+def get_driver_factory(backend: Optional[str] = None):
+    """
+    Resolve the browser backend used to create drivers
+    
+    BROWSER_BACKEND=chrome (default) uses real Chrome/chromedriver,
+    BROWSER_BACKEND=fake uses the simulated in-process browser (benchmarks, CI)
+    """
+    backend = (backend or os.getenv('BROWSER_BACKEND', 'chrome')).lower()
+    if backend == 'fake':
+        from services.fake_browser import FakeBrowserFactory
+        return FakeBrowserFactory.from_env()
+    if backend != 'chrome':
+        raise ValueError(f"Unknown browser backend: {backend}")
+    return ChromeDriverFactory()
+
+
+class ChromeSession:
+    """Represents a Chrome browser session for a Facebook account"""
+    
+    def __init__(self, account_id: int, account_uid: str, proxy: Optional[Dict] = None, driver_factory=None,
+                 profile: str = DEFAULT_SESSION_PROFILE, user_data_dir: Optional[str] = None,
+                 resume_profile: bool = False, disk_cache_mb: int = 32):
+        if profile not in SESSION_PROFILES:
+            raise ValueError(f"Unknown session profile: {profile}")
+        self.account_id = account_id
+        self.account_uid = account_uid
+        self.proxy = proxy
+        self.profile = profile
+        self.user_data_dir = user_data_dir
+        self.resume_profile = resume_profile and user_data_dir is not None
+        self.disk_cache_mb = disk_cache_mb
+        self.login_method: Optional[str] = None  # profile, cookies, credentials
+        self.driver_factory = driver_factory or ChromeDriverFactory()
+        self.driver: Optional[webdriver.Chrome] = None
+        self.is_headless = True
+        self.created_at = datetime.now()
+        self.last_activity = datetime.now()
+        self.status = 'initializing'  # initializing, ready, busy, recycling, error, closed
+        self.pages_loaded = 0
+        self.recycles = 0
+        self.resources = ProcessSampler()
+        self.recycle_lock = asyncio.Lock()
+        # Callers currently driving the browser (see use()); only idle sessions are recycled
+        self.in_use = 0
+        # Login arguments kept so a recycled browser logs the same account back in
+        self.credentials: Dict[str, Optional[str]] = {}
+        
+    def create_driver(self, headless: bool = True) -> webdriver.Chrome:
+        """Create WebDriver instance through the session's browser backend"""
+        driver = self.driver_factory.create(self, headless=headless)
+        
         self.driver = driver
         self.is_headless = headless
         self.status = 'ready'
+        self._apply_blocked_urls(self.profile)
         
         return driver
     
+    def apply_profile(self, profile: str):
+        """Switch the running browser to another session profile (no restart)"""
+        if profile not in SESSION_PROFILES:
+            raise ValueError(f"Unknown session profile: {profile}")
+        if profile == self.profile:
+            return
+        
+        self.profile = profile
+        if not self.driver:
+            return
+        
+        self._apply_blocked_urls(profile)
+        try:
+            width, height = SESSION_PROFILES[profile]['window_size']
+            self.driver.set_window_size(width, height)
+        except Exception as e:
+            logger.warning(f"Failed to resize window for profile {profile}: {e}")
+        logger.info(f"Account {self.account_uid} switched to '{profile}' profile")
+    
+    def _apply_blocked_urls(self, profile: str):
+        """Block the profile's resource URL patterns in the browser"""
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {
+                'urls': SESSION_PROFILES[profile]['blocked_urls']
+            })
+        except Exception as e:
+            logger.warning(f"Failed to apply '{profile}' resource blocking: {e}")
+    
+    @property
+    def ready(self) -> PageReadiness:
+        """Readiness waits bound to the current driver"""
+        return PageReadiness(self.driver, on_navigate=self.touch)
+    
+    def touch(self):
+        """Record a page load / activity on this session"""
+        self.pages_loaded += 1
+        self.last_activity = datetime.now()
+    
+    @contextmanager
+    def use(self):
+        """Mark the session busy while a caller drives the browser"""
+        self.in_use += 1
+        try:
+            yield self
+        finally:
+            self.in_use -= 1
+            self.last_activity = datetime.now()
+    
+    def sample_resources(self):
+        """Refresh RSS/CPU of the driver's process tree"""
+        if self.driver:
+            self.resources.sample(self.driver)
+    
+    def age_minutes(self) -> float:
+        return (datetime.now() - self.created_at).total_seconds() / 60
+    
+    def recycle_reason(self) -> Optional[str]:
+        """Why this session should be restarted, or None"""
+        rss_mb = self.resources.rss_mb
+        if SESSION_MAX_RSS_MB and rss_mb is not None and rss_mb > SESSION_MAX_RSS_MB:
+            return f"memory {rss_mb:.0f} MB > {SESSION_MAX_RSS_MB:.0f} MB"
+        if SESSION_MAX_PAGES and self.pages_loaded >= SESSION_MAX_PAGES:
+            return f"{self.pages_loaded} pages loaded"
+        if SESSION_MAX_AGE_MINUTES and self.age_minutes() >= SESSION_MAX_AGE_MINUTES:
+            return f"age {self.age_minutes():.0f} min"
+        return None
+    
+    async def recycle(self) -> bool:
+        """Restart the browser with a fresh process tree and log the same account back in"""
+        headless = self.is_headless
+        self.close()
+        self.status = 'recycling'
+        self.created_at = datetime.now()
+        self.pages_loaded = 0
+        self.resources = ProcessSampler()
+        self.recycles += 1
+        # A persistent profile still holds the login
+        self.resume_profile = self.user_data_dir is not None
+        
+        self.create_driver(headless=headless)
+        return await self.login_facebook(**self.credentials)
+    
+    def _logged_in_or_blocked(self):
+        """Condition: logged-in navigation, login form or checkpoint/login URL"""
+        return any_of(
+            url_contains('checkpoint', 'login'),
+            element_present(By.CSS_SELECTOR, '[role="navigation"]'),
+            element_present(By.ID, 'email')
+        )
+    
     def _build_proxy_string(self) -> str:
         """Build proxy string from proxy dict"""
         if not self.proxy:
@@ -101,7 +296,18 @@ class ChromeSession:
                 self.create_driver(headless=True)
             
             self.status = 'busy'
-            self.driver.get('https://www.facebook.com')
+            self.driver.get(FACEBOOK_BASE_URL)
+            self.touch()
+            
+            # Persistent profile from an earlier session: already logged in?
+            if self.resume_profile:
+                await self.ready.wait('login', self._logged_in_or_blocked())
+                if self._is_logged_in():
+                    self.status = 'ready'
+                    self.login_method = 'profile'
+                    logger.info(f"Account {self.account_uid} resumed logged in from its profile")
+                    return True
+                logger.info(f"Account {self.account_uid} profile login expired, falling back to cookies")
             
             # Login with cookies (preferred method)
             if cookies:
@@ -111,11 +317,12 @@ class ChromeSession:
                         self.driver.add_cookie(cookie)
                     
                     self.driver.refresh()
-                    await asyncio.sleep(2)
+                    await self.ready.wait('login', self._logged_in_or_blocked())
                     
                     # Check if logged in
                     if self._is_logged_in():
                         self.status = 'ready'
+                        self.login_method = 'cookies'
                         logger.info(f"Account {self.account_uid} logged in successfully with cookies")
                         return True
                 except Exception as e:
@@ -124,28 +331,34 @@ class ChromeSession:
             # Login with email/password
             if email and password:
                 try:
-                    email_field = WebDriverWait(self.driver, 10).until(
-                        EC.presence_of_element_located((By.ID, "email"))
-                    )
+                    email_field = await self.ready.wait('login', element_present(By.ID, "email"), timeout=10)
+                    if not email_field:
+                        raise TimeoutException("Login form not found")
                     email_field.send_keys(email)
                     
                     pass_field = self.driver.find_element(By.ID, "pass")
                     pass_field.send_keys(password)
                     
                     login_button = self.driver.find_element(By.NAME, "login")
+                    url_before = self.driver.current_url
                     login_button.click()
                     
-                    await asyncio.sleep(3)
+                    await self.ready.wait('login', any_of(
+                        url_changed(url_before),
+                        element_present(By.CSS_SELECTOR, '[role="navigation"]'),
+                        element_present(By.CSS_SELECTOR, "input[name='approvals_code']")
+                    ))
                     
                     # Check for 2FA prompt
                     if two_fa_key and self._check_2fa_prompt():
                         logger.info(f"2FA prompt detected for account {self.account_uid}")
                         if await self._handle_2fa(two_fa_key):
                             logger.info(f"2FA handled successfully for account {self.account_uid}")
-                            await asyncio.sleep(2)
+                            await self.ready.wait('login', self._logged_in_or_blocked())
                     
                     if self._is_logged_in():
                         self.status = 'ready'
+                        self.login_method = 'credentials'
                         logger.info(f"Account {self.account_uid} logged in successfully with credentials")
                         return True
                     else:
@@ -239,7 +452,8 @@ class ChromeSession:
             # Enter 2FA code
             code_input.clear()
             code_input.send_keys(code)
-            await asyncio.sleep(1)
+            await self.ready.pause('type')
+            url_before = self.driver.current_url
             
             # Find and click submit button
             submit_selectors = [
@@ -256,7 +470,7 @@ class ChromeSession:
                     if buttons:
                         buttons[0].click()
                         logger.info("2FA submit button clicked")
-                        await asyncio.sleep(3)
+                        await self.ready.wait('submit', any_of(url_changed(url_before), element_gone(code_input)))
                         return True
                 except:
                     continue
@@ -265,7 +479,7 @@ class ChromeSession:
             from selenium.webdriver.common.keys import Keys
             code_input.send_keys(Keys.RETURN)
             logger.info("2FA code submitted via Enter key")
-            await asyncio.sleep(3)
+            await self.ready.wait('submit', any_of(url_changed(url_before), element_gone(code_input)))
             
             return True
             
@@ -294,8 +508,8 @@ class ChromeSession:
             self.create_driver(headless=new_headless)
             
             # Restore session
-            self.driver.get('https://www.facebook.com')
-            await asyncio.sleep(1)
+            self.driver.get(FACEBOOK_BASE_URL)
+            await self.ready.wait('navigate', dom_ready())
             
             for cookie in cookies:
                 try:
@@ -303,9 +517,7 @@ class ChromeSession:
                 except Exception as e:
                     logger.warning(f"Failed to add cookie: {e}")
             
-            await asyncio.sleep(1)
-            self.driver.get(current_url)
-            await asyncio.sleep(2)
+            await self.ready.navigate(current_url)
             
             logger.info(f"Account {self.account_uid} toggled to {'headless' if new_headless else 'visible'} mode")
             return True
@@ -336,16 +548,27 @@ class ChromeSession:
             'created_at': self.created_at.isoformat(),
             'last_activity': self.last_activity.isoformat(),
             'has_proxy': self.proxy is not None,
-            'proxy_ip': self.proxy.get('ip') if self.proxy else None
+            'proxy_ip': self.proxy.get('ip') if self.proxy else None,
+            'profile': self.profile,
+            'persistent_profile': self.user_data_dir is not None,
+            'login_method': self.login_method,
+            'pages_loaded': self.pages_loaded,
+            'age_minutes': round(self.age_minutes(), 1),
+            'recycles': self.recycles,
+            'in_use': self.in_use,
+            'resources': self.resources.to_dict()
         }
 
 
 class ChromeManager:
     """Manages multiple Chrome sessions for different accounts"""
     
-    def __init__(self):
+    def __init__(self, driver_factory=None, profile_store: Optional[ProfileStore] = None):
         self.sessions: Dict[int, ChromeSession] = {}  # account_id -> ChromeSession
         self.lock = asyncio.Lock()
+        self.driver_factory = driver_factory or get_driver_factory()
+        self.profile_store = profile_store or ProfileStore()
+        self._monitor_task: Optional[asyncio.Task] = None
     
     async def create_session(self, account_id: int, account_uid: str, 
                            cookies: Optional[str] = None, 
@@ -353,19 +576,31 @@ class ChromeManager:
                            password: Optional[str] = None,
                            two_fa_key: Optional[str] = None,
                            proxy: Optional[Dict] = None,
-                           headless: bool = True) -> ChromeSession:
+                           headless: bool = True,
+                           profile: str = DEFAULT_SESSION_PROFILE) -> ChromeSession:
         """Create and login a new Chrome session"""
         async with self.lock:
             # Close existing session if any
             if account_id in self.sessions:
-                await self.close_session(account_id)
+                await self.close_session(account_id, cleanup=False)
             
             # Create new session
-            session = ChromeSession(account_id, account_uid, proxy)
+            resume = self.profile_store.exists(account_id)
+            session = ChromeSession(
+                account_id, account_uid, proxy,
+                driver_factory=self.driver_factory,
+                profile=profile,
+                user_data_dir=self.profile_store.acquire(account_id),
+                resume_profile=resume,
+                disk_cache_mb=self.profile_store.cache_mb
+            )
+            session.credentials = {
+                'cookies': cookies, 'email': email, 'password': password, 'two_fa_key': two_fa_key
+            }
             session.create_driver(headless=headless)
             
             # Login
-            success = await session.login_facebook(cookies, email, password, two_fa_key)
+            success = await session.login_facebook(**session.credentials)
             
             if success:
                 self.sessions[account_id] = session
@@ -377,20 +612,101 @@ class ChromeManager:
             return session
     
     async def get_session(self, account_id: int) -> Optional[ChromeSession]:
-        """Get existing session by account ID"""
+        """
+        Get existing session by account ID.
+        An idle session over its memory/page/age limit is recycled first, so
+        callers get a healthy browser bound to the same account. A session in
+        use (ChromeSession.use) is never restarted under its caller: its
+        recycle waits until it is idle (next get_session or monitor_sessions).
+        """
+        session = self.sessions.get(account_id)
+        if not session or session.in_use:
+            return session
+        
+        async with session.recycle_lock:
+            await asyncio.to_thread(session.sample_resources)
+            reason = session.recycle_reason()
+            if reason and not session.in_use and not await self.recycle_session(account_id, reason):
+                return None
         return self.sessions.get(account_id)
     
-    async def close_session(self, account_id: int):
+    async def recycle_session(self, account_id: int, reason: str = 'manual') -> bool:
+        """Restart a session's browser, keeping its account binding"""
+        session = self.sessions.get(account_id)
+        if not session:
+            return False
+        
+        logger.info(f"Recycling Chrome session for account {session.account_uid}: {reason}")
+        try:
+            success = await session.recycle()
+        except Exception as e:
+            logger.error(f"Error recycling session for account {session.account_uid}: {e}")
+            success = False
+        
+        if not success:
+            logger.warning(f"Account {session.account_uid} could not log back in after recycling")
+            await self.close_session(account_id)
+        return success
+    
+    async def sample_sessions(self):
+        """Refresh RSS/CPU of every session's browser processes"""
+        sessions = list(self.sessions.values())
+        await asyncio.to_thread(lambda: [session.sample_resources() for session in sessions])
+    
+    async def monitor_sessions(self, interval: float = SESSION_MONITOR_INTERVAL):
+        """
+        Background loop: sample every session and recycle idle ones over a limit.
+        Sessions in use are left alone until they are idle.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.sample_sessions()
+                for account_id, session in list(self.sessions.items()):
+                    idle = (datetime.now() - session.last_activity).total_seconds() >= interval
+                    reason = session.recycle_reason()
+                    if reason and idle and not session.in_use and not session.recycle_lock.locked():
+                        async with session.recycle_lock:
+                            await self.recycle_session(account_id, reason)
+            except Exception as e:
+                logger.error(f"Session monitor error: {e}")
+    
+    def start_monitor(self):
+        """Start the background session monitor (idempotent)"""
+        if SESSION_MONITOR_INTERVAL > 0 and (self._monitor_task is None or self._monitor_task.done()):
+            self._monitor_task = asyncio.create_task(self.monitor_sessions())
+    
+    async def stop_monitor(self):
+        if self._monitor_task:
+            self._monitor_task.cancel()
+            try:
+                await self._monitor_task
+            except asyncio.CancelledError:
+                pass
+            self._monitor_task = None
+    
+    async def close_session(self, account_id: int, cleanup: bool = True):
         """Close a specific session"""
         if account_id in self.sessions:
-            self.sessions[account_id].close()
-            del self.sessions[account_id]
+            session = self.sessions.pop(account_id)
+            session.close()
             logger.info(f"Session closed for account_id {account_id}")
+            if session.user_data_dir:
+                self.profile_store.touch(account_id)
+                if cleanup:
+                    await self.cleanup_profiles()
+    
+    async def cleanup_profiles(self) -> int:
+        """Enforce the profile disk cap (LRU), keeping profiles of open sessions"""
+        if not self.profile_store.enabled:
+            return 0
+        return await asyncio.to_thread(self.profile_store.cleanup, list(self.sessions.keys()))
     
     async def close_all_sessions(self):
         """Close all active sessions"""
         for account_id in list(self.sessions.keys()):
-            await self.close_session(account_id)
+            await self.close_session(account_id, cleanup=False)
+        await self.cleanup_profiles()
         
         logger.info("All Chrome sessions closed")
     
@@ -0,0 +1,156 @@
+"""
+Delayed Jobs
+Tasks with a future Task.run_at (scheduled messages, staggered per-item
+actions, handlers pausing between items) stay in the database until they
+are close to due. Only those due within TASK_DELAY_HORIZON seconds are
+loaded, through the (status, run_at) index, into an in-memory heap; when
+entries come due they are released together and the task scheduler is
+woken once to claim the batch. Nothing is lost on restart: the heap is
+rebuilt from run_at.
+"""
+
+import asyncio
+import heapq
+import os
+import time
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, select, update
+
+from core.database import AsyncSessionLocal, Task
+from services.task_progress import task_progress
+from services.task_scheduler import task_scheduler
+
+logger = logging.getLogger(__name__)
+
+# Jobs due within this many seconds are kept in memory
+TASK_DELAY_HORIZON = float(os.getenv('TASK_DELAY_HORIZON', '300'))
+
+
+class DelayedJobQueue:
+    """Heap of near-due task IDs refilled from the indexed run_at column"""
+
+    def __init__(self, horizon: float = TASK_DELAY_HORIZON, session_factory=None,
+                 on_due: Optional[Callable[[List[str]], Any]] = None):
+        self.horizon = horizon
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._on_due = on_due or (lambda task_ids: task_scheduler.notify())
+        self._heap: List[Tuple[float, str]] = []
+        self._queued: set = set()
+        self._loaded_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self.released = 0
+        self.batches = 0
+        self.refills = 0
+
+    def schedule(self, task_id: str, run_at: datetime):
+        """Track a task whose run_at was just set (later ones are picked up by the next refill)"""
+        due = run_at.timestamp()
+        if due <= self._loaded_until and task_id not in self._queued:
+            heapq.heappush(self._heap, (due, task_id))
+            self._queued.add(task_id)
+            if self._wakeup:
+                self._wakeup.set()
+
+    async def refill(self):
+        """Load pending tasks due before now + horizon"""
+        until = time.time() + self.horizon
+        async with self._session_factory() as db:
+            rows = await db.execute(
+                select(Task.task_id, Task.run_at)
+                .where(Task.status == 'pending', Task.run_at.isnot(None),
+                       Task.run_at <= datetime.fromtimestamp(until))
+            )
+            for task_id, run_at in rows.all():
+                if task_id not in self._queued:
+                    heapq.heappush(self._heap, (run_at.timestamp(), task_id))
+                    self._queued.add(task_id)
+        self._loaded_until = until
+        self.refills += 1
+
+    def pop_due(self, now: Optional[float] = None) -> List[str]:
+        """All entries due by `now`"""
+        now = time.time() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, task_id = heapq.heappop(self._heap)
+            self._queued.discard(task_id)
+            due.append(task_id)
+        return due
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                if time.time() + self.horizon / 2 >= self._loaded_until:
+                    await self.refill()
+                due = self.pop_due()
+                if due:
+                    self.batches += 1
+                    self.released += len(due)
+                    self._on_due(due)
+            except Exception as e:
+                logger.error(f"Delayed job queue error: {e}")
+
+            next_refill = self._loaded_until - self.horizon / 2
+            next_due = self._heap[0][0] if self._heap else next_refill
+            timeout = max(min(next_due, next_refill) - time.time(), 0.05)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the release loop (idempotent)"""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    async def stats(self) -> Dict[str, Any]:
+        async with self._session_factory() as db:
+            scheduled, next_run_at = (await db.execute(
+                select(func.count(), func.min(Task.run_at))
+                .where(Task.status == 'pending', Task.run_at > datetime.now())
+            )).one()
+        return {
+            'scheduled': scheduled,
+            'next_run_at': next_run_at.isoformat() if next_run_at else None,
+            'in_memory': len(self._heap),
+            'horizon_seconds': self.horizon,
+            'released': self.released,
+            'batches': self.batches,
+            'refills': self.refills
+        }
+
+
+async def defer_task(db, task_id: str, delay_seconds: float) -> datetime:
+    """
+    Put a running task back to pending until now + delay_seconds, e.g. a
+    handler pausing between items instead of sleeping with a browser pinned
+    """
+    run_at = datetime.now() + timedelta(seconds=delay_seconds)
+    await db.execute(
+        update(Task).where(Task.task_id == task_id, Task.status == 'processing')
+        .values(status='pending', run_at=run_at, worker_id=None, lease_expires_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    task_progress.update(task_id, status='pending', message=f"Resumes at {run_at:%H:%M:%S}", persist=False)
+    delayed_jobs.schedule(task_id, run_at)
+    return run_at
+
+
+# Global delayed job queue
+delayed_jobs = DelayedJobQueue()
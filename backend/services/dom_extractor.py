@@ -0,0 +1,130 @@
+"""
+DOM Extractor Service
+Single-round-trip extraction: one execute_script collects every matching
+link (href, text, aria-label) as a JSON array instead of one WebDriver call
+per element and attribute. Incremental extraction marks returned nodes so
+each call after a scroll only reads what was newly rendered.
+"""
+
+import json
+import re
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# arguments: CSS selector, max items. Deduplicates by href in the page.
+EXTRACT_LINKS_SCRIPT = """
+var nodes = document.querySelectorAll(arguments[0]);
+var limit = arguments[1];
+var out = [], seen = {};
+for (var i = 0; i < nodes.length && out.length < limit; i++) {
+    var a = nodes[i];
+    var href = a.href || a.getAttribute('href') || '';
+    if (!href || seen[href]) continue;
+    seen[href] = true;
+    out.push({
+        href: href,
+        text: (a.innerText || a.textContent || '').trim(),
+        aria: a.getAttribute('aria-label') || ''
+    });
+}
+return JSON.stringify(out);
+"""
+
+# Same as above, but skips nodes marked by a previous call and marks the
+# returned ones - after a scroll only newly rendered links come back
+EXTRACT_NEW_LINKS_SCRIPT = """
+var nodes = document.querySelectorAll(arguments[0]);
+var limit = arguments[1];
+var out = [];
+for (var i = 0; i < nodes.length && out.length < limit; i++) {
+    var a = nodes[i];
+    if (a.hasAttribute('data-bi-seen')) continue;
+    a.setAttribute('data-bi-seen', '1');
+    var href = a.href || a.getAttribute('href') || '';
+    if (!href) continue;
+    out.push({
+        href: href,
+        text: (a.innerText || a.textContent || '').trim(),
+        aria: a.getAttribute('aria-label') || ''
+    });
+}
+return JSON.stringify(out);
+"""
+
+GROUP_LINK_SELECTOR = 'a[href*="/groups/"]'
+PROFILE_LINK_SELECTOR = "div[role='main'] a[href]"
+
+# First path segments that are never a profile
+_RESERVED_PATHS = {
+    'groups', 'pages', 'events', 'watch', 'marketplace', 'search', 'photo', 'photos', 'hashtag',
+    'stories', 'notifications', 'messages', 'friends', 'settings', 'me', 'login', 'checkpoint',
+    'help', 'policies', 'privacy', 'gaming', 'reel', 'reels', 'bookmarks', 'saved', 'story.php',
+    'permalink.php', 'sharer.php', 'l.php', 'ads', 'business', 'fundraisers', 'posts'
+}
+_USERNAME_RE = re.compile(r'^[A-Za-z0-9.]{3,}$')
+
+
+def extract_links(driver, selector: str, limit: int = 1000) -> List[Dict[str, str]]:
+    """All links matching `selector` as [{'href', 'text', 'aria'}] in one WebDriver call"""
+    return _load(driver.execute_script(EXTRACT_LINKS_SCRIPT, selector, limit))
+
+
+def extract_new_links(driver, selector: str, limit: int = 1000) -> List[Dict[str, str]]:
+    """Links matching `selector` not returned by an earlier call on this page"""
+    return _load(driver.execute_script(EXTRACT_NEW_LINKS_SCRIPT, selector, limit))
+
+
+def _load(raw) -> List[Dict[str, str]]:
+    if not raw:
+        return []
+    try:
+        return json.loads(raw)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid extraction result: {e}")
+        return []
+
+
+def parse_group_link(item: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Extracted link -> {'id', 'name', 'url'} for a group, or None"""
+    href = item.get('href', '')
+    if '/groups/' not in href:
+        return None
+    group_id = href.split('/groups/')[-1].split('/')[0].split('?')[0]
+    if not group_id or group_id in ('feed', 'discover', 'joins', 'create'):
+        return None
+    name = item.get('text') or item.get('aria') or f"Group {group_id}"
+    return {'id': group_id, 'name': name, 'url': href}
+
+
+def parse_profile_link(item: Dict[str, str]) -> Optional[Dict[str, str]]:
+    """Extracted link -> {'uid', 'username', 'name', 'profile_url'} for a profile, or None"""
+    href = item.get('href', '')
+    parsed = urlparse(href)
+    parts = [p for p in parsed.path.split('/') if p]
+    uid = username = None
+
+    if parsed.path.rstrip('/').endswith('profile.php'):
+        uid = parse_qs(parsed.query).get('id', [None])[0]
+    elif len(parts) >= 4 and parts[0] == 'groups' and parts[2] == 'user':
+        # Group member links: /groups/<group>/user/<uid>/
+        uid = parts[3]
+    elif len(parts) == 1 and parts[0].lower() not in _RESERVED_PATHS:
+        if parts[0].isdigit():
+            uid = parts[0]
+        elif _USERNAME_RE.match(parts[0]):
+            username = parts[0]
+
+    if not uid and not username:
+        return None
+
+    name = item.get('text') or item.get('aria') or ''
+    profile_url = f"{parsed.scheme}://{parsed.netloc}/profile.php?id={uid}" if uid else f"{parsed.scheme}://{parsed.netloc}/{username}"
+    return {
+        'uid': uid,
+        'username': username,
+        'name': name.split('\n')[0],
+        'profile_url': profile_url
+    }
@@ -3,20 +3,24 @@ Facebook Automation Service
 Real Facebook automation tasks using Selenium
 """
 
-import asyncio
 import time
 import json
-import base64
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Callable, Dict, List, Optional
 from datetime import datetime
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 import logging
 
-from services.chrome_manager import ChromeSession
+from services.chrome_manager import ChromeSession, FACEBOOK_BASE_URL, profile_for_task
+from services.screenshot_store import screenshot_store
+from services.dom_extractor import (
+    extract_new_links, parse_group_link, parse_profile_link, GROUP_LINK_SELECTOR, PROFILE_LINK_SELECTOR
+)
+from services.page_readiness import (
+    SCROLL_HEIGHT_SCRIPT, element_present, any_element_present, element_clickable,
+    element_gone, url_contains, text_present, page_grew, any_of
+)
 
 logger = logging.getLogger(__name__)
 
@@ -27,15 +31,23 @@ class FacebookAutomator:
     def __init__(self, chrome_session: ChromeSession):
         self.session = chrome_session
         self.driver = chrome_session.driver
+        self.ready = chrome_session.ready
+    
+    def use_profile_for(self, task_type: str):
+        """Switch the session to the profile this task type needs (collector/full)"""
+        self.session.apply_profile(profile_for_task(task_type))
         
     async def check_account_live(self) -> Dict:
         """Check if account is live/die/checkpoint"""
         try:
             logger.info(f"Checking account {self.session.account_uid} status...")
+            self.use_profile_for('check_account')
             
-            # Navigate to profile
-            self.driver.get('https://www.facebook.com/me')
-            await asyncio.sleep(2)
+            # Navigate to profile (ready once redirected or the profile header rendered)
+            await self.ready.navigate(
+                f'{FACEBOOK_BASE_URL}/me',
+                any_of(url_contains('checkpoint', 'login'), element_present(By.CSS_SELECTOR, 'h1'))
+            )
             
             current_url = self.driver.current_url
             
@@ -60,10 +72,8 @@ class FacebookAutomator:
                 }
             
             # Try to get profile name
-            try:
-                name_element = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, 'h1'))
-                )
+            name_element = await self.ready.wait('navigate', element_present(By.CSS_SELECTOR, 'h1'), timeout=10, floor=0)
+            if name_element:
                 account_name = name_element.text
                 
                 return {
@@ -72,8 +82,7 @@ class FacebookAutomator:
                     'message': f'Account is active: {account_name}',
                     'account_name': account_name
                 }
-                
-            except TimeoutException:
+            else:
                 screenshot = self._take_screenshot()
                 return {
                     'success': True,
@@ -92,52 +101,93 @@ class FacebookAutomator:
                 'screenshot': screenshot
             }
     
+    async def iter_scan(self, selector: str, parse: Callable[[Dict], Optional[Dict]], key: Callable[[Dict], str],
+                        max_results: int, max_scrolls: int = 50) -> AsyncIterator[List[Dict]]:
+        """
+        Incremental scroll-and-extract on the current page.
+        Each round extracts only nodes rendered since the previous round,
+        dedupes on the fly and yields the new batch. Stops at `max_results`
+        or when a scroll brings nothing new.
+        """
+        seen = set()
+        collected = 0
+        scrolls = 0
+        
+        def take_new(items: List[Dict]) -> List[Dict]:
+            """Parsed records not seen before, up to the remaining budget (marked seen)"""
+            batch = []
+            for item in items:
+                if collected + len(batch) >= max_results:
+                    break
+                record = parse(item)
+                if not record:
+                    continue
+                record_key = key(record)
+                if record_key in seen:
+                    continue
+                seen.add(record_key)
+                batch.append(record)
+            return batch
+        
+        while collected < max_results:
+            limit = max_results - collected
+            items = extract_new_links(self.driver, selector, limit=limit)
+            
+            batch = take_new(items)
+            collected += len(batch)
+            
+            if batch:
+                yield batch
+            if collected >= max_results:
+                break
+            if len(items) >= limit:
+                # Rendered nodes still pending extraction - no need to scroll yet
+                continue
+            if scrolls >= max_scrolls or (scrolls > 0 and not batch):
+                break
+            
+            height = self.driver.execute_script(SCROLL_HEIGHT_SCRIPT) or 0
+            self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+            scrolls += 1
+            if not await self.ready.wait('scroll', page_grew(height)):
+                # Nothing more loaded; pick up anything rendered meanwhile, then stop
+                tail = take_new(extract_new_links(self.driver, selector, limit=max_results - collected))
+                collected += len(tail)
+                if tail:
+                    yield tail
+                break
+    
+    async def iter_groups(self, keyword: str, max_results: int = 20) -> AsyncIterator[List[Dict]]:
+        """Stream batches of groups found for a keyword"""
+        self.use_profile_for('scan_groups')
+        search_url = f"{FACEBOOK_BASE_URL}/search/groups/?q={keyword}"
+        await self.ready.navigate(search_url, element_present(By.CSS_SELECTOR, GROUP_LINK_SELECTOR))
+        async for batch in self.iter_scan(GROUP_LINK_SELECTOR, parse_group_link, lambda g: g['id'], max_results):
+            yield batch
+    
+    async def iter_profiles(self, url: str, max_results: int) -> AsyncIterator[List[Dict]]:
+        """Stream batches of profiles from a list page (members/followers/friends)"""
+        self.use_profile_for('scan_profiles')
+        await self.ready.navigate(url, element_present(By.CSS_SELECTOR, PROFILE_LINK_SELECTOR))
+        async for batch in self.iter_scan(
+            PROFILE_LINK_SELECTOR, parse_profile_link, lambda p: p['uid'] or p['username'], max_results
+        ):
+            yield batch
+    
+    def iter_group_members(self, group_id: str, max_results: int = 100) -> AsyncIterator[List[Dict]]:
+        return self.iter_profiles(f"{FACEBOOK_BASE_URL}/groups/{group_id}/members", max_results)
+    
+    def iter_followers(self, uid: str, max_results: int = 100) -> AsyncIterator[List[Dict]]:
+        return self.iter_profiles(self._profile_section_url(uid, 'followers'), max_results)
+    
+    def iter_friends(self, uid: str, max_results: int = 100) -> AsyncIterator[List[Dict]]:
+        return self.iter_profiles(self._profile_section_url(uid, 'friends'), max_results)
+    
     async def scan_groups(self, keyword: str, max_results: int = 20) -> List[Dict]:
         """Scan Facebook groups by keyword"""
         try:
             logger.info(f"Scanning groups for keyword: {keyword}")
-            groups = []
-            
-            # Navigate to search
-            search_url = f"https://www.facebook.com/search/groups/?q={keyword}"
-            self.driver.get(search_url)
-            await asyncio.sleep(3)
-            
-            # Scroll to load more results
-            for _ in range(3):
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-                await asyncio.sleep(2)
-            
-            # Find group elements
-            group_links = self.driver.find_elements(By.CSS_SELECTOR, 'a[href*="/groups/"]')
-            
-            seen_urls = set()
-            for link in group_links[:max_results]:
-                try:
-                    href = link.get_attribute('href')
-                    if href and '/groups/' in href and href not in seen_urls:
-                        seen_urls.add(href)
-                        
-                        # Extract group ID from URL
-                        group_id = href.split('/groups/')[-1].split('/')[0].split('?')[0]
-                        
-                        # Get group name
-                        try:
-                            name = link.text.strip()
-                        except:
-                            name = f"Group {group_id}"
-                        
-                        if name and group_id:
-                            groups.append({
-                                'id': group_id,
-                                'name': name,
-                                'url': href
-                            })
-                            
-                except Exception as e:
-                    logger.warning(f"Error parsing group: {e}")
-                    continue
-            
+            groups = [group async for batch in self.iter_groups(keyword, max_results) for group in batch]
             logger.info(f"Found {len(groups)} groups for keyword: {keyword}")
             return groups
             
@@ -145,25 +195,55 @@ class FacebookAutomator:
             logger.error(f"Error scanning groups: {e}")
             raise
     
+    async def scan_group_members(self, group_id: str, max_results: int = 100) -> List[Dict]:
+        """Scan members of a group"""
+        logger.info(f"Scanning members of group: {group_id}")
+        members = [m async for batch in self.iter_group_members(group_id, max_results) for m in batch]
+        logger.info(f"Found {len(members)} members in group {group_id}")
+        return members
+    
+    async def scan_followers(self, uid: str, max_results: int = 100) -> List[Dict]:
+        """Scan followers of a profile"""
+        logger.info(f"Scanning followers of profile: {uid}")
+        followers = [f async for batch in self.iter_followers(uid, max_results) for f in batch]
+        logger.info(f"Found {len(followers)} followers of {uid}")
+        return followers
+    
+    async def scan_friends(self, uid: str, max_results: int = 100) -> List[Dict]:
+        """Scan friends list of a profile"""
+        logger.info(f"Scanning friends of profile: {uid}")
+        friends = [f async for batch in self.iter_friends(uid, max_results) for f in batch]
+        logger.info(f"Found {len(friends)} friends of {uid}")
+        return friends
+    
+    def _profile_section_url(self, uid: str, section: str) -> str:
+        if uid.isdigit():
+            return f"{FACEBOOK_BASE_URL}/profile.php?id={uid}&sk={section}"
+        return f"{FACEBOOK_BASE_URL}/{uid}/{section}"
+    
     async def join_group(self, group_id: str) -> Dict:
         """Join a Facebook group"""
         try:
             logger.info(f"Joining group: {group_id}")
+            self.use_profile_for('group_join')
             
             # Navigate to group
-            group_url = f"https://www.facebook.com/groups/{group_id}"
-            self.driver.get(group_url)
-            await asyncio.sleep(3)
+            group_url = f"{FACEBOOK_BASE_URL}/groups/{group_id}"
+            
+            # Try multiple selectors for join button
+            join_selectors = [
+                "//span[contains(text(), 'Join') or contains(text(), 'Tham gia')]",
+                "//div[@aria-label='Join group' or @aria-label='Tham gia nhóm']",
+                "//a[contains(@href, 'join')]"
+            ]
+            await self.ready.navigate(
+                group_url,
+                any_of(any_element_present((By.XPATH, selector) for selector in join_selectors),
+                       text_present('Joined', 'Đã tham gia'))
+            )
             
             # Find and click join button
             try:
-                # Try multiple selectors for join button
-                join_selectors = [
-                    "//span[contains(text(), 'Join') or contains(text(), 'Tham gia')]",
-                    "//div[@aria-label='Join group' or @aria-label='Tham gia nhóm']",
-                    "//a[contains(@href, 'join')]"
-                ]
-                
                 join_button = None
                 for selector in join_selectors:
                     try:
@@ -175,17 +255,15 @@ class FacebookAutomator:
                 
                 if join_button:
                     join_button.click()
-                    await asyncio.sleep(2)
                     
-                    # Handle any popup/confirmation
-                    try:
-                        confirm_button = WebDriverWait(self.driver, 5).until(
-                            EC.element_to_be_clickable((By.XPATH, "//span[contains(text(), 'Join')]"))
-                        )
-                        confirm_button.click()
-                        await asyncio.sleep(1)
-                    except:
-                        pass
+                    # Wait for the joined/requested state or a confirmation popup
+                    outcome = await self.ready.wait('click', any_of(
+                        text_present('Joined', 'Đã tham gia', 'Cancel request', 'Hủy yêu cầu'),
+                        element_clickable(By.XPATH, "//div[@role='dialog']//span[contains(text(), 'Join') or contains(text(), 'Tham gia')]")
+                    ))
+                    if outcome is not None and outcome is not True:
+                        outcome.click()
+                        await self.ready.wait('click', element_gone(outcome))
                     
                     return {
                         'success': True,
@@ -232,19 +310,22 @@ class FacebookAutomator:
         """Send friend request to a profile"""
         try:
             logger.info(f"Adding friend: {profile_id}")
+            self.use_profile_for('friend_request')
             
             # Navigate to profile
-            profile_url = f"https://www.facebook.com/{profile_id}"
-            self.driver.get(profile_url)
-            await asyncio.sleep(3)
+            profile_url = f"{FACEBOOK_BASE_URL}/{profile_id}"
+            add_friend_selectors = [
+                "//span[contains(text(), 'Add Friend') or contains(text(), 'Kết bạn')]",
+                "//div[@aria-label='Add Friend' or @aria-label='Thêm bạn bè']"
+            ]
+            await self.ready.navigate(
+                profile_url,
+                any_of(any_element_present((By.XPATH, selector) for selector in add_friend_selectors),
+                       text_present('Friends', 'Bạn bè'))
+            )
             
             # Find and click add friend button
             try:
-                add_friend_selectors = [
-                    "//span[contains(text(), 'Add Friend') or contains(text(), 'Kết bạn')]",
-                    "//div[@aria-label='Add Friend' or @aria-label='Thêm bạn bè']"
-                ]
-                
                 add_button = None
                 for selector in add_friend_selectors:
                     try:
@@ -256,7 +337,9 @@ class FacebookAutomator:
                 
                 if add_button:
                     add_button.click()
-                    await asyncio.sleep(2)
+                    await self.ready.wait('click', text_present(
+                        'Cancel request', 'Request sent', 'Friends', 'Hủy lời mời', 'Đã gửi lời mời', 'Bạn bè'
+                    ))
                     
                     return {
                         'success': True,
@@ -303,34 +386,36 @@ class FacebookAutomator:
         """Post content to timeline"""
         try:
             logger.info("Posting to timeline")
+            self.use_profile_for('post_create')
             
             # Navigate to home
-            self.driver.get('https://www.facebook.com')
-            await asyncio.sleep(3)
+            post_box_locator = "//span[contains(text(), \"What's on your mind\") or contains(text(), 'Bạn đang nghĩ gì')]"
+            await self.ready.navigate(FACEBOOK_BASE_URL, element_clickable(By.XPATH, post_box_locator))
             
             # Click on "What's on your mind?" post box
             try:
-                post_box = WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, "//span[contains(text(), \"What's on your mind\") or contains(text(), 'Bạn đang nghĩ gì')]"))
-                )
+                post_box = await self.ready.wait('navigate', element_clickable(By.XPATH, post_box_locator), timeout=10, floor=0)
+                if not post_box:
+                    raise TimeoutException("Post box not found")
                 post_box.click()
-                await asyncio.sleep(2)
                 
                 # Find text area
-                text_area = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[contenteditable='true']"))
-                )
+                text_area = await self.ready.wait('click', element_present(By.CSS_SELECTOR, "div[contenteditable='true']"), timeout=10)
+                if not text_area:
+                    raise TimeoutException("Post text area not found")
                 
                 # Type content
                 text_area.send_keys(content)
-                await asyncio.sleep(2)
+                await self.ready.pause('type')
                 
                 # TODO: Handle image upload if needed
                 
                 # Click Post button
                 post_button = self.driver.find_element(By.XPATH, "//span[contains(text(), 'Post') or contains(text(), 'Đăng')]")
                 post_button.click()
-                await asyncio.sleep(3)
+                
+                # Composer closes once the post is published
+                await self.ready.wait('submit', element_gone(text_area))
                 
                 return {
                     'success': True,
@@ -359,26 +444,27 @@ class FacebookAutomator:
         """Comment on a Facebook post"""
         try:
             logger.info(f"Commenting on post: {post_url}")
+            self.use_profile_for('post_comment')
             
             # Navigate to post
-            self.driver.get(post_url)
-            await asyncio.sleep(3)
+            comment_locator = "div[contenteditable='true'][aria-label*='comment' i]"
+            await self.ready.navigate(post_url, element_present(By.CSS_SELECTOR, comment_locator))
             
             # Find comment box
             try:
-                comment_box = WebDriverWait(self.driver, 10).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[contenteditable='true'][aria-label*='comment' i]"))
-                )
+                comment_box = await self.ready.wait('navigate', element_present(By.CSS_SELECTOR, comment_locator), timeout=10, floor=0)
+                if not comment_box:
+                    raise TimeoutException("Comment box not found")
                 
                 comment_box.click()
-                await asyncio.sleep(1)
+                await self.ready.pause('click')
                 
                 comment_box.send_keys(comment_text)
-                await asyncio.sleep(1)
+                await self.ready.pause('type')
                 
-                # Press Enter to submit
+                # Press Enter to submit, done once the comment shows up on the page
                 comment_box.send_keys(Keys.RETURN)
-                await asyncio.sleep(2)
+                await self.ready.wait('submit', text_present(comment_text))
                 
                 return {
                     'success': True,
@@ -408,23 +494,23 @@ class FacebookAutomator:
         """React to a Facebook post"""
         try:
             logger.info(f"Reacting to post: {post_url} with {reaction_type}")
+            self.use_profile_for('post_reaction')
             
             # Navigate to post
-            self.driver.get(post_url)
-            await asyncio.sleep(3)
+            like_locator = "//span[contains(text(), 'Like') or contains(text(), 'Thích')]"
+            await self.ready.navigate(post_url, element_clickable(By.XPATH, like_locator))
             
             # Find like button
             try:
-                like_button = WebDriverWait(self.driver, 10).until(
-                    EC.element_to_be_clickable((By.XPATH, "//span[contains(text(), 'Like') or contains(text(), 'Thích')]"))
-                )
+                like_button = await self.ready.wait('navigate', element_clickable(By.XPATH, like_locator), timeout=10, floor=0)
+                if not like_button:
+                    raise TimeoutException("Like button not found")
                 
                 if reaction_type != 'LIKE':
                     # Hover to show reaction options
                     from selenium.webdriver.common.action_chains import ActionChains
                     actions = ActionChains(self.driver)
                     actions.move_to_element(like_button).perform()
-                    await asyncio.sleep(1)
                     
                     # Click specific reaction
                     reaction_map = {
@@ -436,15 +522,17 @@ class FacebookAutomator:
                     }
                     
                     if reaction_type in reaction_map:
-                        reaction_button = self.driver.find_element(
+                        reaction_button = await self.ready.wait('popup', element_clickable(
                             By.XPATH, 
                             f"//span[contains(@aria-label, '{reaction_map[reaction_type]}')]"
-                        )
+                        ))
+                        if not reaction_button:
+                            raise NoSuchElementException(f"Reaction {reaction_type} not found")
                         reaction_button.click()
                 else:
                     like_button.click()
                 
-                await asyncio.sleep(2)
+                await self.ready.pause('click')
                 
                 return {
                     'success': True,
@@ -470,13 +558,17 @@ class FacebookAutomator:
                 'screenshot': screenshot
             }
     
-    def _take_screenshot(self) -> str:
-        """Take screenshot and return as base64 string"""
+    def _take_screenshot(self, failure: bool = True) -> Optional[str]:
+        """
+        Capture the page into the screenshot store and return its reference
+        (None when the capture policy skips it, see SCREENSHOT_CAPTURE)
+        """
+        if not screenshot_store.should_capture(failure):
+            return None
         try:
-            screenshot = self.driver.get_screenshot_as_png()
-            screenshot_base64 = base64.b64encode(screenshot).decode('utf-8')
-            logger.info(f"Screenshot captured for account {self.session.account_uid}")
-            return screenshot_base64
+            ref = screenshot_store.save(self.driver.get_screenshot_as_png())
+            logger.info(f"Screenshot captured for account {self.session.account_uid}: {ref}")
+            return ref
         except Exception as e:
             logger.error(f"Error taking screenshot: {e}")
-            return ''
+            return None
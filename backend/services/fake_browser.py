@@ -0,0 +1,444 @@
+"""
+Fake Browser Backend
+Simulated in-process WebDriver returning scripted Facebook page states.
+Used with BROWSER_BACKEND=fake to benchmark/test the task pipeline without Chrome.
+"""
+
+import os
+import json
+import time
+import random
+import zlib
+import logging
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+
+from services.dom_extractor import EXTRACT_LINKS_SCRIPT, EXTRACT_NEW_LINKS_SCRIPT
+from services.page_readiness import (
+    READY_STATE_SCRIPT, NETWORK_IDLE_SCRIPT, PAGE_TEXT_SCRIPT, SCROLL_HEIGHT_SCRIPT
+)
+
+logger = logging.getLogger(__name__)
+
+ACCOUNT_STATES = ('live', 'checkpoint', 'die')
+
+# 1x1 transparent PNG, returned by get_screenshot_as_png()
+_BLANK_PNG = bytes.fromhex(
+    '89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+    '1f15c4890000000d49444154789c6360000002000001e221bc33000000'
+    '0049454e44ae426082'
+)
+
+# (selector fragments, element key) - first rule whose fragments all appear
+# in the selector wins. Fragments mirror the selectors used by
+# ChromeSession and FacebookAutomator.
+_SELECTOR_RULES = [
+    (('role="navigation"',), 'navigation'),
+    (('a[href*="/groups/"]',), 'group_link'),
+    (("div[role='main'] a[href]",), 'profile_link'),
+    (('contenteditable', 'comment'), 'comment_box'),
+    (('contenteditable',), 'composer'),
+    (("What's on your mind",), 'post_box'),
+    (('Add Friend',), 'add_friend'),
+    (('Join',), 'join'),
+    (('join',), 'join'),
+    (("'Like'",), 'like'),
+    (('@aria-label',), 'reaction'),
+    (("'Post'",), 'post_button'),
+    (('approvals_code',), 'two_fa_input'),
+]
+
+
+def parse_state_weights(value: str) -> Dict[str, float]:
+    """Parse 'live=0.85,checkpoint=0.1,die=0.05' into a weight dict"""
+    weights = {}
+    for part in value.split(','):
+        if '=' not in part:
+            continue
+        key, weight = part.split('=', 1)
+        key = key.strip().lower()
+        if key in ACCOUNT_STATES:
+            weights[key] = float(weight)
+    return weights or {'live': 1.0}
+
+
+class FakeWebElement:
+    """Minimal WebElement stand-in"""
+
+    def __init__(self, driver: 'FakeWebDriver', key: str, text: str = '', attributes: Optional[Dict] = None):
+        self._driver = driver
+        self.key = key
+        self.text = text
+        self.attributes = attributes or {}
+        self.value = ''
+        self.removed = False
+
+    def get_attribute(self, name: str) -> Optional[str]:
+        if name == 'value':
+            return self.value
+        return self.attributes.get(name)
+
+    def click(self):
+        self._driver._on_click(self)
+
+    def send_keys(self, *values):
+        for value in values:
+            # Selenium special keys (Keys.RETURN etc.) live in the private use area
+            if isinstance(value, str) and '\ue000' <= value[:1] <= '\uf8ff':
+                self._driver._on_key(self, value)
+            else:
+                self.value += value
+
+    def clear(self):
+        self.value = ''
+
+    def is_displayed(self) -> bool:
+        return not self.removed
+
+    def is_enabled(self) -> bool:
+        return True
+
+
+class FakeWebDriver:
+    """
+    Selenium WebDriver subset backed by scripted page states
+
+    Account state (live/checkpoint/die) is decided per account UID so a given
+    seed always produces the same mix of results.
+    """
+
+    def __init__(self, account_uid: str, state: str = 'live', latency_ms: float = 0,
+                 jitter_ms: float = 0, failure_rate: float = 0.0, groups_per_scroll: int = 8,
+                 seed: int = 0, user_data_dir: Optional[str] = None):
+        self.account_uid = account_uid
+        self.state = state
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.groups_per_scroll = groups_per_scroll
+        self._rng = random.Random(zlib.crc32(f"{seed}:{account_uid}".encode()))
+        self.current_url = 'about:blank'
+        self.page_kind = 'blank'
+        self.page_source = '<html><body></body></html>'
+        self.title = ''
+        self._cookies: List[Dict] = []
+        self._elements: Dict[str, List[FakeWebElement]] = {}
+        self._scrolls = 0
+        self._extracted = set()
+        self._query = ''
+        # Persistent profile: a login saved by an earlier driver is still valid
+        self.user_data_dir = user_data_dir
+        self._authenticated = bool(user_data_dir) and os.path.exists(self._cookie_file())
+        self.blocked_urls: List[str] = []
+        self.window_size = (1920, 1080)
+        self.page_loads = 0
+        self.closed = False
+
+    # ============================================
+    # NAVIGATION
+    # ============================================
+
+    def _wait(self):
+        """Simulate blocking network/render time like the real driver"""
+        delay = self.latency_ms
+        if self.jitter_ms:
+            delay += self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def get(self, url: str):
+        if self.closed:
+            raise TimeoutException('Browser session closed')
+        self._wait()
+        self.page_loads += 1
+        if self.failure_rate and self._rng.random() < self.failure_rate:
+            raise TimeoutException(f'Timed out receiving message from renderer: {url}')
+        self._load(url)
+
+    def refresh(self):
+        self.get(self.current_url)
+
+    def _load(self, url: str):
+        parsed = urlparse(url)
+        path = parsed.path.rstrip('/')
+        self._scrolls = 0
+        self._extracted = set()
+        self._elements = {}
+        self.page_source = '<html><body></body></html>'
+
+        if not self._authenticated or self.state == 'die':
+            # Dead cookies / not logged in: everything lands on the login form
+            if path:
+                self.current_url = f'https://www.facebook.com/login/?next={url}'
+            else:
+                self.current_url = url
+            self.page_kind = 'login'
+            self._elements = {
+                'email': [FakeWebElement(self, 'email')],
+                'pass': [FakeWebElement(self, 'pass')],
+                'login': [FakeWebElement(self, 'login', 'Log In')]
+            }
+            return
+        if self.state == 'checkpoint':
+            self.current_url = f'https://www.facebook.com/checkpoint/{self._rng.randint(10**8, 10**9)}/'
+            self.page_kind = 'checkpoint'
+            return
+
+        self.current_url = url
+        navigation = [FakeWebElement(self, 'navigation')]
+
+        if not path:
+            self.page_kind = 'home'
+            self._elements = {
+                'navigation': navigation,
+                'post_box': [FakeWebElement(self, 'post_box', "What's on your mind?")],
+                'composer': [FakeWebElement(self, 'composer', attributes={'contenteditable': 'true'})],
+                'post_button': [FakeWebElement(self, 'post_button', 'Post')]
+            }
+        elif path == '/me':
+            self.page_kind = 'profile'
+            self._elements = {
+                'navigation': navigation,
+                'h1': [FakeWebElement(self, 'h1', f'Fake User {self.account_uid[-4:]}')]
+            }
+        elif path.endswith(('/members', '/followers', '/friends')) or parse_qs(parsed.query).get('sk', [''])[0] in ('followers', 'friends'):
+            self.page_kind = 'profile_list'
+            self._query = path + parsed.query
+            self._elements = {'navigation': navigation}
+        elif path.startswith('/search/groups'):
+            self.page_kind = 'group_search'
+            self._query = parse_qs(parsed.query).get('q', [''])[0]
+            self._elements = {'navigation': navigation}
+        elif path.startswith('/groups/'):
+            self.page_kind = 'group'
+            self._elements = {
+                'navigation': navigation,
+                'join': [FakeWebElement(self, 'join', 'Join group')]
+            }
+        elif '/posts/' in path or 'story_fbid' in parsed.query or path.startswith('/permalink'):
+            self.page_kind = 'post'
+            self._elements = {
+                'navigation': navigation,
+                'like': [FakeWebElement(self, 'like', 'Like')],
+                'reaction': [FakeWebElement(self, 'reaction', attributes={'aria-label': 'Love'})],
+                'comment_box': [FakeWebElement(self, 'comment_box', attributes={'contenteditable': 'true'})]
+            }
+        else:
+            self.page_kind = 'profile'
+            self._elements = {
+                'navigation': navigation,
+                'h1': [FakeWebElement(self, 'h1', f'Profile {path.strip("/")}')],
+                'add_friend': [FakeWebElement(self, 'add_friend', 'Add Friend')]
+            }
+
+    # ============================================
+    # ELEMENT LOOKUP
+    # ============================================
+
+    def _resolve(self, by: str, value: str) -> List[FakeWebElement]:
+        if by in ('id', 'name'):
+            return self._elements.get(value, [])
+        if by == 'css selector' and value.strip() == 'h1':
+            return self._elements.get('h1', [])
+        for fragments, key in _SELECTOR_RULES:
+            if all(fragment in value for fragment in fragments):
+                if key == 'group_link' and self.page_kind == 'group_search':
+                    return self._group_links()
+                if key == 'profile_link' and self.page_kind == 'profile_list':
+                    return self._profile_links()
+                return self._elements.get(key, [])
+        return []
+
+    def _group_links(self) -> List[FakeWebElement]:
+        # Each scroll "loads" another page of results
+        count = self.groups_per_scroll * (self._scrolls + 1)
+        base = zlib.crc32(self._query.encode()) % 10**6
+        links = []
+        for i in range(count):
+            group_id = str(10**14 + base * 1000 + i)
+            links.append(FakeWebElement(
+                self, 'group_link', f'{self._query or "Group"} #{i + 1}',
+                {'href': f'https://www.facebook.com/groups/{group_id}/'}
+            ))
+        return links
+
+    def _profile_links(self) -> List[FakeWebElement]:
+        count = self.groups_per_scroll * (self._scrolls + 1)
+        base = zlib.crc32(self._query.encode()) % 10**6
+        return [
+            FakeWebElement(
+                self, 'profile_link', f'Member {i + 1}',
+                {'href': f'https://www.facebook.com/profile.php?id={10**14 + base * 1000 + i}'}
+            )
+            for i in range(count)
+        ]
+
+    def find_element(self, by: str = 'id', value: Optional[str] = None) -> FakeWebElement:
+        elements = self._resolve(by, value or '')
+        if not elements:
+            raise NoSuchElementException(f'Unable to locate element: {{"method":"{by}","selector":"{value}"}}')
+        return elements[0]
+
+    def find_elements(self, by: str = 'id', value: Optional[str] = None) -> List[FakeWebElement]:
+        return list(self._resolve(by, value or ''))
+
+    # ============================================
+    # PAGE EVENTS
+    # ============================================
+
+    def _on_click(self, element: FakeWebElement):
+        if element.key == 'join':
+            self.page_source = '<html><body><span>Joined</span></body></html>'
+        elif element.key == 'add_friend':
+            self.page_source = '<html><body><span>Friends</span></body></html>'
+        elif element.key == 'post_button':
+            # Publishing closes the composer
+            for composer in self._elements.pop('composer', []):
+                composer.removed = True
+        elif element.key == 'login':
+            self._set_authenticated()
+            self._load('https://www.facebook.com/')
+
+    def _on_key(self, element: FakeWebElement, key: str):
+        if element.key == 'comment_box' and key in ('\ue006', '\ue007'):  # RETURN / ENTER
+            self.page_source = self.page_source.replace('</body>', f'<p>{element.value}</p></body>')
+            element.value = ''
+
+    def _page_text(self) -> str:
+        texts = [e.text for elements in self._elements.values() for e in elements if e.text]
+        return '\n'.join(texts + [self.page_source])
+
+    def execute_script(self, script: str, *args):
+        if script == READY_STATE_SCRIPT:
+            return 'complete'
+        if script == NETWORK_IDLE_SCRIPT:
+            return True
+        if script == PAGE_TEXT_SCRIPT:
+            return self._page_text()
+        if script in (EXTRACT_LINKS_SCRIPT, EXTRACT_NEW_LINKS_SCRIPT):
+            selector, limit = args
+            # Incremental script: links already returned on this page count as marked
+            seen = self._extracted if script == EXTRACT_NEW_LINKS_SCRIPT else set()
+            items = []
+            for element in self._resolve('css selector', selector):
+                href = element.get_attribute('href')
+                if href and href not in seen:
+                    seen.add(href)
+                    items.append({'href': href, 'text': element.text, 'aria': element.get_attribute('aria-label') or ''})
+                if len(items) >= limit:
+                    break
+            return json.dumps(items)
+        if script == SCROLL_HEIGHT_SCRIPT:
+            return 1000 * (self._scrolls + 1)
+        if 'scrollTo' in script or 'scrollBy' in script:
+            self._scrolls += 1
+        return None
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: Dict):
+        if cmd == 'Network.setBlockedURLs':
+            self.blocked_urls = list(cmd_args.get('urls', []))
+        return {}
+
+    def set_window_size(self, width: int, height: int, windowHandle: str = 'current'):
+        self.window_size = (width, height)
+
+    def set_page_load_timeout(self, time_to_wait: float):
+        pass
+
+    def implicitly_wait(self, time_to_wait: float):
+        pass
+
+    # ============================================
+    # COOKIES / SCREENSHOTS / LIFECYCLE
+    # ============================================
+
+    def add_cookie(self, cookie: Dict):
+        self._cookies.append(dict(cookie))
+        self._set_authenticated()
+
+    def _cookie_file(self) -> str:
+        return os.path.join(self.user_data_dir or '', 'Default', 'Cookies')
+
+    def _set_authenticated(self):
+        """Log in; with a user-data-dir the login is written to the profile"""
+        self._authenticated = True
+        if self.user_data_dir:
+            os.makedirs(os.path.dirname(self._cookie_file()), exist_ok=True)
+            with open(self._cookie_file(), 'w', encoding='utf-8') as f:
+                json.dump(self._cookies or [{'name': 'c_user', 'value': self.account_uid}], f)
+
+    def get_cookies(self) -> List[Dict]:
+        return list(self._cookies)
+
+    def delete_all_cookies(self):
+        self._cookies = []
+
+    def get_screenshot_as_png(self) -> bytes:
+        return _BLANK_PNG
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeBrowserFactory:
+    """Browser backend that creates FakeWebDriver instances for sessions"""
+
+    name = 'fake'
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, failure_rate: float = 0.0,
+                 startup_ms: float = 0, state_weights: Optional[Dict[str, float]] = None,
+                 groups_per_scroll: int = 8, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self.startup_ms = startup_ms
+        self.state_weights = state_weights or {'live': 1.0}
+        self.groups_per_scroll = groups_per_scroll
+        self.seed = seed
+        self.state_overrides: Dict[str, str] = {}
+        self.drivers_created = 0
+
+    @classmethod
+    def from_env(cls) -> 'FakeBrowserFactory':
+        """Build factory from FAKE_BROWSER_* environment variables"""
+        return cls(
+            latency_ms=float(os.getenv('FAKE_BROWSER_LATENCY_MS', '0')),
+            jitter_ms=float(os.getenv('FAKE_BROWSER_JITTER_MS', '0')),
+            failure_rate=float(os.getenv('FAKE_BROWSER_FAILURE_RATE', '0')),
+            startup_ms=float(os.getenv('FAKE_BROWSER_STARTUP_MS', '0')),
+            state_weights=parse_state_weights(os.getenv('FAKE_BROWSER_STATES', 'live=1')),
+            groups_per_scroll=int(os.getenv('FAKE_BROWSER_GROUPS_PER_SCROLL', '8')),
+            seed=int(os.getenv('FAKE_BROWSER_SEED', '0'))
+        )
+
+    def set_account_state(self, account_uid: str, state: str):
+        """Force a scripted state (live/checkpoint/die) for one account"""
+        if state not in ACCOUNT_STATES:
+            raise ValueError(f"Unknown account state: {state}")
+        self.state_overrides[account_uid] = state
+
+    def account_state(self, account_uid: str) -> str:
+        """Deterministic state for an account UID given the configured weights"""
+        if account_uid in self.state_overrides:
+            return self.state_overrides[account_uid]
+        rng = random.Random(zlib.crc32(f"{self.seed}:state:{account_uid}".encode()))
+        states = list(self.state_weights)
+        return rng.choices(states, weights=[self.state_weights[s] for s in states])[0]
+
+    def create(self, session, headless: bool = True) -> FakeWebDriver:
+        """Create fake driver for a ChromeSession"""
+        if self.startup_ms > 0:
+            time.sleep(self.startup_ms / 1000)
+        self.drivers_created += 1
+        return FakeWebDriver(
+            account_uid=str(session.account_uid),
+            state=self.account_state(str(session.account_uid)),
+            latency_ms=self.latency_ms,
+            jitter_ms=self.jitter_ms,
+            failure_rate=self.failure_rate,
+            groups_per_scroll=self.groups_per_scroll,
+            seed=self.seed,
+            user_data_dir=session.user_data_dir
+        )
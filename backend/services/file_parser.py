@@ -246,6 +246,26 @@ def format_cookies_for_browser(cookies: List[Dict[str, Any]]) -> str:
     
     return '; '.join(parts)
 
+def parse_uid_list(content: str) -> List[str]:
+    """
+    Parse a UID list file: one UID per line, or the first field of a
+    via.txt-style line (UID|...). Duplicates are dropped, order is kept.
+    """
+    uids = []
+    seen = set()
+
+    for line in content.strip().split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):  # Skip empty lines and comments
+            continue
+
+        uid = re.split(r'[|,;:\s]', line, maxsplit=1)[0].strip()
+        if uid.isdigit() and uid not in seen:
+            seen.add(uid)
+            uids.append(uid)
+
+    return uids
+
 def extract_uid_from_cookies(cookies: List[Dict[str, Any]]) -> Optional[str]:
     """Extract Facebook UID from cookies"""
     for cookie in cookies:
@@ -0,0 +1,239 @@
+"""
+Page Readiness Service
+Event-driven waits for Selenium pages (DOMContentLoaded, network idle,
+element present, URL change) replacing fixed asyncio.sleep delays.
+Each action has a floor (minimum human-like pause) and an upper bound.
+"""
+
+import asyncio
+import os
+import time
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
+
+logger = logging.getLogger(__name__)
+
+# action -> (floor seconds, max wait seconds)
+ACTION_PROFILES: Dict[str, Tuple[float, float]] = {
+    'navigate': (0.3, 15.0),
+    'login': (0.5, 15.0),
+    'click': (0.2, 5.0),
+    'type': (0.05, 3.0),
+    'submit': (0.5, 10.0),
+    'scroll': (0.2, 4.0),
+    'popup': (0.0, 2.0),
+}
+
+FLOOR_SCALE = float(os.getenv('PAGE_READY_FLOOR_SCALE', '1.0'))
+MAX_WAIT = float(os.getenv('PAGE_READY_MAX_WAIT', '0'))  # 0 = per-action defaults
+POLL_INTERVAL = float(os.getenv('PAGE_READY_POLL_MS', '100')) / 1000
+NETWORK_IDLE_MS = int(os.getenv('PAGE_READY_NETWORK_IDLE_MS', '500'))
+
+# document.readyState: 'interactive' once DOMContentLoaded fired, 'complete' after load
+READY_STATE_SCRIPT = "return document.readyState;"
+
+# Network idle: page loaded and no resource finished within the last `idle_ms`
+NETWORK_IDLE_SCRIPT = """
+var idleMs = arguments[0];
+if (document.readyState !== 'complete') return false;
+var entries = performance.getEntriesByType('resource');
+var last = 0;
+for (var i = 0; i < entries.length; i++) {
+    if (entries[i].responseEnd > last) last = entries[i].responseEnd;
+}
+return performance.now() - last >= idleMs;
+"""
+
+PAGE_TEXT_SCRIPT = "return document.body ? document.body.innerText : '';"
+
+SCROLL_HEIGHT_SCRIPT = "return document.body ? document.body.scrollHeight : 0;"
+
+
+class ReadinessStats:
+    """Per-action wait latency, to see how long pages actually take"""
+
+    def __init__(self):
+        self.actions: Dict[str, Dict[str, float]] = {}
+
+    def record(self, action: str, waited: float, timed_out: bool):
+        entry = self.actions.setdefault(action, {'count': 0, 'total': 0.0, 'max': 0.0, 'timeouts': 0})
+        entry['count'] += 1
+        entry['total'] += waited
+        entry['max'] = max(entry['max'], waited)
+        if timed_out:
+            entry['timeouts'] += 1
+
+    def to_dict(self) -> Dict:
+        return {
+            action: {
+                'count': int(e['count']),
+                'avg_ms': round(e['total'] / e['count'] * 1000, 1) if e['count'] else 0.0,
+                'max_ms': round(e['max'] * 1000, 1),
+                'timeouts': int(e['timeouts'])
+            }
+            for action, e in sorted(self.actions.items())
+        }
+
+    def reset(self):
+        self.actions = {}
+
+
+# ============================================
+# CONDITIONS (driver -> truthy value when ready)
+# ============================================
+
+def dom_ready() -> Callable:
+    """DOMContentLoaded has fired"""
+    return lambda driver: driver.execute_script(READY_STATE_SCRIPT) in ('interactive', 'complete')
+
+
+def network_idle(idle_ms: int = NETWORK_IDLE_MS) -> Callable:
+    """Load finished and no network activity for `idle_ms`"""
+    return lambda driver: driver.execute_script(NETWORK_IDLE_SCRIPT, idle_ms)
+
+
+def element_present(by: str, selector: str) -> Callable:
+    """First element matching the locator"""
+    def condition(driver):
+        elements = driver.find_elements(by, selector)
+        return elements[0] if elements else None
+    return condition
+
+
+def any_element_present(locators: Iterable[Tuple[str, str]]) -> Callable:
+    """First element matching any of the locators"""
+    locators = list(locators)
+
+    def condition(driver):
+        for by, selector in locators:
+            elements = driver.find_elements(by, selector)
+            if elements:
+                return elements[0]
+        return None
+    return condition
+
+
+def element_clickable(by: str, selector: str) -> Callable:
+    """First matching element that is displayed and enabled"""
+    def condition(driver):
+        for element in driver.find_elements(by, selector):
+            if element.is_displayed() and element.is_enabled():
+                return element
+        return None
+    return condition
+
+
+def element_gone(element) -> Callable:
+    """Element was removed from the DOM or hidden"""
+    def condition(driver):
+        try:
+            return not element.is_displayed()
+        except StaleElementReferenceException:
+            return True
+    return condition
+
+
+def page_grew(old_height: int) -> Callable:
+    """More content was appended (infinite scroll loaded the next batch)"""
+    return lambda driver: (driver.execute_script(SCROLL_HEIGHT_SCRIPT) or 0) > old_height
+
+
+def url_changed(old_url: str) -> Callable:
+    """Current URL differs from `old_url`"""
+    return lambda driver: driver.current_url != old_url and driver.current_url
+
+
+def url_contains(*fragments: str) -> Callable:
+    """Current URL contains any of the fragments"""
+    return lambda driver: any(fragment in driver.current_url for fragment in fragments)
+
+
+def text_present(*texts: str) -> Callable:
+    """Visible page text contains any of the given strings"""
+    def condition(driver):
+        page_text = driver.execute_script(PAGE_TEXT_SCRIPT) or ''
+        return any(text in page_text for text in texts)
+    return condition
+
+
+def any_of(*conditions: Callable) -> Callable:
+    """First condition that is satisfied"""
+    def condition(driver):
+        for cond in conditions:
+            value = cond(driver)
+            if value:
+                return value
+        return None
+    return condition
+
+
+# ============================================
+# WAITER
+# ============================================
+
+class PageReadiness:
+    """Async waits on page conditions for one WebDriver"""
+
+    def __init__(self, driver, stats: Optional[ReadinessStats] = None, on_navigate: Optional[Callable] = None):
+        self.driver = driver
+        self.stats = stats or readiness_stats
+        self.on_navigate = on_navigate
+
+    async def wait(self, action: str, condition: Optional[Callable] = None,
+                   timeout: Optional[float] = None, floor: Optional[float] = None) -> Any:
+        """
+        Poll `condition` until truthy or the action's upper bound passes.
+        Returns the condition value (None on timeout). The action's floor is
+        always respected so fast pages still get a minimal pause.
+        """
+        default_floor, default_timeout = ACTION_PROFILES.get(action, (0.0, 10.0))
+        floor = (default_floor if floor is None else floor) * FLOOR_SCALE
+        timeout = timeout if timeout is not None else (MAX_WAIT or default_timeout)
+
+        started = time.monotonic()
+        deadline = started + timeout
+        value = None
+        timed_out = False
+
+        while condition is not None:
+            try:
+                value = condition(self.driver)
+            except WebDriverException:
+                # Element went stale / page navigating - poll again
+                value = None
+            if value:
+                break
+            if time.monotonic() >= deadline:
+                timed_out = True
+                logger.debug(f"Readiness wait '{action}' timed out after {timeout:.1f}s")
+                break
+            await asyncio.sleep(POLL_INTERVAL)
+
+        elapsed = time.monotonic() - started
+        if elapsed < floor:
+            await asyncio.sleep(floor - elapsed)
+
+        self.stats.record(action, time.monotonic() - started, timed_out)
+        return value if not timed_out else None
+
+    async def navigate(self, url: str, ready: Optional[Callable] = None, action: str = 'navigate') -> Any:
+        """
+        Open `url` (driver.get returns after DOMContentLoaded/load) and wait
+        until the page-specific `ready` condition holds or the network is idle
+        """
+        self.driver.get(url)
+        if self.on_navigate:
+            self.on_navigate()
+        if ready is None:
+            return await self.wait(action, network_idle())
+        return await self.wait(action, any_of(ready, network_idle()))
+
+    async def pause(self, action: str):
+        """Only the action's floor (for steps with nothing observable to wait on)"""
+        await self.wait(action)
+
+
+# Global readiness statistics
+readiness_stats = ReadinessStats()
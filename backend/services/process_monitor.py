@@ -0,0 +1,133 @@
+"""
+Process Monitor Service
+RSS and CPU of a WebDriver's process tree (chromedriver + the Chrome
+browser, renderer and GPU processes it spawned), read from /proc.
+Returns None on platforms without /proc.
+"""
+
+import os
+import time
+import logging
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+def _read_stat(pid) -> Optional[List[str]]:
+    """Fields of /proc/<pid>/stat after the parenthesised command name"""
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            return f.read().rsplit(')', 1)[1].split()
+    except (OSError, IndexError):
+        return None
+
+
+def process_tree_pids(root_pid: int) -> Optional[List[int]]:
+    """A process and all its descendants"""
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return None
+
+    children: Dict[int, List[int]] = {}
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        fields = _read_stat(entry)
+        if fields:
+            # ppid is the 2nd field after the command name
+            children.setdefault(int(fields[1]), []).append(int(entry))
+
+    pids, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        pids.append(pid)
+        stack.extend(children.get(pid, []))
+    return pids
+
+
+def sample_process_tree(root_pid: int) -> Optional[Dict[str, float]]:
+    """{'rss_mb', 'cpu_seconds', 'processes'} for a process tree"""
+    pids = process_tree_pids(root_pid)
+    if pids is None:
+        return None
+
+    rss_pages = 0
+    cpu_ticks = 0
+    alive = 0
+    for pid in pids:
+        fields = _read_stat(pid)
+        if not fields:
+            continue
+        try:
+            # utime / stime are fields 14 and 15 of stat (11 and 12 after the name)
+            cpu_ticks += int(fields[11]) + int(fields[12])
+            with open(f'/proc/{pid}/statm') as f:
+                rss_pages += int(f.read().split()[1])
+            alive += 1
+        except (OSError, IndexError, ValueError):
+            continue
+
+    return {
+        'rss_mb': rss_pages * _PAGE_SIZE / (1024 * 1024),
+        'cpu_seconds': cpu_ticks / _CLOCK_TICKS,
+        'processes': alive
+    }
+
+
+def process_tree_rss_mb(root_pid: int) -> Optional[float]:
+    """RSS of a process and all its descendants in MB"""
+    sample = sample_process_tree(root_pid)
+    return sample['rss_mb'] if sample else None
+
+
+def driver_pid(driver) -> Optional[int]:
+    """PID of the chromedriver process behind a WebDriver (None for other backends)"""
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    return process.pid if process else None
+
+
+def browser_rss_mb(driver) -> Optional[float]:
+    """Memory of chromedriver + the Chrome processes it spawned"""
+    pid = driver_pid(driver)
+    return process_tree_rss_mb(pid) if pid else None
+
+
+class ProcessSampler:
+    """Samples one driver's process tree; CPU % is measured between samples"""
+
+    def __init__(self):
+        self._last_cpu: Optional[float] = None
+        self._last_time: Optional[float] = None
+        self.rss_mb: Optional[float] = None
+        self.peak_rss_mb: float = 0.0
+        self.cpu_percent: Optional[float] = None
+        self.processes: int = 0
+
+    def sample(self, driver) -> Optional[Dict[str, float]]:
+        pid = driver_pid(driver)
+        sample = sample_process_tree(pid) if pid else None
+        if not sample:
+            return None
+
+        now = time.monotonic()
+        if self._last_cpu is not None and now > self._last_time:
+            self.cpu_percent = max(sample['cpu_seconds'] - self._last_cpu, 0.0) / (now - self._last_time) * 100
+        self._last_cpu = sample['cpu_seconds']
+        self._last_time = now
+
+        self.rss_mb = sample['rss_mb']
+        self.peak_rss_mb = max(self.peak_rss_mb, self.rss_mb)
+        self.processes = int(sample['processes'])
+        return sample
+
+    def to_dict(self) -> Dict:
+        return {
+            'rss_mb': round(self.rss_mb, 1) if self.rss_mb is not None else None,
+            'peak_rss_mb': round(self.peak_rss_mb, 1),
+            'cpu_percent': round(self.cpu_percent, 1) if self.cpu_percent is not None else None,
+            'processes': self.processes
+        }
@@ -0,0 +1,145 @@
+"""
+Chrome Profile Store
+Persistent per-account Chrome user-data-dir profiles so a restarted session
+resumes already logged in instead of replaying the cookie/credential login.
+Total disk usage is capped; least recently used profiles are removed first.
+"""
+
+import os
+import shutil
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PROFILE_ROOT = Path(__file__).resolve().parent.parent / 'data' / 'chrome_profiles'
+
+PROFILES_ENABLED = os.getenv('CHROME_PERSISTENT_PROFILES', 'false').lower() == 'true'
+PROFILE_ROOT = Path(os.getenv('CHROME_PROFILE_DIR', str(DEFAULT_PROFILE_ROOT)))
+PROFILE_MAX_MB = float(os.getenv('CHROME_PROFILE_MAX_MB', '2048'))
+# Per-profile HTTP cache limit passed to Chrome (--disk-cache-size)
+PROFILE_CACHE_MB = int(os.getenv('CHROME_PROFILE_CACHE_MB', '32'))
+
+# Touched on every use; its mtime is the LRU timestamp (survives restarts)
+_LAST_USED_MARKER = '.bi_last_used'
+
+
+def dir_size(path: Path) -> int:
+    """Total size of files under `path` in bytes"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+
+class ProfileStore:
+    """On-disk Chrome profiles, one directory per account"""
+
+    def __init__(self, root: Path = PROFILE_ROOT, max_mb: float = PROFILE_MAX_MB,
+                 enabled: bool = PROFILES_ENABLED, cache_mb: int = PROFILE_CACHE_MB):
+        self.root = Path(root)
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.enabled = enabled
+        self.cache_mb = cache_mb
+        self.evicted = 0
+
+    def path_for(self, account_id: int) -> Path:
+        return self.root / f"account_{account_id}"
+
+    def exists(self, account_id: int) -> bool:
+        """Profile directory was used by an earlier session"""
+        return (self.path_for(account_id) / _LAST_USED_MARKER).exists()
+
+    def acquire(self, account_id: int) -> Optional[str]:
+        """Profile directory for a new session (None when disabled)"""
+        if not self.enabled:
+            return None
+        path = self.path_for(account_id)
+        path.mkdir(parents=True, exist_ok=True)
+        self.touch(account_id)
+        return str(path)
+
+    def touch(self, account_id: int):
+        """Mark a profile as just used"""
+        marker = self.path_for(account_id) / _LAST_USED_MARKER
+        try:
+            marker.touch()
+        except OSError as e:
+            logger.warning(f"Failed to touch profile marker for account {account_id}: {e}")
+
+    def remove(self, account_id: int) -> bool:
+        """Delete an account's profile (e.g. after the account died)"""
+        path = self.path_for(account_id)
+        if not path.exists():
+            return False
+        shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Chrome profile removed for account {account_id}")
+        return True
+
+    def list_profiles(self) -> List[Dict]:
+        """Profiles on disk, least recently used first"""
+        if not self.root.exists():
+            return []
+        profiles = []
+        for path in self.root.iterdir():
+            if not path.is_dir() or not path.name.startswith('account_'):
+                continue
+            marker = path / _LAST_USED_MARKER
+            try:
+                last_used = marker.stat().st_mtime if marker.exists() else path.stat().st_mtime
+            except OSError:
+                continue
+            account_id = path.name.split('_', 1)[1]
+            profiles.append({
+                'account_id': int(account_id) if account_id.isdigit() else None,
+                'path': path,
+                'size_bytes': dir_size(path),
+                'last_used': last_used
+            })
+        profiles.sort(key=lambda p: p['last_used'])
+        return profiles
+
+    def cleanup(self, in_use: Iterable[int] = ()) -> int:
+        """
+        Remove least recently used profiles until total size fits the cap.
+        Profiles of running sessions are never removed. Returns profiles removed.
+        """
+        if not self.enabled:
+            return 0
+        in_use = set(in_use)
+        profiles = self.list_profiles()
+        total = sum(p['size_bytes'] for p in profiles)
+        removed = 0
+
+        for profile in profiles:
+            if total <= self.max_bytes:
+                break
+            if profile['account_id'] in in_use:
+                continue
+            shutil.rmtree(profile['path'], ignore_errors=True)
+            total -= profile['size_bytes']
+            removed += 1
+
+        if removed:
+            self.evicted += removed
+            logger.info(f"Chrome profile cleanup removed {removed} profiles ({total / 1024 / 1024:.1f} MB left)")
+        return removed
+
+    def stats(self) -> Dict:
+        profiles = self.list_profiles()
+        total = sum(p['size_bytes'] for p in profiles)
+        return {
+            'enabled': self.enabled,
+            'root': str(self.root),
+            'profiles': len(profiles),
+            'total_mb': round(total / 1024 / 1024, 1),
+            'max_mb': round(self.max_bytes / 1024 / 1024, 1),
+            'evicted': self.evicted,
+            'oldest_last_used': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(profiles[0]['last_used'])) if profiles else None
+        }
@@ -0,0 +1,180 @@
+"""
+Screenshot Store
+Downscaled, compressed (WebP/JPEG) screenshots written once to disk under
+their content hash. Tasks and API results keep only the reference
+('<sha256>.<ext>'); images are served by /api/tasks/screenshots/{ref}.
+Old files are removed by age and by a total size cap.
+"""
+
+import hashlib
+import io
+import os
+import re
+import time
+import logging
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCREENSHOT_DIR = Path(__file__).resolve().parent.parent / 'data' / 'screenshots'
+
+SCREENSHOT_DIR = Path(os.getenv('SCREENSHOT_DIR', str(DEFAULT_SCREENSHOT_DIR)))
+SCREENSHOT_FORMAT = os.getenv('SCREENSHOT_FORMAT', 'webp').lower()  # webp, jpeg
+SCREENSHOT_MAX_WIDTH = int(os.getenv('SCREENSHOT_MAX_WIDTH', '1024'))
+SCREENSHOT_QUALITY = int(os.getenv('SCREENSHOT_QUALITY', '60'))
+SCREENSHOT_MAX_MB = float(os.getenv('SCREENSHOT_MAX_MB', '500'))
+SCREENSHOT_RETENTION_DAYS = float(os.getenv('SCREENSHOT_RETENTION_DAYS', '14'))
+# Enforce retention every N new files (also on startup and via the API)
+CLEANUP_EVERY = int(os.getenv('SCREENSHOT_CLEANUP_EVERY', '200'))
+# always: every screenshot call, failures: only failed actions, never: disabled
+SCREENSHOT_CAPTURE = os.getenv('SCREENSHOT_CAPTURE', 'failures').lower()
+
+_REF_RE = re.compile(r'^[0-9a-f]{64}\.(webp|jpg|png)$')
+_EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'jpg': 'jpg'}
+MEDIA_TYPES = {'webp': 'image/webp', 'jpg': 'image/jpeg', 'png': 'image/png'}
+
+
+class ScreenshotStore:
+    """Content-addressed screenshot files with retention"""
+
+    def __init__(self, root: Path = SCREENSHOT_DIR, image_format: str = SCREENSHOT_FORMAT,
+                 max_width: int = SCREENSHOT_MAX_WIDTH, quality: int = SCREENSHOT_QUALITY,
+                 max_mb: float = SCREENSHOT_MAX_MB, retention_days: float = SCREENSHOT_RETENTION_DAYS,
+                 capture: str = SCREENSHOT_CAPTURE):
+        self.root = Path(root)
+        self.extension = _EXTENSIONS.get(image_format, 'webp')
+        self.max_width = max_width
+        self.quality = quality
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.retention_seconds = retention_days * 86400
+        self.capture = capture
+        self.saved = 0
+        self.deduplicated = 0
+        self._pillow_missing_logged = False
+
+    def should_capture(self, failure: bool) -> bool:
+        """Capture policy: always / only on failures / never"""
+        if self.capture == 'always':
+            return True
+        if self.capture == 'failures':
+            return failure
+        return False
+
+    def _compress(self, png: bytes) -> tuple:
+        """(bytes, extension): downscaled WebP/JPEG, or the PNG as is without Pillow"""
+        try:
+            from PIL import Image
+        except ImportError:
+            if not self._pillow_missing_logged:
+                logger.warning("Pillow not installed - screenshots stored as full PNG. Install with: pip install Pillow")
+                self._pillow_missing_logged = True
+            return png, 'png'
+
+        image = Image.open(io.BytesIO(png))
+        if image.width > self.max_width:
+            height = max(int(image.height * self.max_width / image.width), 1)
+            image = image.resize((self.max_width, height), Image.LANCZOS)
+        image = image.convert('RGB')
+
+        output = io.BytesIO()
+        if self.extension == 'webp':
+            image.save(output, 'WEBP', quality=self.quality, method=4)
+        else:
+            image.save(output, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+        return output.getvalue(), self.extension
+
+    def save(self, png: bytes) -> str:
+        """Store a PNG screenshot and return its reference"""
+        data, extension = self._compress(png)
+        ref = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+        path = self.path_for(ref)
+
+        if path.exists():
+            # Same image already stored (e.g. identical checkpoint page)
+            os.utime(path)
+            self.deduplicated += 1
+            return ref
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.saved += 1
+        if self.saved % CLEANUP_EVERY == 0:
+            self.cleanup()
+        return ref
+
+    def path_for(self, ref: str) -> Path:
+        """File path of a reference (ValueError for anything that is not a reference)"""
+        if not _REF_RE.match(ref or ''):
+            raise ValueError(f"Invalid screenshot reference: {ref}")
+        return self.root / ref[:2] / ref
+
+    def open(self, ref: str) -> Optional[Path]:
+        """Existing file for a reference, or None"""
+        try:
+            path = self.path_for(ref)
+        except ValueError:
+            return None
+        return path if path.exists() else None
+
+    def _files(self):
+        if not self.root.exists():
+            return []
+        files = []
+        for path in self.root.glob('*/*'):
+            if _REF_RE.match(path.name):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        return files
+
+    def cleanup(self) -> int:
+        """Remove files past the retention period, then oldest first down to the size cap"""
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        cutoff = time.time() - self.retention_seconds if self.retention_seconds else None
+        removed = 0
+
+        for mtime, size, path in files:
+            expired = cutoff is not None and mtime < cutoff
+            if not expired and total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+
+        if removed:
+            logger.info(f"Screenshot cleanup removed {removed} files ({total / 1024 / 1024:.1f} MB left)")
+        return removed
+
+    def stats(self) -> Dict:
+        files = self._files()
+        return {
+            'root': str(self.root),
+            'format': self.extension,
+            'capture': self.capture,
+            'files': len(files),
+            'total_mb': round(sum(size for _, size, _ in files) / 1024 / 1024, 2),
+            'max_mb': round(self.max_bytes / 1024 / 1024, 1),
+            'retention_days': round(self.retention_seconds / 86400, 1),
+            'saved': self.saved,
+            'deduplicated': self.deduplicated
+        }
+
+
+def screenshot_url(ref: Optional[str]) -> Optional[str]:
+    """API URL of a stored screenshot"""
+    return f"/api/tasks/screenshots/{ref}" if ref else None
+
+
+# Global screenshot store
+screenshot_store = ScreenshotStore()
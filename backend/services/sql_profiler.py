@@ -0,0 +1,214 @@
+"""
+SQL Profiler Service
+Per-request SQL query accounting to find N+1 patterns and slow endpoints
+"""
+
+import re
+import time
+import heapq
+import logging
+from contextvars import ContextVar
+from collections import Counter
+from typing import Dict, List, Optional
+from datetime import datetime
+
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Stats of the request currently being served (None outside profiled requests)
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("sql_request_profile", default=None)
+
+_IN_LIST_RE = re.compile(r"\(\s*(?:\?|%\(\w+\)s|:\w+|\$\d+)(?:\s*,\s*(?:\?|%\(\w+\)s|:\w+|\$\d+))*\s*\)")
+_LITERAL_RE = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Reduce a SQL statement to its shape (literals and IN-lists collapsed)"""
+    shape = _IN_LIST_RE.sub("(?)", statement)
+    shape = _LITERAL_RE.sub("?", shape)
+    return _WHITESPACE_RE.sub(" ", shape).strip()
+
+
+class RequestProfile:
+    """Query counters collected while serving one HTTP request"""
+
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now()
+        self.query_count = 0
+        self.db_time = 0.0  # seconds
+        self.total_time = 0.0  # seconds
+        self.shapes: Counter = Counter()
+        self.shape_time: Dict[str, float] = {}
+
+    def record(self, statement: str, elapsed: float):
+        """Record one executed statement"""
+        shape = normalize_statement(statement)
+        self.query_count += 1
+        self.db_time += elapsed
+        self.shapes[shape] += 1
+        self.shape_time[shape] = self.shape_time.get(shape, 0.0) + elapsed
+
+    def repeated_shapes(self, threshold: int) -> List[Dict]:
+        """Statement shapes executed at least `threshold` times (likely N+1)"""
+        return [
+            {
+                'statement': shape,
+                'count': count,
+                'db_time_ms': round(self.shape_time[shape] * 1000, 2)
+            }
+            for shape, count in self.shapes.most_common()
+            if count >= threshold
+        ]
+
+    def to_dict(self, repeat_threshold: int = 5) -> Dict:
+        """Convert profile to dictionary"""
+        return {
+            'method': self.method,
+            'path': self.path,
+            'started_at': self.started_at.isoformat(),
+            'query_count': self.query_count,
+            'db_time_ms': round(self.db_time * 1000, 2),
+            'total_time_ms': round(self.total_time * 1000, 2),
+            'distinct_statements': len(self.shapes),
+            'repeated_statements': self.repeated_shapes(repeat_threshold)
+        }
+
+
+class SQLProfiler:
+    """Hooks SQLAlchemy engine events and keeps a report of the worst requests"""
+
+    def __init__(self, slow_request_ms: float = 500, repeat_threshold: int = 5, report_size: int = 20):
+        self.slow_request_ms = slow_request_ms
+        self.repeat_threshold = repeat_threshold
+        self.report_size = report_size
+        self._installed_engines = set()
+        self._worst: List = []  # min-heap of (db_time, seq, profile dict)
+        self._seq = 0
+        self.requests_profiled = 0
+        self.slow_requests = 0
+        self.n_plus_one_requests = 0
+
+    def install(self, engine):
+        """Attach cursor execute listeners to an (async) engine"""
+        sync_engine = getattr(engine, 'sync_engine', engine)
+        if id(sync_engine) in self._installed_engines:
+            return
+
+        event.listen(sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_cursor_execute)
+        self._installed_engines.add(id(sync_engine))
+        logger.info("SQL profiler installed")
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _current_profile.get() is not None:
+            conn.info.setdefault('sql_profiler_start', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = _current_profile.get()
+        if profile is None:
+            return
+
+        starts = conn.info.get('sql_profiler_start')
+        if not starts:
+            return
+        profile.record(statement, time.perf_counter() - starts.pop())
+
+    def start_request(self, method: str, path: str):
+        """Begin profiling the current request; returns (profile, reset token)"""
+        profile = RequestProfile(method, path)
+        token = _current_profile.set(profile)
+        return profile, token
+
+    def finish_request(self, profile: RequestProfile, token):
+        """Stop profiling, log offenders and update the slow-request report"""
+        _current_profile.reset(token)
+        self.requests_profiled += 1
+
+        repeated = profile.repeated_shapes(self.repeat_threshold)
+        is_slow = profile.total_time * 1000 >= self.slow_request_ms
+
+        if repeated:
+            self.n_plus_one_requests += 1
+            worst = repeated[0]
+            logger.warning(
+                f"Possible N+1 in {profile.method} {profile.path}: "
+                f"{worst['count']}x {worst['statement'][:200]} "
+                f"({profile.query_count} queries, {profile.db_time * 1000:.1f}ms DB)"
+            )
+
+        if is_slow:
+            self.slow_requests += 1
+            logger.warning(
+                f"Slow request {profile.method} {profile.path}: "
+                f"{profile.total_time * 1000:.1f}ms total, {profile.db_time * 1000:.1f}ms DB, "
+                f"{profile.query_count} queries"
+            )
+
+        if is_slow or repeated:
+            self._seq += 1
+            entry = (profile.db_time, self._seq, profile.to_dict(self.repeat_threshold))
+            if len(self._worst) < self.report_size:
+                heapq.heappush(self._worst, entry)
+            else:
+                heapq.heappushpop(self._worst, entry)
+
+    def get_report(self) -> Dict:
+        """Worst offending requests ordered by DB time"""
+        worst = [item[2] for item in sorted(self._worst, reverse=True)]
+        return {
+            'requests_profiled': self.requests_profiled,
+            'slow_requests': self.slow_requests,
+            'n_plus_one_requests': self.n_plus_one_requests,
+            'slow_request_ms': self.slow_request_ms,
+            'repeat_threshold': self.repeat_threshold,
+            'worst_requests': worst
+        }
+
+    def reset_report(self):
+        """Clear collected report data"""
+        self._worst = []
+        self.requests_profiled = 0
+        self.slow_requests = 0
+        self.n_plus_one_requests = 0
+
+
+class SQLProfilerMiddleware:
+    """ASGI middleware that profiles SQL per request and adds X-DB-* debug headers"""
+
+    def __init__(self, app, profiler: SQLProfiler, add_headers: bool = True):
+        self.app = app
+        self.profiler = profiler
+        self.add_headers = add_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        profile, token = self.profiler.start_request(scope.get('method', ''), scope.get('path', ''))
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and self.add_headers:
+                # Headers reflect queries issued before the response started
+                repeated = profile.repeated_shapes(self.profiler.repeat_threshold)
+                headers = list(message.get('headers', []))
+                headers.append((b'x-db-query-count', str(profile.query_count).encode()))
+                headers.append((b'x-db-time-ms', f"{profile.db_time * 1000:.2f}".encode()))
+                headers.append((b'x-db-repeated-max', str(repeated[0]['count'] if repeated else 0).encode()))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.total_time = time.perf_counter() - started
+            self.profiler.finish_request(profile, token)
+
+
+# Global SQL Profiler instance (only active when installed on the engine)
+sql_profiler = SQLProfiler()
@@ -0,0 +1,172 @@
+"""
+Task Cancellation
+Cooperative cancellation of running tasks. Every task the scheduler runs
+gets a CancelToken: handlers call token.check() between items and wait with
+token.sleep() / token.wait(), both of which raise TaskCancelled as soon as
+the task is cancelled. Cleanups registered with token.on_cancel() (closing
+the account's Chrome session, which also frees its proxy) run immediately
+on cancel, and a handler still running TASK_CANCEL_GRACE seconds later is
+interrupted with asyncio cancellation. Progress recorded with
+token.record() is saved as the cancelled task's partial result.
+"""
+
+import asyncio
+import inspect
+import os
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cancelled handler gets to stop on its own before it is interrupted
+TASK_CANCEL_GRACE = float(os.getenv('TASK_CANCEL_GRACE', '5'))
+
+DEFAULT_REASON = "Task cancelled by user"
+
+
+class TaskCancelled(Exception):
+    """Raised inside a handler whose task was cancelled"""
+
+    def __init__(self, reason: str = DEFAULT_REASON):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Cancel signal, cleanups and partial result of one running task"""
+
+    def __init__(self, task_id: str, account_id: Optional[int] = None):
+        self.task_id = task_id
+        self.account_id = account_id
+        self.reason: Optional[str] = None
+        self.partial: Dict[str, Any] = {}
+        self._event = asyncio.Event()
+        self._cleanups: List[Callable[[], Any]] = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self):
+        """Raise TaskCancelled if the task was cancelled (call between items)"""
+        if self._event.is_set():
+            raise TaskCancelled(self.reason or DEFAULT_REASON)
+
+    async def sleep(self, seconds: float):
+        """asyncio.sleep that ends early (TaskCancelled) when the task is cancelled"""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            return
+        self.check()
+
+    async def wait(self, awaitable: Awaitable) -> Any:
+        """Await `awaitable` unless the task is cancelled first (it is then cancelled too)"""
+        self.check()
+        work = asyncio.ensure_future(awaitable)
+        signal = asyncio.ensure_future(self._event.wait())
+        try:
+            await asyncio.wait({work, signal}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            signal.cancel()
+        if not work.done():
+            work.cancel()
+            self.check()
+        return work.result()
+
+    def on_cancel(self, callback: Callable[[], Any]):
+        """Run `callback` (sync or async) if the task is cancelled, e.g. to release a browser session"""
+        self._cleanups.append(callback)
+
+    def record(self, **partial):
+        """Remember progress so far; saved as the result if the task is cancelled"""
+        self.partial.update(partial)
+
+    async def _cancel(self, reason: str):
+        self.reason = reason
+        self._event.set()
+        cleanups, self._cleanups = self._cleanups, []
+        for callback in reversed(cleanups):
+            try:
+                value = callback()
+                if inspect.isawaitable(value):
+                    await value
+            except Exception as e:
+                logger.warning(f"Cancel cleanup of task {self.task_id} failed: {e}")
+
+
+class CancellationRegistry:
+    """Tokens of the tasks running in this process"""
+
+    def __init__(self, grace: float = TASK_CANCEL_GRACE):
+        self.grace = grace
+        self._tokens: Dict[str, CancelToken] = {}
+        self._runners: Dict[str, asyncio.Task] = {}
+        self.cancelled = 0
+        self.interrupted = 0
+
+    def register(self, task_id: str, account_id: Optional[int] = None) -> CancelToken:
+        """Token for a task starting to run"""
+        token = self._tokens.get(task_id)
+        if token is None:
+            token = CancelToken(task_id, account_id)
+            self._tokens[task_id] = token
+        return token
+
+    def attach(self, task_id: str, runner: asyncio.Task):
+        """Asyncio task to interrupt if the handler ignores the cancel signal"""
+        if task_id in self._tokens:
+            self._runners[task_id] = runner
+
+    def get(self, task_id: Optional[str]) -> Optional[CancelToken]:
+        return self._tokens.get(task_id) if task_id else None
+
+    def release(self, task_id: str):
+        """Forget a task that stopped running"""
+        self._tokens.pop(task_id, None)
+        self._runners.pop(task_id, None)
+
+    async def cancel(self, task_id: str, reason: str = DEFAULT_REASON) -> bool:
+        """
+        Signal a running task to stop and release its resources.
+        Returns False when the task is not running in this process.
+        """
+        token = self._tokens.get(task_id)
+        if token is None:
+            return False
+        if not token.cancelled:
+            self.cancelled += 1
+            await token._cancel(reason)
+            runner = self._runners.get(task_id)
+            if runner is not None and not runner.done():
+                asyncio.get_running_loop().call_later(self.grace, self._interrupt, task_id, runner)
+        return True
+
+    def _interrupt(self, task_id: str, runner: asyncio.Task):
+        if not runner.done():
+            logger.warning(f"Task {task_id} did not stop within {self.grace}s of cancel - interrupting")
+            self.interrupted += 1
+            runner.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'running': len(self._tokens),
+            'cancelling': sum(1 for token in self._tokens.values() if token.cancelled),
+            'cancelled': self.cancelled,
+            'interrupted': self.interrupted,
+            'grace_seconds': self.grace
+        }
+
+
+async def release_browser_session(account_id: int):
+    """Close an account's Chrome session, in its browser worker and/or in this process"""
+    from services.browser_workers import browser_workers
+    from services.chrome_manager import chrome_manager
+
+    if browser_workers.enabled:
+        await browser_workers.close_session(account_id)
+    await chrome_manager.close_session(account_id)
+
+
+# Global cancellation registry
+task_cancellation = CancellationRegistry()
@@ -0,0 +1,178 @@
+"""
+Task Fan-out
+A parent task (Task.child_count set, no handler) stands for work split into
+independent child tasks - one per account - created together with it by
+crud.create_task_with_children. Children are ordinary scheduler tasks: they
+run in parallel within the lane limits, retry, cancel and resume on their
+own. Whenever a child stops running the parent's status, progress, item
+counts and result summary are recomputed from its children.
+"""
+
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, select, update
+
+from core.database import AsyncSessionLocal, Task
+from services.bulk_jobs import RESUMABLE_STATUSES, resume_task
+from services.task_cancellation import task_cancellation
+from services.task_progress import task_progress, TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'processing')
+CHILD_STATUSES = ('pending', 'processing', 'completed', 'failed', 'cancelled')
+
+
+def summarize(parent: Task, rows) -> Dict[str, Any]:
+    """
+    Parent columns from its children's (status, count, completed_items,
+    failed_items) rows. Running while any child is pending/processing; once
+    all stopped: failed if any child failed, else cancelled if any was
+    cancelled, else completed. A parent cancelled by the user stays cancelled.
+    """
+    children = {status: 0 for status in CHILD_STATUSES}
+    completed_items = failed_items = 0
+    for status, count, completed, failed in rows:
+        children[status] = children.get(status, 0) + count
+        completed_items += completed or 0
+        failed_items += failed or 0
+
+    active = sum(children[status] for status in ACTIVE_STATUSES)
+    stopped = sum(count for status, count in children.items() if status not in ACTIVE_STATUSES)
+    if parent.status == 'cancelled':
+        status = 'cancelled'
+    elif active:
+        status = 'processing' if children['processing'] or stopped else 'pending'
+    elif children['failed']:
+        status = 'failed'
+    elif children['cancelled']:
+        status = 'cancelled'
+    else:
+        status = 'completed'
+
+    if parent.total_items:
+        percent = int((completed_items + failed_items) * 100 / parent.total_items)
+    else:
+        percent = int(stopped * 100 / parent.child_count) if parent.child_count else 100
+    progress = 100 if status == 'completed' else min(percent, 99)
+
+    result: Dict[str, Any] = {
+        'children': {'total': parent.child_count, **children},
+        'items': {'total': parent.total_items, 'completed': completed_items, 'failed': failed_items}
+    }
+    if status in TERMINAL_STATUSES and not active:
+        result['success'] = status == 'completed' and failed_items == 0
+    return {
+        'status': status,
+        'progress': progress,
+        'completed_items': completed_items,
+        'failed_items': failed_items,
+        'result': result,
+        'error_message': f"{children['failed']} of {parent.child_count} child tasks failed"
+                         if children['failed'] and not active else None
+    }
+
+
+async def refresh_parent(parent_task_id: str, session_factory=None) -> Optional[Dict[str, Any]]:
+    """Recompute a parent from its children (call when a child changed status)"""
+    async with (session_factory or AsyncSessionLocal)() as db:
+        # Write-lock the parent row first so children finishing together are aggregated one after another
+        touched = await db.execute(
+            update(Task)
+            .where(Task.task_id == parent_task_id, Task.child_count.isnot(None))
+            .values(child_count=Task.child_count)
+            .execution_options(synchronize_session=False)
+        )
+        if not touched.rowcount:
+            return None
+        rows = await db.execute(
+            select(Task.status, func.count(), func.sum(Task.completed_items), func.sum(Task.failed_items))
+            .where(Task.parent_task_id == parent_task_id)
+            .group_by(Task.status)
+        )
+        parent = (await db.execute(select(Task).where(Task.task_id == parent_task_id))).scalar_one()
+        summary = summarize(parent, rows.all())
+
+        was_status = parent.status
+        parent.status = summary['status']
+        parent.progress = summary['progress']
+        parent.completed_items = summary['completed_items']
+        parent.failed_items = summary['failed_items']
+        parent.result = summary['result']
+        if summary['status'] != 'cancelled':
+            parent.error_message = summary['error_message']
+        if parent.status == 'processing' and not parent.started_at:
+            parent.started_at = datetime.now()
+        if 'success' in summary['result']:
+            parent.completed_at = parent.completed_at or datetime.now()
+        elif parent.status != 'cancelled':
+            parent.completed_at = None
+        await db.commit()
+
+    # Persisted above: only push the new state to subscribers
+    task_progress.update(
+        parent_task_id, progress=summary['progress'], status=summary['status'], result=summary['result'],
+        error_message=summary['error_message'], persist=False
+    )
+    if was_status != summary['status']:
+        logger.info(f"Parent task {parent_task_id}: {was_status} -> {summary['status']}")
+    return summary
+
+
+async def child_ids(db, parent_task_id: str, statuses=None) -> List[str]:
+    query = select(Task.task_id).where(Task.parent_task_id == parent_task_id)
+    if statuses:
+        query = query.where(Task.status.in_(statuses))
+    return list((await db.execute(query.order_by(Task.id))).scalars().all())
+
+
+async def cancel_children(db, parent_task_id: str, reason: str) -> Dict[str, int]:
+    """Cancel the pending/processing children of a parent and stop the ones running here"""
+    ids = await child_ids(db, parent_task_id, ACTIVE_STATUSES)
+    if ids:
+        await db.execute(
+            update(Task)
+            .where(Task.task_id.in_(ids), Task.status.in_(ACTIVE_STATUSES))
+            .values(status='cancelled', completed_at=datetime.now(), error_message=reason)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+    stopped = 0
+    for task_id in ids:
+        task_progress.update(task_id, status='cancelled', error_message=reason, persist=False)
+        stopped += await task_cancellation.cancel(task_id, reason)
+    await refresh_parent(parent_task_id)
+    return {'cancelled': len(ids), 'stopped_running': stopped}
+
+
+async def resume_children(db, parent_task_id: str, retry_failed: bool = True) -> Dict[str, int]:
+    """Resume the failed/cancelled children of a parent from their checkpoints"""
+    resumed = 0
+    for task_id in await child_ids(db, parent_task_id, RESUMABLE_STATUSES):
+        if await resume_task(db, task_id, retry_failed=retry_failed) is not None:
+            resumed += 1
+    if resumed:
+        await db.execute(
+            update(Task)
+            .where(Task.task_id == parent_task_id)
+            .values(status='pending', completed_at=None, error_message=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        task_progress.reset(parent_task_id)
+        await refresh_parent(parent_task_id)
+    return {'resumed': resumed}
+
+
+async def children_of(db, parent_task_ids: List[str]) -> Dict[str, List[Task]]:
+    """Children of several parents with one query (expanded listings)"""
+    grouped: Dict[str, List[Task]] = {task_id: [] for task_id in parent_task_ids}
+    if parent_task_ids:
+        rows = await db.execute(
+            select(Task).where(Task.parent_task_id.in_(parent_task_ids)).order_by(Task.id)
+        )
+        for child in rows.scalars().all():
+            grouped[child.parent_task_id].append(child)
+    return grouped
@@ -0,0 +1,272 @@
+"""
+Task Leases
+A task claimed by the scheduler carries the claiming worker's ID and a
+lease expiry (Task.worker_id / Task.lease_expires_at). The worker renews
+the leases of the tasks it runs every TASK_HEARTBEAT_INTERVAL seconds; a
+reaper (running in every worker) requeues processing tasks whose lease
+expired - the worker crashed or was restarted - or fails them once their
+retry budget is used up. On startup stale rows are reconciled so nothing
+stays "processing" forever. Fan-out parents are never claimed and hold no
+lease; the parents of reaped children are re-aggregated.
+"""
+
+import asyncio
+import os
+import socket
+import uuid
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, select, update
+
+from core.database import AsyncSessionLocal, Task
+from services.task_fanout import refresh_parent
+from services.task_progress import task_progress
+from services.task_retry import policy_for
+
+logger = logging.getLogger(__name__)
+
+# Unique per process unless set (a fixed ID lets a restarted worker reclaim its rows at once)
+TASK_WORKER_ID = os.getenv('TASK_WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+TASK_LEASE_SECONDS = float(os.getenv('TASK_LEASE_SECONDS', '60'))
+TASK_HEARTBEAT_INTERVAL = float(os.getenv('TASK_HEARTBEAT_INTERVAL', '20'))
+TASK_REAPER_INTERVAL = float(os.getenv('TASK_REAPER_INTERVAL', '30'))
+
+
+class LeaseManager:
+    """Leases of the tasks this worker runs, heartbeat and orphan reaper"""
+
+    def __init__(self, worker_id: str = TASK_WORKER_ID, lease_seconds: float = TASK_LEASE_SECONDS,
+                 heartbeat_interval: float = TASK_HEARTBEAT_INTERVAL, reaper_interval: float = TASK_REAPER_INTERVAL,
+                 session_factory=None):
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.reaper_interval = reaper_interval
+        self._session_factory = session_factory or AsyncSessionLocal
+        self.held: set = set()
+        # on_lost(task_id): a held task was taken away (reaped / cancelled elsewhere)
+        self.on_lost: Optional[Callable[[str], Any]] = None
+        # on_requeued(task_ids): reaped tasks are pending again
+        self.on_requeued: Optional[Callable[[List[str]], Any]] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self.heartbeats = 0
+        self.requeued = 0
+        self.failed = 0
+        self.lost = 0
+
+    def expiry(self) -> datetime:
+        return datetime.now() + timedelta(seconds=self.lease_seconds)
+
+    def claim_values(self) -> Dict[str, Any]:
+        """Columns set when this worker claims a task"""
+        return {'worker_id': self.worker_id, 'lease_expires_at': self.expiry()}
+
+    def hold(self, task_id: str):
+        self.held.add(task_id)
+
+    def release(self, task_id: str):
+        self.held.discard(task_id)
+
+    # ---------- heartbeat ----------
+
+    async def heartbeat(self) -> int:
+        """Renew the leases of held tasks; tasks no longer ours are reported to on_lost"""
+        if not self.held:
+            return 0
+        held = list(self.held)
+        async with self._session_factory() as db:
+            await db.execute(
+                update(Task)
+                .where(Task.task_id.in_(held), Task.worker_id == self.worker_id, Task.status == 'processing')
+                .values(lease_expires_at=self.expiry())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            rows = await db.execute(
+                select(Task.task_id)
+                .where(Task.task_id.in_(held), Task.worker_id == self.worker_id, Task.status == 'processing')
+            )
+            still_ours = set(rows.scalars().all())
+        self.heartbeats += 1
+
+        for task_id in held:
+            if task_id not in still_ours and task_id in self.held:
+                self.held.discard(task_id)
+                self.lost += 1
+                logger.warning(f"Task {task_id}: lease lost by worker {self.worker_id}")
+                if self.on_lost:
+                    await _maybe_await(self.on_lost(task_id))
+        return len(still_ours)
+
+    # ---------- reaper ----------
+
+    async def reap(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Requeue (or fail, when out of attempts) processing tasks whose lease expired"""
+        now = now or datetime.now()
+        expired = and_(Task.status == 'processing', Task.lease_expires_at < now)
+        requeued: List[str] = []
+        failed: List[str] = []
+
+        async with self._session_factory() as db:
+            rows = await db.execute(
+                select(Task.task_id, Task.task_type, Task.worker_id, Task.parent_task_id).where(expired)
+            )
+            by_type: Dict[str, List[str]] = {}
+            parents: set = set()
+            for task_id, task_type, worker_id, parent_task_id in rows.all():
+                if task_id in self.held and worker_id == self.worker_id:
+                    continue
+                by_type.setdefault(task_type, []).append(task_id)
+                if parent_task_id:
+                    parents.add(parent_task_id)
+
+            for task_type, task_ids in by_type.items():
+                max_attempts = policy_for(task_type).max_attempts
+                last_error = "Worker lease expired (worker crashed or restarted)"
+                common = dict(worker_id=None, lease_expires_at=None, attempts=func.coalesce(Task.attempts, 0) + 1,
+                              last_error=last_error, error_class='worker_lost')
+                # Requeue while the retry budget lasts
+                retry_ids = (await db.execute(
+                    select(Task.task_id).where(expired, Task.task_id.in_(task_ids),
+                                               func.coalesce(Task.attempts, 0) + 1 < max_attempts)
+                )).scalars().all()
+                if retry_ids:
+                    await db.execute(
+                        update(Task)
+                        .where(expired, Task.task_id.in_(retry_ids))
+                        .values(status='pending', progress=0, started_at=None, run_at=None,
+                                error_message="Requeued after worker lease expired", **common)
+                        .execution_options(synchronize_session=False)
+                    )
+                    requeued.extend(retry_ids)
+                fail_ids = [task_id for task_id in task_ids if task_id not in set(retry_ids)]
+                if fail_ids:
+                    await db.execute(
+                        update(Task)
+                        .where(expired, Task.task_id.in_(fail_ids))
+                        .values(status='failed', completed_at=now, error_message=last_error, **common)
+                        .execution_options(synchronize_session=False)
+                    )
+                    failed.extend(fail_ids)
+            await db.commit()
+
+        for task_id in requeued:
+            task_progress.reset(task_id)
+        for task_id in failed:
+            task_progress.update(task_id, status='failed', error_message="Worker lease expired", persist=False)
+        if requeued:
+            logger.warning(f"Requeued {len(requeued)} task(s) with expired leases")
+            if self.on_requeued:
+                await _maybe_await(self.on_requeued(requeued))
+        if failed:
+            logger.error(f"Failed {len(failed)} task(s) with expired leases and no attempts left")
+        for parent_task_id in parents:
+            await refresh_parent(parent_task_id, self._session_factory)
+        self.requeued += len(requeued)
+        self.failed += len(failed)
+        return {'requeued': len(requeued), 'failed': len(failed)}
+
+    async def reconcile(self) -> Dict[str, int]:
+        """
+        Startup: rows processing under this worker ID are orphans (nothing runs
+        yet), rows without a lease (claimed before leases existed, or run
+        outside the scheduler) get one lease period to be renewed, then reaped
+        """
+        now = datetime.now()
+        async with self._session_factory() as db:
+            await db.execute(
+                update(Task)
+                .where(Task.status == 'processing', Task.worker_id == self.worker_id)
+                .values(lease_expires_at=now - timedelta(seconds=1))
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                update(Task)
+                .where(Task.status == 'processing', Task.lease_expires_at.is_(None), Task.child_count.is_(None))
+                .values(lease_expires_at=self.expiry())
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return await self.reap(now)
+
+    async def expire_held(self):
+        """Shutdown: give up the leases of tasks this worker runs so they are requeued without waiting"""
+        if not self.held:
+            return
+        async with self._session_factory() as db:
+            await db.execute(
+                update(Task)
+                .where(Task.task_id.in_(list(self.held)), Task.worker_id == self.worker_id,
+                       Task.status == 'processing')
+                .values(lease_expires_at=datetime.now() - timedelta(seconds=1))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        self.held.clear()
+
+    # ---------- loop ----------
+
+    async def run(self):
+        last_reap = 0.0
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.heartbeat_interval)
+            try:
+                await self.heartbeat()
+                if loop.time() - last_reap >= self.reaper_interval:
+                    last_reap = loop.time()
+                    await self.reap()
+            except Exception as e:
+                logger.error(f"Task lease loop error: {e}")
+
+    def start(self):
+        """Start the heartbeat / reaper loop (idempotent)"""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        await self.expire_held()
+
+    async def stats(self) -> Dict[str, Any]:
+        async with self._session_factory() as db:
+            rows = await db.execute(
+                select(Task.worker_id, Task.lease_expires_at)
+                .where(Task.status == 'processing', Task.child_count.is_(None))
+            )
+            now = datetime.now()
+            workers: Dict[str, Dict[str, int]] = {}
+            for worker_id, lease_expires_at in rows.all():
+                entry = workers.setdefault(worker_id or 'unleased', {'processing': 0, 'expired': 0})
+                entry['processing'] += 1
+                if lease_expires_at and lease_expires_at < now:
+                    entry['expired'] += 1
+        return {
+            'worker_id': self.worker_id,
+            'held': len(self.held),
+            'lease_seconds': self.lease_seconds,
+            'heartbeat_interval': self.heartbeat_interval,
+            'reaper_interval': self.reaper_interval,
+            'heartbeats': self.heartbeats,
+            'requeued': self.requeued,
+            'failed': self.failed,
+            'lost': self.lost,
+            'workers': workers
+        }
+
+
+async def _maybe_await(value):
+    if asyncio.iscoroutine(value) or isinstance(value, asyncio.Future):
+        await value
+
+
+# Global lease manager of this worker
+task_leases = LeaseManager()
@@ -0,0 +1,200 @@
+"""
+Task Nodes
+Several processes / hosts can run tasks against the same database. Each
+node (identified by TASK_WORKER_ID) advertises itself in worker_nodes every
+TASK_NODE_HEARTBEAT_INTERVAL seconds: scheduler capacity, running tasks,
+browser sessions held and the task types it handles. The accounts whose
+browser session it holds are marked with Account.session_node_id so their
+tasks are claimed by that node (logged-in Chrome and proxy stay in one
+place); a task waits for its node at most TASK_AFFINITY_TIMEOUT seconds,
+and a node not seen for TASK_NODE_TTL seconds holds nothing.
+"""
+
+import asyncio
+import json
+import socket
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, exists, func, or_, select, update
+
+from core.database import AsyncSessionLocal, Account, Task, WorkerNode
+from services.task_leases import TASK_WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+TASK_NODE_HEARTBEAT_INTERVAL = float(os.getenv('TASK_NODE_HEARTBEAT_INTERVAL', '15'))
+# A node not seen for this long is considered gone (its sessions are not waited for)
+TASK_NODE_TTL = float(os.getenv('TASK_NODE_TTL', '60'))
+# Longest a task waits for the node holding its account's session before any node may run it
+TASK_AFFINITY_TIMEOUT = float(os.getenv('TASK_AFFINITY_TIMEOUT', '120'))
+
+
+def local_session_accounts() -> set:
+    """Accounts with a browser session in this process (Chrome manager and browser workers)"""
+    from services.browser_workers import browser_workers
+    from services.chrome_manager import chrome_manager
+
+    # Negative keys are sub account sessions (services.bulk_jobs.AccountActions)
+    return {key for key in set(chrome_manager.sessions) | set(browser_workers.assignments) if key > 0}
+
+
+class NodeRegistry:
+    """This node's advertisement and the session affinity used when claiming tasks"""
+
+    def __init__(self, node_id: str = TASK_WORKER_ID, heartbeat_interval: float = TASK_NODE_HEARTBEAT_INTERVAL,
+                 ttl: float = TASK_NODE_TTL, affinity_timeout: float = TASK_AFFINITY_TIMEOUT,
+                 session_factory=None):
+        self.node_id = node_id
+        self.heartbeat_interval = heartbeat_interval
+        self.ttl = ttl
+        self.affinity_timeout = affinity_timeout
+        self._session_factory = session_factory or AsyncSessionLocal
+        # load() -> {'capacity', 'running', 'task_types'}, set by the scheduler
+        self.load: Optional[Callable[[], Dict[str, Any]]] = None
+        self.session_accounts: Callable[[], set] = local_session_accounts
+        self.started_at = datetime.now()
+        self._loop_task: Optional[asyncio.Task] = None
+        self.heartbeats = 0
+
+    # ---------- claiming ----------
+
+    def claimable(self):
+        """
+        SQL condition on Task: its account's session is not held by another
+        live node, or it has waited longer than the affinity timeout
+        """
+        now = datetime.now()
+        live_elsewhere = select(WorkerNode.node_id).where(
+            WorkerNode.last_seen >= now - timedelta(seconds=self.ttl), WorkerNode.node_id != self.node_id
+        )
+        held_elsewhere = exists().where(
+            Account.id == Task.account_id, Account.session_node_id.in_(live_elsewhere)
+        )
+        waited = func.coalesce(Task.run_at, Task.created_at) < now - timedelta(seconds=self.affinity_timeout)
+        return or_(~held_elsewhere, waited)
+
+    # ---------- advertisement ----------
+
+    async def heartbeat(self) -> Dict[str, Any]:
+        """Write this node's row and the session ownership of its accounts"""
+        load = self.load() if self.load else {}
+        accounts = self.session_accounts()
+        values = {
+            'hostname': socket.gethostname(),
+            'capacity': load.get('capacity', 0),
+            'running': load.get('running', 0),
+            'sessions': len(accounts),
+            'task_types': json.dumps(sorted(load.get('task_types', []))),
+            'last_seen': datetime.now()
+        }
+        async with self._session_factory() as db:
+            updated = await db.execute(
+                update(WorkerNode).where(WorkerNode.node_id == self.node_id).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            if not updated.rowcount:
+                db.add(WorkerNode(node_id=self.node_id, started_at=self.started_at, **values))
+            # Sessions closed here are released, new ones claimed (updated_at is kept: not an account edit)
+            await db.execute(
+                update(Account)
+                .where(Account.session_node_id == self.node_id, Account.id.notin_(accounts))
+                .values(session_node_id=None, updated_at=Account.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            if accounts:
+                await db.execute(
+                    update(Account)
+                    .where(Account.id.in_(accounts), or_(Account.session_node_id.is_(None),
+                                                         Account.session_node_id != self.node_id))
+                    .values(session_node_id=self.node_id, updated_at=Account.updated_at)
+                    .execution_options(synchronize_session=False)
+                )
+            # Nodes gone for good (crashed without leaving) are forgotten
+            gone = select(WorkerNode.node_id).where(
+                WorkerNode.last_seen < datetime.now() - timedelta(seconds=self.ttl * 10)
+            )
+            await db.execute(
+                update(Account).where(Account.session_node_id.in_(gone))
+                .values(session_node_id=None, updated_at=Account.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(
+                delete(WorkerNode).where(WorkerNode.last_seen < datetime.now() - timedelta(seconds=self.ttl * 10))
+            )
+            await db.commit()
+        self.heartbeats += 1
+        return values
+
+    async def leave(self):
+        """Shutdown: drop this node's row and release its accounts at once"""
+        async with self._session_factory() as db:
+            await db.execute(
+                update(Account).where(Account.session_node_id == self.node_id)
+                .values(session_node_id=None, updated_at=Account.updated_at)
+                .execution_options(synchronize_session=False)
+            )
+            await db.execute(delete(WorkerNode).where(WorkerNode.node_id == self.node_id))
+            await db.commit()
+
+    async def nodes(self) -> List[Dict[str, Any]]:
+        """Registered nodes with their advertised capacity"""
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        async with self._session_factory() as db:
+            rows = await db.execute(select(WorkerNode).order_by(WorkerNode.node_id))
+            return [
+                {
+                    'node_id': node.node_id,
+                    'hostname': node.hostname,
+                    'alive': bool(node.last_seen and node.last_seen >= cutoff),
+                    'capacity': node.capacity or 0,
+                    'running': node.running or 0,
+                    'free': max((node.capacity or 0) - (node.running or 0), 0),
+                    'sessions': node.sessions or 0,
+                    'task_types': json.loads(node.task_types) if node.task_types else [],
+                    'started_at': node.started_at.isoformat() if node.started_at else None,
+                    'last_seen': node.last_seen.isoformat() if node.last_seen else None,
+                    'self': node.node_id == self.node_id
+                }
+                for node in rows.scalars().all()
+            ]
+
+    # ---------- loop ----------
+
+    async def run(self):
+        while True:
+            try:
+                await self.heartbeat()
+            except Exception as e:
+                logger.error(f"Task node heartbeat error: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+    def start(self):
+        """Start advertising this node (idempotent)"""
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        await self.leave()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'node_id': self.node_id,
+            'heartbeat_interval': self.heartbeat_interval,
+            'ttl': self.ttl,
+            'affinity_timeout': self.affinity_timeout,
+            'heartbeats': self.heartbeats
+        }
+
+
+# Global registry entry of this node
+task_nodes = NodeRegistry()
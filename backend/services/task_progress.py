@@ -0,0 +1,325 @@
+"""
+Task Progress Registry
+In-memory state of running tasks. Progress steps only touch memory and are
+pushed to subscribers (WebSocket /api/task/ws, SSE /api/task/events); the
+database is written by a write-behind flush at most every
+TASK_PROGRESS_FLUSH_INTERVAL seconds, and immediately when a task finishes.
+"""
+
+import asyncio
+import os
+import time
+import logging
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, bindparam, func, update
+
+from core.database import AsyncSessionLocal, Task
+from core.task_codec import PAYLOAD_VERSION, encode_payload, indexed_fields
+from services.task_cancellation import task_cancellation
+
+logger = logging.getLogger(__name__)
+
+TASK_PROGRESS_FLUSH_INTERVAL = float(os.getenv('TASK_PROGRESS_FLUSH_INTERVAL', '2'))
+# States stay in memory this long after their last update so late readers / reconnecting clients see them
+TASK_PROGRESS_RETENTION = float(os.getenv('TASK_PROGRESS_RETENTION', '300'))
+# Events buffered per subscriber before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv('TASK_PROGRESS_QUEUE_SIZE', '500'))
+
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+class TaskState:
+    """Latest known state of one task"""
+
+    def __init__(self, task_id: str, account_id: Optional[int] = None, task_type: Optional[str] = None,
+                 status: str = 'pending', progress: int = 0):
+        self.task_id = task_id
+        self.account_id = account_id
+        self.task_type = task_type
+        self.status = status
+        self.progress = progress
+        self.message: Optional[str] = None
+        self.result: Any = None
+        self.error_message: Optional[str] = None
+        self.started_at: Optional[datetime] = None
+        self.completed_at: Optional[datetime] = None
+        self.updated_at = time.time()
+        self.version = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.status in TERMINAL_STATUSES
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'task_id': self.task_id,
+            'account_id': self.account_id,
+            'task_type': self.task_type,
+            'status': self.status,
+            'progress': self.progress,
+            'message': self.message,
+            'result': self.result,
+            'error_message': self.error_message,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
+            'version': self.version
+        }
+
+
+class TaskProgressRegistry:
+    """Task states, change subscribers and the write-behind flush"""
+
+    def __init__(self, flush_interval: float = TASK_PROGRESS_FLUSH_INTERVAL,
+                 retention: float = TASK_PROGRESS_RETENTION, session_factory=None):
+        self.flush_interval = flush_interval
+        self.retention = retention
+        self._session_factory = session_factory or AsyncSessionLocal
+        self._states: Dict[str, TaskState] = {}
+        self._dirty: set = set()
+        self._subscribers: Dict[asyncio.Queue, Optional[set]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self.updates = 0
+        self.flushes = 0
+        self.rows_written = 0
+        self.events_dropped = 0
+
+    # ---------- state ----------
+
+    def track(self, task_id: str, account_id: Optional[int] = None, task_type: Optional[str] = None,
+              status: str = 'pending', progress: int = 0) -> TaskState:
+        """Register a task (e.g. right after its row was created)"""
+        state = self._states.get(task_id)
+        if state is None:
+            state = TaskState(task_id, account_id, task_type, status, progress)
+            self._states[task_id] = state
+        return state
+
+    def update(self, task_id: str, progress: Optional[int] = None, status: Optional[str] = None,
+               message: Optional[str] = None, persist: bool = True, **fields) -> Dict[str, Any]:
+        """
+        Record a progress step in memory and push it to subscribers.
+        Written to the database by the next flush (persist=False when the
+        caller has just committed the same values itself).
+        """
+        state = self._states.get(task_id) or self.track(task_id)
+        if progress is not None:
+            state.progress = min(100, max(0, int(progress)))
+        if status is not None:
+            state.status = status
+            if status == 'processing' and not state.started_at:
+                state.started_at = datetime.now()
+            if status in TERMINAL_STATUSES and not state.completed_at:
+                state.completed_at = datetime.now()
+        if message is not None:
+            state.message = message
+        for name in ('account_id', 'task_type', 'result', 'error_message'):
+            if fields.get(name) is not None:
+                setattr(state, name, fields[name])
+
+        state.updated_at = time.time()
+        state.version += 1
+        self.updates += 1
+        if persist:
+            self._dirty.add(task_id)
+        event = state.to_dict()
+        self._publish(event)
+        return event
+
+    async def finish(self, task_id: str, status: str = 'completed', result: Any = None,
+                     error_message: Optional[str] = None, persist: bool = True) -> Dict[str, Any]:
+        """
+        Mark a task finished. persist=False when the caller already committed
+        the final row itself (only subscribers are notified).
+        """
+        event = self.update(
+            task_id, status=status, progress=100 if status == 'completed' else None,
+            result=result, error_message=error_message, persist=persist
+        )
+        if persist:
+            await self.flush([task_id])
+        else:
+            self._dirty.discard(task_id)
+        return event
+
+    def reset(self, task_id: str, status: str = 'pending') -> Dict[str, Any]:
+        """Start a task's state over (retry) and notify subscribers"""
+        previous = self._states.pop(task_id, None)
+        self._dirty.discard(task_id)
+        state = self.track(
+            task_id, previous.account_id if previous else None, previous.task_type if previous else None, status
+        )
+        state.version = previous.version + 1 if previous else 0
+        event = state.to_dict()
+        self._publish(event)
+        return event
+
+    def forget(self, task_id: str):
+        """Drop a task's state without writing it (the task was taken over elsewhere)"""
+        self._states.pop(task_id, None)
+        self._dirty.discard(task_id)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        state = self._states.get(task_id)
+        return state.to_dict() if state else None
+
+    def snapshot(self, task_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Known states for the given IDs (unknown IDs are left out)"""
+        return {task_id: self._states[task_id].to_dict() for task_id in task_ids if task_id in self._states}
+
+    def active(self) -> List[Dict[str, Any]]:
+        return [state.to_dict() for state in self._states.values() if not state.finished]
+
+    # ---------- push ----------
+
+    def subscribe(self, task_ids: Optional[Iterable[str]] = None) -> asyncio.Queue:
+        """Queue receiving state events (all tasks, or only `task_ids`)"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[queue] = set(task_ids) if task_ids else None
+        return queue
+
+    def resubscribe(self, queue: asyncio.Queue, task_ids: Optional[Iterable[str]] = None):
+        """Change which tasks an existing subscriber receives"""
+        if queue in self._subscribers:
+            self._subscribers[queue] = set(task_ids) if task_ids else None
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.pop(queue, None)
+
+    def _publish(self, event: Dict[str, Any]):
+        for queue, task_ids in list(self._subscribers.items()):
+            if task_ids is not None and event['task_id'] not in task_ids:
+                continue
+            if queue.full():
+                # Slow client: drop its oldest event rather than block the task
+                queue.get_nowait()
+                self.events_dropped += 1
+            queue.put_nowait(event)
+
+    # ---------- write-behind ----------
+
+    async def flush(self, task_ids: Optional[Iterable[str]] = None) -> int:
+        """Write dirty states to the database; returns rows written"""
+        if task_ids is None:
+            pending = list(self._dirty)
+        else:
+            pending = [task_id for task_id in task_ids if task_id in self._dirty]
+        if not pending:
+            return 0
+        self._dirty.difference_update(pending)
+
+        states = [self._states[task_id] for task_id in pending if task_id in self._states]
+        running = [state for state in states if not state.finished]
+        finished = [state for state in states if state.finished]
+
+        # Imported here: task_leases imports this module
+        from services.task_leases import task_leases
+
+        try:
+            async with self._session_factory() as db:
+                if running:
+                    # Only rows this worker holds: a row finished, cancelled or requeued
+                    # (reaped by another node) is never moved back to running
+                    await db.execute(
+                        update(Task.__table__)
+                        .where(and_(
+                            Task.__table__.c.task_id == bindparam('key'),
+                            Task.__table__.c.status == 'processing',
+                            Task.__table__.c.worker_id == task_leases.worker_id
+                        ))
+                        .values(
+                            status=bindparam('new_status'),
+                            progress=bindparam('new_progress'),
+                            started_at=func.coalesce(Task.__table__.c.started_at, bindparam('started'))
+                        ),
+                        [
+                            {'key': s.task_id, 'new_status': s.status, 'new_progress': s.progress, 'started': s.started_at}
+                            for s in running
+                        ]
+                    )
+                for state in finished:
+                    values = {
+                        'status': state.status,
+                        'progress': state.progress,
+                        'completed_at': state.completed_at
+                    }
+                    if state.error_message:
+                        values['error_message'] = state.error_message
+                    if state.result is not None:
+                        values['result'] = encode_payload(state.result)
+                        values['payload_version'] = PAYLOAD_VERSION
+                        fields = indexed_fields(None, state.result)
+                        values['result_status'] = fields['result_status']
+                        values['result_success'] = fields['result_success']
+                    await db.execute(
+                        update(Task.__table__).where(Task.__table__.c.task_id == state.task_id).values(**values)
+                    )
+                await db.commit()
+        except Exception as e:
+            # Keep the states dirty so the next flush retries them
+            self._dirty.update(state.task_id for state in states)
+            logger.error(f"Task progress flush failed: {e}")
+            return 0
+
+        self.flushes += 1
+        self.rows_written += len(states)
+        return len(states)
+
+    def prune(self) -> int:
+        """
+        Forget states not updated within the retention period: finished tasks,
+        and unfinished ones no longer running here (run by another node,
+        requeued, or abandoned by a handler)
+        """
+        cutoff = time.time() - self.retention
+        expired = [
+            task_id for task_id, state in self._states.items()
+            if state.updated_at < cutoff and task_id not in self._dirty
+            and (state.finished or task_cancellation.get(task_id) is None)
+        ]
+        for task_id in expired:
+            del self._states[task_id]
+        return len(expired)
+
+    async def run_flusher(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                self.prune()
+            except Exception as e:
+                logger.error(f"Task progress flusher error: {e}")
+
+    def start(self):
+        """Start the background flush loop (idempotent)"""
+        if self.flush_interval > 0 and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.run_flusher())
+
+    async def stop(self):
+        """Stop the flush loop and write what is left"""
+        if self._flush_task:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'tracked': len(self._states),
+            'active': sum(1 for state in self._states.values() if not state.finished),
+            'dirty': len(self._dirty),
+            'subscribers': len(self._subscribers),
+            'updates': self.updates,
+            'flushes': self.flushes,
+            'rows_written': self.rows_written,
+            'events_dropped': self.events_dropped,
+            'flush_interval': self.flush_interval
+        }
+
+
+# Global task progress registry
+task_progress = TaskProgressRegistry()
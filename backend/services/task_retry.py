@@ -0,0 +1,217 @@
+"""
+Task Retry Policies
+Failed scheduler tasks are retried according to a policy per task_type:
+max attempts, exponential backoff with jitter and the error classes worth
+retrying (proxy, timeout, network, browser). A retry puts the task back to
+pending with a run_at in the future (delayed job); a task that runs out of
+attempts or fails with a non-retryable error stays failed - the
+dead-letter view lists those with their attempts and last error.
+
+When an error class keeps failing across tasks (e.g. the proxy pool is
+down) its backoff grows for every task, not just per attempt, so retries
+never hot-loop through the browsers. Streaks are kept per (task_type, error
+class): a success halves only the streaks of its own task type, so one
+healthy task type does not wipe the backoff of the others.
+"""
+
+import json
+import os
+import random
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import select, update
+
+from core.database import AsyncSessionLocal, Task
+from services.task_progress import task_progress
+
+logger = logging.getLogger(__name__)
+
+TASK_RETRY_MAX_ATTEMPTS = int(os.getenv('TASK_RETRY_MAX_ATTEMPTS', '3'))
+TASK_RETRY_BASE_DELAY = float(os.getenv('TASK_RETRY_BASE_DELAY', '30'))
+TASK_RETRY_MAX_DELAY = float(os.getenv('TASK_RETRY_MAX_DELAY', '1800'))
+# Consecutive failures of one error class (any task) that double its backoff once more
+TASK_RETRY_STREAK_STEP = int(os.getenv('TASK_RETRY_STREAK_STEP', '10'))
+
+# Error classes and what identifies them (exception type names, message fragments)
+ERROR_CLASSES = {
+    'proxy': ((), ('proxy', 'err_tunnel', 'err_socks')),
+    'timeout': (('TimeoutError', 'TimeoutException', 'ReadTimeout', 'ConnectTimeout'), ('timed out', 'timeout')),
+    'network': (('ConnectionError', 'ConnectionResetError', 'ConnectionRefusedError', 'ClientConnectorError'),
+                ('err_connection', 'err_name_not_resolved', 'err_internet_disconnected', 'connection reset')),
+    'browser': (('WebDriverException', 'WorkerCrashed', 'SessionNotFound', 'NoSuchWindowException',
+                 'InvalidSessionIdException'), ('chrome not reachable', 'session deleted', 'disconnected')),
+    'auth': ((), ('checkpoint', 'login failed', 'đăng nhập thất bại')),
+}
+RETRYABLE_DEFAULT = ('proxy', 'timeout', 'network', 'browser')
+
+
+def classify_error(error: BaseException) -> str:
+    """Error class of an exception ('unknown' when nothing matches)"""
+    names = {cls.__name__ for cls in type(error).__mro__}
+    message = str(error).lower()
+    for error_class, (type_names, fragments) in ERROR_CLASSES.items():
+        if names.intersection(type_names) or any(fragment in message for fragment in fragments):
+            return error_class
+    return 'unknown'
+
+
+class RetryPolicy:
+    """How a task_type is retried"""
+
+    def __init__(self, max_attempts: int = TASK_RETRY_MAX_ATTEMPTS, base_delay: float = TASK_RETRY_BASE_DELAY,
+                 max_delay: float = TASK_RETRY_MAX_DELAY, multiplier: float = 2.0, jitter: float = 0.5,
+                 retryable: Iterable[str] = RETRYABLE_DEFAULT):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.retryable = tuple(retryable)
+
+    def should_retry(self, attempts: int, error_class: str) -> bool:
+        return attempts < self.max_attempts and error_class in self.retryable
+
+    def delay(self, attempts: int, streak_level: int = 0) -> float:
+        """Backoff before the next attempt; the last `jitter` fraction is random so retries spread out"""
+        exponent = max(attempts - 1, 0) + streak_level
+        delay = min(self.base_delay * self.multiplier ** exponent, self.max_delay)
+        return delay * (1 - self.jitter * random.random())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'max_attempts': self.max_attempts,
+            'base_delay': self.base_delay,
+            'max_delay': self.max_delay,
+            'multiplier': self.multiplier,
+            'jitter': self.jitter,
+            'retryable': list(self.retryable)
+        }
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+# Per task_type policies; TASK_RETRY_POLICIES (JSON) overrides fields, e.g.
+# {"check_account": {"max_attempts": 5}, "send_message": {"retryable": ["proxy", "network"]}}
+RETRY_POLICIES: Dict[str, RetryPolicy] = {
+    # Quick interactive check: retry soon, give up early
+    'check_account': RetryPolicy(max_attempts=3, base_delay=15, max_delay=300),
+    # Messages must not be sent twice: only retry failures before the page was reached
+    # (a network or browser error may come after the message went out)
+    'send_message': RetryPolicy(max_attempts=5, base_delay=60, retryable=('proxy',)),
+    'sub_account_interact': RetryPolicy(max_attempts=3, base_delay=120),
+}
+
+
+def _load_overrides(raw: str):
+    try:
+        overrides = json.loads(raw) if raw else {}
+    except ValueError:
+        logger.warning("TASK_RETRY_POLICIES is not valid JSON - ignored")
+        return
+    for task_type, fields in overrides.items():
+        base = RETRY_POLICIES.get(task_type, DEFAULT_POLICY).to_dict()
+        base.update(fields or {})
+        RETRY_POLICIES[task_type] = RetryPolicy(**base)
+
+
+_load_overrides(os.getenv('TASK_RETRY_POLICIES', ''))
+
+
+def policy_for(task_type: str) -> RetryPolicy:
+    return RETRY_POLICIES.get(task_type, DEFAULT_POLICY)
+
+
+class RetryEngine:
+    """Decides retry or failed for scheduler tasks and tracks failure streaks"""
+
+    def __init__(self, streak_step: int = TASK_RETRY_STREAK_STEP, session_factory=None):
+        self.streak_step = max(streak_step, 1)
+        self._session_factory = session_factory or AsyncSessionLocal
+        # (task_type, error_class) -> consecutive failures
+        self._streaks: Dict[Tuple[str, str], int] = {}
+        self.retried = 0
+        self.dead_lettered = 0
+
+    def record_success(self, task_type: str):
+        """A task of this type succeeded: decay its streaks (halved, dropped at zero)"""
+        for key in [key for key in self._streaks if key[0] == task_type]:
+            self._streaks[key] //= 2
+            if not self._streaks[key]:
+                del self._streaks[key]
+
+    def streak_level(self, error_class: str) -> int:
+        """Backoff doublings of an error class: its failures summed over the task types"""
+        failures = sum(count for (_, streak_class), count in self._streaks.items() if streak_class == error_class)
+        return failures // self.streak_step
+
+    async def handle_failure(self, task_id: str, task_type: str, error: BaseException) -> Optional[datetime]:
+        """
+        Schedule the next attempt of a failed task, or mark it failed for good.
+        Returns the retry time (None when the task is dead-lettered).
+        """
+        policy = policy_for(task_type)
+        error_class = classify_error(error)
+        self._streaks[(task_type, error_class)] = self._streaks.get((task_type, error_class), 0) + 1
+        last_error = f"{type(error).__name__}: {error}"[:2000]
+
+        async with self._session_factory() as db:
+            task = (await db.execute(select(Task).where(Task.task_id == task_id))).scalar_one_or_none()
+            if task is None or task.status != 'processing':
+                # Cancelled (or finished) meanwhile
+                return None
+            attempts = (task.attempts or 0) + 1
+            values = {'attempts': attempts, 'last_error': last_error, 'error_class': error_class}
+
+            if policy.should_retry(attempts, error_class):
+                delay = policy.delay(attempts, self.streak_level(error_class))
+                run_at = datetime.now() + timedelta(seconds=delay)
+                result = await db.execute(
+                    update(Task)
+                    .where(Task.task_id == task_id, Task.status == 'processing')
+                    .values(status='pending', run_at=run_at, progress=0, started_at=None,
+                            worker_id=None, lease_expires_at=None,
+                            error_message=f"Attempt {attempts}/{policy.max_attempts} failed ({error_class}), "
+                                          f"retrying in {int(delay)}s",
+                            **values)
+                    .execution_options(synchronize_session=False)
+                )
+                await db.commit()
+                if not result.rowcount:
+                    return None
+                self.retried += 1
+                logger.info(f"Task {task_id} attempt {attempts} failed ({error_class}), retry in {delay:.0f}s")
+                task_progress.reset(task_id)
+                task_progress.update(task_id, message=f"Retry {attempts + 1}/{policy.max_attempts} at {run_at:%H:%M:%S}",
+                                     persist=False)
+                # Imported here: delayed_jobs imports the scheduler, which imports this module
+                from services.delayed_jobs import delayed_jobs
+                delayed_jobs.schedule(task_id, run_at)
+                return run_at
+
+            await db.execute(
+                update(Task).where(Task.task_id == task_id)
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+
+        self.dead_lettered += 1
+        logger.error(f"Task {task_id} ({task_type}) failed after {attempts} attempt(s): {last_error}")
+        await task_progress.finish(task_id, 'failed', error_message=str(error))
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'retried': self.retried,
+            'dead_lettered': self.dead_lettered,
+            'failure_streaks': {f"{task_type}:{error_class}": count
+                                for (task_type, error_class), count in self._streaks.items()},
+            'default_policy': DEFAULT_POLICY.to_dict(),
+            'policies': {task_type: policy.to_dict() for task_type, policy in RETRY_POLICIES.items()}
+        }
+
+
+# Global retry engine
+task_retry = RetryEngine()
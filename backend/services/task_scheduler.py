@@ -0,0 +1,369 @@
+"""
+Task Scheduler
+Runs pending Task rows through handlers registered per task_type, in three
+priority lanes: interactive (UI "check now"), normal and bulk. Free slots
+are shared between lanes by smooth weighted round robin, and
+TASK_INTERACTIVE_RESERVED slots can only be used by the interactive lane so
+a single-account check never waits behind a 10k-item bulk job.
+
+Running tasks can be stopped through services.task_cancellation; a handler
+that ends with TaskCancelled (or is interrupted) is recorded as cancelled
+with its partial result. A handler that raises goes through its task
+type's retry policy (services.task_retry). Claimed tasks are leased to this
+worker and kept alive by services.task_leases. When a child task of a
+fan-out stops running its parent is re-aggregated (services.task_fanout).
+
+Claiming is safe with several nodes on one database: PostgreSQL locks the
+claimed row with FOR UPDATE SKIP LOCKED, SQLite claims with a single
+UPDATE ... RETURNING, and a task whose account has a browser session on
+another live node is left to that node (services.task_nodes).
+"""
+
+import asyncio
+import os
+import logging
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import and_, func, or_, select, update
+
+from core.database import AsyncSessionLocal, Task
+from core.task_codec import decode_dict
+from services.task_cancellation import TaskCancelled, task_cancellation
+from services.task_fanout import refresh_parent
+from services.task_leases import task_leases
+from services.task_nodes import task_nodes
+from services.task_progress import task_progress
+from services.task_retry import task_retry
+
+logger = logging.getLogger(__name__)
+
+LANES = ('interactive', 'normal', 'bulk')
+DEFAULT_LANE = 'normal'
+
+
+def _parse_weights(raw: str) -> Dict[str, int]:
+    """'interactive:6,normal:3,bulk:1' -> {lane: weight}"""
+    weights = {'interactive': 6, 'normal': 3, 'bulk': 1}
+    for part in raw.split(','):
+        lane, _, weight = part.partition(':')
+        if lane.strip() in LANES and weight.strip().isdigit():
+            weights[lane.strip()] = max(int(weight), 1)
+    return weights
+
+
+TASK_WORKERS = int(os.getenv('TASK_WORKERS', '4'))
+# Slots only the interactive lane may use
+TASK_INTERACTIVE_RESERVED = int(os.getenv('TASK_INTERACTIVE_RESERVED', '1'))
+TASK_LANE_WEIGHTS = _parse_weights(os.getenv('TASK_LANE_WEIGHTS', 'interactive:6,normal:3,bulk:1'))
+# A task whose largest list param has at least this many items defaults to the bulk lane
+TASK_BULK_THRESHOLD = int(os.getenv('TASK_BULK_THRESHOLD', '100'))
+# Fallback poll for tasks created by other processes (new tasks in this process wake the scheduler)
+TASK_POLL_INTERVAL = float(os.getenv('TASK_POLL_INTERVAL', '2'))
+
+# handler(task_id, account_id, params) runs the task and writes its final status
+TaskHandler = Callable[[str, int, Dict[str, Any]], Awaitable[Any]]
+
+
+def priority_for(task_type: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Default lane of a new task: bulk for large list params, else normal"""
+    params = params or {}
+    sizes = [len(value) for value in params.values() if isinstance(value, (list, tuple))]
+    if sizes and max(sizes) >= TASK_BULK_THRESHOLD:
+        return 'bulk'
+    return DEFAULT_LANE
+
+
+class WeightedLanePicker:
+    """Smooth weighted round robin (nginx) over the lanes that have work"""
+
+    def __init__(self, weights: Dict[str, int]):
+        self.weights = weights
+        self._current = {lane: 0 for lane in weights}
+
+    def pick(self, lanes: List[str]) -> Optional[str]:
+        if not lanes:
+            return None
+        total = sum(self.weights[lane] for lane in lanes)
+        for lane in lanes:
+            self._current[lane] += self.weights[lane]
+        chosen = max(lanes, key=lambda lane: self._current[lane])
+        self._current[chosen] -= total
+        return chosen
+
+
+class TaskScheduler:
+    """Claims pending tasks lane by lane and runs them with bounded concurrency"""
+
+    def __init__(self, workers: int = TASK_WORKERS, interactive_reserved: int = TASK_INTERACTIVE_RESERVED,
+                 weights: Dict[str, int] = None, poll_interval: float = TASK_POLL_INTERVAL,
+                 session_factory=None):
+        self.workers = workers
+        self.interactive_reserved = min(interactive_reserved, max(workers - 1, 0))
+        self.picker = WeightedLanePicker(weights or TASK_LANE_WEIGHTS)
+        self.poll_interval = poll_interval
+        self._session_factory = session_factory or AsyncSessionLocal
+        self.handlers: Dict[str, TaskHandler] = {}
+        self.running: Dict[str, asyncio.Task] = {}
+        self._running_lanes: Dict[str, str] = {}
+        # Tasks whose lease was taken over (requeued by a reaper): their outcome is not recorded here
+        self._lost: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self.dispatched = {lane: 0 for lane in LANES}
+
+    @property
+    def enabled(self) -> bool:
+        return self.workers > 0
+
+    def register(self, task_type: str, handler: TaskHandler):
+        """Run tasks of `task_type` with `handler`"""
+        self.handlers[task_type] = handler
+
+    def notify(self):
+        """Wake the scheduler (a task was created)"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    # ---------- capacity ----------
+
+    def _running_in(self, lane: str) -> int:
+        return sum(1 for running_lane in self._running_lanes.values() if running_lane == lane)
+
+    def _lanes_with_capacity(self) -> List[str]:
+        if len(self.running) >= self.workers:
+            return []
+        shared = self.workers - self.interactive_reserved
+        non_interactive = len(self.running) - self._running_in('interactive')
+        return [lane for lane in LANES if lane == 'interactive' or non_interactive < shared]
+
+    # ---------- claiming ----------
+
+    def _runnable(self):
+        """Pending tasks of a registered type that are due (run_at unset or past)"""
+        return and_(
+            Task.status == 'pending',
+            Task.task_type.in_(list(self.handlers)),
+            Task.child_count.is_(None),
+            or_(Task.run_at.is_(None), Task.run_at <= datetime.now()),
+            task_nodes.claimable()
+        )
+
+    async def _pending_lanes(self, db) -> List[str]:
+        """Lanes that have runnable tasks"""
+        rows = await db.execute(
+            select(Task.priority).where(self._runnable()).group_by(Task.priority)
+        )
+        return [lane for (lane,) in rows.all() if lane in LANES]
+
+    async def _claim(self, db, lane: str):
+        """
+        Oldest pending task of a lane, marked processing and leased to this
+        node (None when the lane is drained or another claimer won)
+        """
+        oldest = select(Task).where(self._runnable(), Task.priority == lane).order_by(Task.created_at).limit(1)
+        values = dict(status='processing', started_at=func.coalesce(Task.started_at, datetime.now()),
+                      **task_leases.claim_values())
+        dialect = db.bind.dialect.name
+
+        if dialect == 'postgresql':
+            # Concurrent claimers skip the row locked here instead of racing for it
+            row = (await db.execute(oldest.with_for_update(skip_locked=True))).scalar_one_or_none()
+            if row is None:
+                await db.commit()
+                return None
+            await db.execute(
+                update(Task).where(Task.id == row.id).values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+            return row
+
+        if dialect == 'sqlite':
+            # Pick and mark in one statement: the write lock makes it atomic across processes
+            claimed = (await db.execute(
+                update(Task)
+                .where(Task.id == oldest.with_only_columns(Task.id).correlate(None).scalar_subquery(),
+                       Task.status == 'pending')
+                .values(**values)
+                .returning(Task.id, Task.task_id, Task.account_id, Task.task_type, Task.params, Task.payload_version,
+                           Task.parent_task_id)
+                .execution_options(synchronize_session=False)
+            )).first()
+            await db.commit()
+            return claimed
+
+        row = (await db.execute(oldest)).scalar_one_or_none()
+        if row is None:
+            return None
+        claimed = await db.execute(
+            update(Task)
+            .where(Task.id == row.id, Task.status == 'pending')
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+        return row if claimed.rowcount else None
+
+    async def dispatch(self) -> int:
+        """Fill free slots; returns the number of tasks started"""
+        if not self.handlers:
+            return 0
+        started = 0
+        async with self._session_factory() as db:
+            pending = await self._pending_lanes(db)
+            while True:
+                allowed = self._lanes_with_capacity()
+                lane = self.picker.pick([lane for lane in allowed if lane in pending])
+                if lane is None:
+                    break
+                task = await self._claim(db, lane)
+                if task is None:
+                    # Lane drained (or raced) - re-check what is still pending
+                    pending = await self._pending_lanes(db)
+                    continue
+                self._start(task.task_id, task.account_id, task.task_type, lane,
+                            decode_dict(task.params, task.payload_version), task.parent_task_id)
+                started += 1
+        return started
+
+    # ---------- running ----------
+
+    def _start(self, task_id: str, account_id: int, task_type: str, lane: str, params: Dict[str, Any],
+               parent_task_id: Optional[str] = None):
+        task_progress.track(task_id, account_id, task_type)
+        task_progress.update(task_id, status='processing', persist=False)
+        self.dispatched[lane] += 1
+        self._running_lanes[task_id] = lane
+        task_cancellation.register(task_id, account_id)
+        task_leases.hold(task_id)
+        self.running[task_id] = asyncio.create_task(
+            self._run(task_id, account_id, task_type, params, parent_task_id)
+        )
+        task_cancellation.attach(task_id, self.running[task_id])
+
+    async def _run(self, task_id: str, account_id: int, task_type: str, params: Dict[str, Any],
+                   parent_task_id: Optional[str] = None):
+        token = task_cancellation.get(task_id)
+        if parent_task_id:
+            await self._refresh_parent(task_id, parent_task_id)
+        try:
+            await self.handlers[task_type](task_id, account_id, params)
+            if task_id not in self._lost:
+                await self._finish_unrecorded(task_id)
+            task_retry.record_success(task_type)
+        except (TaskCancelled, asyncio.CancelledError):
+            if not token.cancelled:
+                raise
+            if task_id not in self._lost:
+                await self._record_cancelled(task_id, token)
+        except Exception as e:
+            if task_id in self._lost:
+                logger.info(f"Task {task_id} stopped after losing its lease: {e}")
+            elif token.cancelled:
+                # Errors from the session closed under the handler are part of the cancel
+                await self._record_cancelled(task_id, token)
+            else:
+                logger.error(f"Task {task_id} ({task_type}) failed: {e}")
+                await task_retry.handle_failure(task_id, task_type, e)
+        finally:
+            task_cancellation.release(task_id)
+            task_leases.release(task_id)
+            self._lost.discard(task_id)
+            self.running.pop(task_id, None)
+            self._running_lanes.pop(task_id, None)
+            self.notify()
+            if parent_task_id:
+                await self._refresh_parent(task_id, parent_task_id)
+
+    async def _finish_unrecorded(self, task_id: str):
+        """A handler that returned without writing a final state leaves the row processing: complete it"""
+        async with self._session_factory() as db:
+            row = (await db.execute(
+                select(Task.status, Task.worker_id).where(Task.task_id == task_id)
+            )).first()
+        if row is not None and row.status == 'processing' and row.worker_id == task_leases.worker_id:
+            logger.warning(f"Task {task_id}: handler returned without a final status - marking completed")
+            await task_progress.finish(task_id, 'completed')
+
+    async def _refresh_parent(self, task_id: str, parent_task_id: str):
+        try:
+            await refresh_parent(parent_task_id, self._session_factory)
+        except Exception as e:
+            logger.error(f"Task {task_id}: refreshing parent {parent_task_id} failed: {e}")
+
+    async def _record_cancelled(self, task_id: str, token):
+        logger.info(f"Task {task_id} cancelled: {token.reason}")
+        await task_progress.finish(
+            task_id, 'cancelled', result={'partial': True, **token.partial} if token.partial else None,
+            error_message=token.reason
+        )
+
+    async def lease_lost(self, task_id: str):
+        """Another worker's reaper requeued a task running here: stop it without recording a result"""
+        # The row belongs to its new owner now: nothing buffered here may be written back
+        task_progress.forget(task_id)
+        if task_id in self.running:
+            self._lost.add(task_id)
+            await task_cancellation.cancel(task_id, "Task lease lost")
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.dispatch()
+            except Exception as e:
+                logger.error(f"Task scheduler dispatch error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the dispatch loop (idempotent; TASK_WORKERS=0 disables it)"""
+        if self.workers > 0 and (self._loop_task is None or self._loop_task.done()):
+            self._loop_task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    async def stats(self) -> Dict[str, Any]:
+        async with self._session_factory() as db:
+            rows = await db.execute(
+                select(Task.priority, func.count())
+                .where(Task.status == 'pending')
+                .group_by(Task.priority)
+            )
+            pending = {lane: count for lane, count in rows.all()}
+        return {
+            'workers': self.workers,
+            'interactive_reserved': self.interactive_reserved,
+            'weights': self.picker.weights,
+            'handlers': sorted(self.handlers),
+            'lanes': {
+                lane: {
+                    'pending': pending.get(lane, 0),
+                    'running': self._running_in(lane),
+                    'dispatched': self.dispatched[lane]
+                }
+                for lane in LANES
+            }
+        }
+
+
+# Global task scheduler
+task_scheduler = TaskScheduler()
+task_leases.on_lost = task_scheduler.lease_lost
+task_leases.on_requeued = lambda task_ids: task_scheduler.notify()
+task_nodes.load = lambda: {
+    'capacity': task_scheduler.workers,
+    'running': len(task_scheduler.running),
+    'task_types': list(task_scheduler.handlers)
+}
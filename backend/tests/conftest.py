@@ -0,0 +1,61 @@
+"""
+Shared fixtures for the task pipeline tests.
+They run against a throwaway SQLite database: DATABASE_URL is pointed at a
+temporary file before core.database is first imported.
+"""
+
+import asyncio
+import os
+import tempfile
+
+import pytest
+
+_DB_DIR = tempfile.mkdtemp(prefix='bi_ads_tests_')
+os.environ['DATABASE_URL'] = f"sqlite+aiosqlite:///{_DB_DIR}/test.db"
+
+
+@pytest.fixture
+def database():
+    """Fresh schema (core.database module); skipped without SQLAlchemy/aiosqlite"""
+    pytest.importorskip('sqlalchemy')
+    pytest.importorskip('aiosqlite')
+    import core.database as database
+
+    database.engine.echo = False
+    return database
+
+
+@pytest.fixture
+def run(database):
+    """Run coroutines on one event loop per test, on an empty database"""
+    loop = asyncio.new_event_loop()
+
+    async def reset():
+        async with database.engine.begin() as conn:
+            await conn.run_sync(database.Base.metadata.drop_all)
+        await database.init_db()
+
+    async def shutdown():
+        # Background work a test left behind (delayed jobs, running handlers)
+        pending = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await database.engine.dispose()
+
+    loop.run_until_complete(reset())
+    yield loop.run_until_complete
+    loop.run_until_complete(shutdown())
+    loop.close()
+
+
+@pytest.fixture
+def account(run, database):
+    """One account the tasks can belong to"""
+    from core import crud
+
+    async def create():
+        async with database.AsyncSessionLocal() as db:
+            return (await crud.create_account(db, {'uid': '100000000000001', 'name': 'Test'})).id
+
+    return run(create())
@@ -0,0 +1,72 @@
+"""
+Browser sessions: recycling only idle sessions, incremental scan dedup
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('selenium')
+pytest.importorskip('sqlalchemy')
+
+from services import facebook_automator
+from services.chrome_manager import ChromeManager, ChromeSession
+from services.facebook_automator import FacebookAutomator
+
+
+class OverLimitSession(ChromeSession):
+    """Session past its recycle limit, without a browser"""
+
+    def __init__(self):
+        super().__init__(1, '100000000000001')
+
+    def sample_resources(self):
+        pass
+
+    def recycle_reason(self):
+        return 'pages'
+
+
+def test_session_in_use_is_not_recycled():
+    manager = ChromeManager(driver_factory=object())
+    session = manager.sessions[1] = OverLimitSession()
+    recycled = []
+
+    async def recycle_session(account_id, reason):
+        recycled.append(account_id)
+        return True
+
+    manager.recycle_session = recycle_session
+
+    async def scenario():
+        with session.use():
+            assert await manager.get_session(1) is session
+            assert recycled == []
+        assert session.in_use == 0
+        await manager.get_session(1)
+
+    asyncio.run(scenario())
+    assert recycled == [1]
+
+
+def test_iter_scan_tail_is_deduplicated(monkeypatch):
+    rounds = [[{'id': '1'}, {'id': '2'}], [{'id': '2'}, {'id': '3'}, {'id': '3'}]]
+    monkeypatch.setattr(facebook_automator, 'extract_new_links', lambda driver, selector, limit: rounds.pop(0))
+
+    class Driver:
+        def execute_script(self, script):
+            return 0
+
+    class Readiness:
+        async def wait(self, *args, **kwargs):
+            # The page never grows: the second round is the tail
+            return False
+
+    automator = FacebookAutomator.__new__(FacebookAutomator)
+    automator.driver = Driver()
+    automator.ready = Readiness()
+
+    async def scan():
+        return [batch async for batch in automator.iter_scan('a', lambda item: item, lambda r: r['id'], 10)]
+
+    assert asyncio.run(scan()) == [[{'id': '1'}, {'id': '2'}], [{'id': '3'}]]
@@ -0,0 +1,127 @@
+"""
+Bulk jobs: per-item checkpoint, resume after a stop and the final flush
+"""
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from core import crud
+from core.database import AsyncSessionLocal
+from core.task_codec import decode_payload
+from services import bulk_jobs
+from services.task_cancellation import TaskCancelled
+
+
+async def _bulk_task(account_id, task_id):
+    async with AsyncSessionLocal() as db:
+        task = await crud.create_task(db, {'task_id': task_id, 'account_id': account_id, 'task_type': 'bulk'})
+        task.status = 'processing'
+        await db.commit()
+
+
+async def _get(task_id):
+    async with AsyncSessionLocal() as db:
+        return await crud.get_task(db, task_id)
+
+
+def test_resume_continues_after_completed_items(run, account):
+    items = list(range(10))
+    processed = []
+
+    async def stop_at_six(item):
+        if item == 6:
+            raise TaskCancelled("stopped")
+        if item == 3:
+            raise ValueError("bad item")
+        processed.append(item)
+
+    async def process(item):
+        processed.append(item)
+
+    async def scenario():
+        await _bulk_task(account, 'b')
+        with pytest.raises(TaskCancelled):
+            await bulk_jobs.run_bulk_items('b', items, stop_at_six, batch_size=4)
+        async with AsyncSessionLocal() as db:
+            stopped = await bulk_jobs.item_counts(db, 'b')
+            task = await crud.get_task(db, 'b')
+            task.status = 'cancelled'
+            await db.commit()
+            resumed = await bulk_jobs.resume_task(db, 'b')
+        before = processed[:]
+        await bulk_jobs.run_bulk_items('b', items, process, batch_size=4)
+        return stopped, resumed, before, await _get('b')
+
+    stopped, resumed, before, task = run(scenario())
+    assert stopped == {'completed': 5, 'failed': 1}
+    # The failed item is tried again, the completed ones are not
+    assert resumed == {'completed': 5, 'failed': 0}
+    assert before == [0, 1, 2, 4, 5]
+    assert processed[len(before):] == [3, 6, 7, 8, 9]
+    assert task.status == 'completed'
+    assert (task.total_items, task.completed_items, task.failed_items) == (10, 10, 0)
+    assert decode_payload(task.result)['success']
+
+
+def test_failed_items_are_counted_and_a_completed_task_is_not_resumed(run, account):
+    async def fail_odd(item):
+        if item % 2:
+            raise ValueError("odd")
+
+    async def scenario():
+        await _bulk_task(account, 'odd')
+        await bulk_jobs.run_bulk_items('odd', list(range(4)), fail_odd)
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'odd')
+            result = decode_payload(task.result)
+            resumed = await bulk_jobs.resume_task(db, 'odd', retry_failed=False)
+        return result, resumed
+
+    result, resumed = run(scenario())
+    assert result['completed'] == 2 and result['failed'] == 2 and not result['success']
+    # A completed task is not resumable
+    assert resumed is None
+
+
+def test_failing_final_flush_does_not_hide_the_job_error(run, account, monkeypatch):
+    async def broken_flush(self):
+        raise RuntimeError("database is locked")
+
+    async def process(item):
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(bulk_jobs.BulkCheckpoint, 'flush', broken_flush)
+    monkeypatch.setattr(bulk_jobs, 'TASK_BULK_MAX_CONSECUTIVE_FAILURES', 1)
+
+    async def scenario():
+        await _bulk_task(account, 'flush')
+        await bulk_jobs.run_bulk_items('flush', [1, 2], process)
+
+    with pytest.raises(TimeoutError):
+        run(scenario())
+
+
+def test_deferred_delay_frees_the_worker_and_resumes_from_the_checkpoint(run, account):
+    processed = []
+
+    async def process(item):
+        processed.append(item)
+
+    async def scenario():
+        await _bulk_task(account, 'paced')
+        deferred = await bulk_jobs.run_bulk_items('paced', [1, 2], process, delay_range=(30, 30), defer_delays=True)
+        waiting = await _get('paced')
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'paced')
+            task.status = 'processing'
+            await db.commit()
+        await bulk_jobs.run_bulk_items('paced', [1, 2], process, delay_range=(30, 30), defer_delays=True)
+        return deferred, waiting, await _get('paced')
+
+    deferred, waiting, task = run(scenario())
+    assert deferred['completed'] == 1 and deferred['remaining'] == 1 and 'resumes_at' in deferred
+    assert waiting.status == 'pending' and waiting.worker_id is None
+    assert waiting.run_at > waiting.created_at and waiting.completed_items == 1
+    assert processed == [1, 2]
+    assert task.status == 'completed' and task.completed_items == 2
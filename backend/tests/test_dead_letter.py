@@ -0,0 +1,58 @@
+"""
+Dead-letter requeue: fan-out parents go through their children
+"""
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('sqlalchemy')
+
+from api.task_manager_api import DeadLetterRequeueRequest, requeue_dead_letter_tasks
+from core import crud
+from core.database import AsyncSessionLocal
+
+
+async def _failed(account_id, task_id, task_type, **fields):
+    async with AsyncSessionLocal() as db:
+        task = await crud.create_task(db, {'task_id': task_id, 'account_id': account_id, 'task_type': task_type})
+        for name, value in fields.items():
+            setattr(task, name, value)
+        task.status = 'failed'
+        task.attempts = 3
+        await db.commit()
+
+
+async def _get(task_id):
+    async with AsyncSessionLocal() as db:
+        return await crud.get_task(db, task_id)
+
+
+def test_failed_parent_resumes_its_children_instead_of_running(run, account):
+    async def scenario():
+        await _failed(account, 'parent', 'fan', child_count=2)
+        await _failed(account, 'c1', 'fan_child', parent_task_id='parent')
+        await _failed(account, 'c2', 'fan_child', parent_task_id='parent')
+        async with AsyncSessionLocal() as db:
+            response = await requeue_dead_letter_tasks(DeadLetterRequeueRequest(task_type='fan'), db)
+        return response, [await _get(task_id) for task_id in ('parent', 'c1', 'c2')]
+
+    response, (parent, c1, c2) = run(scenario())
+    assert response['requeued'] == 0 and response['resumed_children'] == 2
+    assert parent.status == 'pending' and parent.child_count == 2
+    assert (c1.status, c1.attempts) == ('pending', 0)
+    assert (c2.status, c2.attempts) == ('pending', 0)
+
+
+def test_requeued_child_refreshes_its_parent(run, account):
+    async def scenario():
+        await _failed(account, 'parent', 'fan', child_count=2)
+        await _failed(account, 'c1', 'fan_child', parent_task_id='parent')
+        await _failed(account, 'c2', 'fan_child', parent_task_id='parent')
+        async with AsyncSessionLocal() as db:
+            response = await requeue_dead_letter_tasks(DeadLetterRequeueRequest(task_ids=['c1']), db)
+        return response, await _get('parent'), await _get('c1')
+
+    response, parent, child = run(scenario())
+    assert response['requeued'] == 1 and response['task_ids'] == ['c1']
+    assert child.status == 'pending'
+    assert parent.status == 'processing'
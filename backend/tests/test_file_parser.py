@@ -0,0 +1,11 @@
+"""
+File parser: UID lists for the whitelist import
+"""
+
+from services.file_parser import parse_uid_list
+
+
+def test_parse_uid_list_keeps_first_field_and_drops_duplicates():
+    content = "100001\n# comment\n\n100002|user|2fa\n100001\nnot-a-uid\n 100003 , note\n"
+    assert parse_uid_list(content) == ['100001', '100002', '100003']
+    assert parse_uid_list("") == []
@@ -0,0 +1,56 @@
+"""
+Sub account interaction tasks run through the scheduler
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('sqlalchemy')
+
+from api import sub_accounts_api
+from core import crud
+from core.database import AsyncSessionLocal, SubAccount
+from core.task_codec import decode_payload
+from services.task_scheduler import TaskScheduler, task_scheduler
+
+
+def test_sub_account_interact_has_a_handler_that_runs_the_actions(run, account, monkeypatch):
+    calls = []
+
+    class FakeActions:
+        def __init__(self, account_id, task_type, task_id, sub_account_id=None):
+            self.sub_account_id = sub_account_id
+
+        async def __call__(self, action, **kwargs):
+            calls.append((self.sub_account_id, action, kwargs))
+            return {'success': True}
+
+    monkeypatch.setattr(sub_accounts_api, 'AccountActions', FakeActions)
+    assert 'sub_account_interact' in task_scheduler.handlers
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            sub = SubAccount(main_account_id=account, uid='200000000000001')
+            db.add(sub)
+            await db.commit()
+            await crud.create_task(db, {
+                'task_id': 'interact', 'account_id': account, 'task_type': 'sub_account_interact',
+                'params': {'sub_account_id': sub.id, 'target_post_url': 'https://facebook.com/p/1',
+                           'actions': ['like', 'comment'], 'comment_text': 'Hay'}
+            })
+        scheduler = TaskScheduler(workers=1, interactive_reserved=0)
+        scheduler.register('sub_account_interact', task_scheduler.handlers['sub_account_interact'])
+        await scheduler.dispatch()
+        await asyncio.gather(*list(scheduler.running.values()))
+        async with AsyncSessionLocal() as db:
+            return await crud.get_task(db, 'interact'), await db.get(SubAccount, sub.id)
+
+    task, sub = run(scenario())
+    assert [action for _, action, _ in calls] == ['react_to_post', 'comment_on_post']
+    assert calls[1][2]['comment_text'] == 'Hay'
+    assert calls[0][0] == sub.id
+    assert task.status == 'completed'
+    assert decode_payload(task.result)['actions_done'] == ['like', 'comment']
+    assert sub.interaction_count == 2
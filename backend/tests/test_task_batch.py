@@ -0,0 +1,65 @@
+"""
+Batch task creation: one insert, deduplicated against the table and within the batch
+"""
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from sqlalchemy import func, select
+
+from core import crud
+from core.database import ActivityLog, AsyncSessionLocal, Task
+from core.task_codec import PAYLOAD_VERSION, params_hash
+
+
+def _task(account_id, n, **fields):
+    return {'task_id': f'batch_{n}', 'account_id': account_id, 'task_type': 'check_account',
+            'params': {'uid': str(n)}, **fields}
+
+
+def test_bulk_insert_dedupes_within_the_batch(run, account):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            return await crud.create_tasks_bulk(db, [
+                _task(account, 1),
+                _task(account, 2),
+                # Same account/type/params as batch_1 (whitespace only differs)
+                {**_task(account, 3), 'params': {'uid': ' 1 '}},
+                _task(account, 4, idempotency_key='k'),
+                _task(account, 5, idempotency_key='k'),
+            ], {'action': 'create_task', 'message': 'Batch of 5'})
+
+    task_ids, duplicates = run(scenario())
+    assert task_ids == ['batch_1', 'batch_2', 'batch_1', 'batch_4', 'batch_4']
+    assert duplicates == [False, False, True, False, True]
+
+
+def test_bulk_insert_dedupes_against_existing_tasks(run, account):
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await crud.create_task(db, _task(account, 1))
+            await crud.create_task(db, _task(account, 2, idempotency_key='done'))
+            finished = await crud.get_task(db, 'batch_2')
+            finished.status = 'completed'
+            await db.commit()
+            result = await crud.create_tasks_bulk(db, [
+                {**_task(account, 10), 'params': {'uid': '1'}},
+                _task(account, 11, idempotency_key='done'),
+                _task(account, 12),
+            ])
+            count = (await db.execute(select(func.count()).select_from(Task))).scalar()
+            logs = (await db.execute(select(func.count()).select_from(ActivityLog))).scalar()
+            row = await crud.get_task(db, 'batch_12')
+        return result, count, logs, row
+
+    (task_ids, duplicates), count, logs, row = run(scenario())
+    assert task_ids == ['batch_1', 'batch_2', 'batch_12']
+    assert duplicates == [True, True, False]
+    assert count == 3
+    assert logs == 0
+    # Core insert fills what the ORM listener would
+    assert row.status == 'pending' and row.priority == 'normal'
+    assert row.payload_version == PAYLOAD_VERSION
+    assert row.params_hash == params_hash({'uid': '12'})
+    assert row.params == '{"uid":"12"}' and row.target_id == '12'
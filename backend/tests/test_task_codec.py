@@ -0,0 +1,145 @@
+"""
+Task payload codec, params hash and duplicate/idempotency coalescing
+"""
+
+import asyncio
+
+from core.task_codec import (
+    PAYLOAD_VERSION, decode_dict, decode_legacy, decode_payload, encode_payload, indexed_fields, params_hash
+)
+
+
+def test_round_trip_is_compact_and_keeps_unicode():
+    params = {'group_ids': ['1', '2'], 'message': 'Xin chào', 'nested': {'n': 1}}
+    raw = encode_payload(params)
+    assert raw == '{"group_ids":["1","2"],"message":"Xin chào","nested":{"n":1}}'
+    assert decode_payload(raw) == params
+    assert encode_payload(None) is None
+    assert decode_payload(None) is None
+
+
+def test_json_string_values_stay_strings():
+    for value in ('123', '[1]', '{"a": 1}', 'plain'):
+        assert decode_payload(encode_payload(value)) == value
+    assert decode_payload('not json') == 'not json'
+    assert decode_dict('"[1]"') == {}
+
+
+def test_legacy_rows_are_decoded_only_without_payload_version():
+    legacy = "{'uid': '1', 'ok': True}"
+    assert decode_legacy(legacy) == {'uid': '1', 'ok': True}
+    assert decode_payload(legacy, None) == {'uid': '1', 'ok': True}
+    assert decode_payload(legacy, PAYLOAD_VERSION) == legacy
+    # Double-encoded JSON from the old write path
+    assert decode_payload('"{\\"a\\": 1}"', None) == {'a': 1}
+
+
+def test_params_hash_normalizes_order_whitespace_and_none():
+    assert params_hash({'a': ' x ', 'b': 1}) == params_hash({'b': 1, 'a': 'x'})
+    assert params_hash({'a': 1, 'b': None}) == params_hash({'a': 1})
+    assert params_hash(None) == params_hash({})
+    assert params_hash({'a': [1, 2]}) != params_hash({'a': [2, 1]})
+
+
+def test_indexed_fields():
+    fields = indexed_fields({'keyword': 'k', 'group_id': 'g'}, {'status': 'live', 'success': 1})
+    assert fields == {'target_id': 'g', 'result_status': 'live', 'result_success': True}
+    assert indexed_fields('x', None) == {'target_id': None, 'result_status': None, 'result_success': None}
+
+
+def test_identical_pending_task_is_coalesced(run, account):
+    from core import crud
+    from core.database import AsyncSessionLocal
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            base = {'account_id': account, 'task_type': 'scan'}
+            first, created = await crud.create_task_once(
+                db, {**base, 'task_id': crud.new_task_id('scan'), 'params': {'b': 1, 'a': ' x '}}
+            )
+            same, same_created = await crud.create_task_once(
+                db, {**base, 'task_id': crud.new_task_id('scan'), 'params': {'a': 'x', 'b': 1}}
+            )
+            assert created and not same_created
+            assert same.task_id == first.task_id
+
+            first.status = 'completed'
+            await db.commit()
+            again, again_created = await crud.create_task_once(
+                db, {**base, 'task_id': crud.new_task_id('scan'), 'params': {'a': 'x', 'b': 1}}
+            )
+            assert again_created and again.task_id != first.task_id
+
+    run(scenario())
+
+
+def test_idempotency_key_returns_the_same_task_in_any_status(run, account):
+    from core import crud
+    from core.database import AsyncSessionLocal
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            data = {'account_id': account, 'task_type': 'send_message', 'idempotency_key': 'req-1'}
+            first, _ = await crud.create_task_once(db, {**data, 'task_id': 't1', 'params': {'to': '1'}})
+            first.status = 'failed'
+            await db.commit()
+            # Different params, same key: still the original request
+            retry, created = await crud.create_task_once(db, {**data, 'task_id': 't2', 'params': {'to': '2'}})
+            return retry.task_id, created
+
+    assert run(scenario()) == ('t1', False)
+
+
+def test_concurrent_creates_make_one_task(run, account):
+    from core import crud
+    from core.database import AsyncSessionLocal
+
+    async def create(n):
+        async with AsyncSessionLocal() as db:
+            task, created = await crud.create_task_once(
+                db, {'task_id': f'c{n}', 'account_id': account, 'task_type': 'scan', 'params': {'q': 1}}
+            )
+            return task.task_id, created
+
+    async def scenario():
+        return await asyncio.gather(*[create(n) for n in range(5)])
+
+    results = run(scenario())
+    assert len({task_id for task_id, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+
+
+def test_upgrade_rewrites_legacy_rows_and_backfills_params_hash(run, database):
+    from sqlalchemy import text
+
+    def insert_rows(sync_conn):
+        insert = text(
+            "INSERT INTO tasks (task_id, account_id, task_type, status, params, result, payload_version) "
+            "VALUES (:task_id, 1, 'scan', 'completed', :params, :result, :version)"
+        )
+        sync_conn.execute(insert, {'task_id': 'legacy', 'params': "{'group_id': 'g1'}",
+                                   'result': "{'success': True}", 'version': None})
+        sync_conn.execute(insert, {'task_id': 'nohash', 'params': '{"q":"a "}', 'result': '"[1]"',
+                                   'version': PAYLOAD_VERSION})
+
+    def read_rows(sync_conn):
+        rows = sync_conn.execute(text(
+            "SELECT task_id, params, result, params_hash, payload_version, target_id, result_success FROM tasks"
+        ))
+        return {row.task_id: row for row in rows}
+
+    async def scenario():
+        async with database.engine.begin() as conn:
+            await conn.run_sync(insert_rows)
+        await database.init_db()
+        async with database.engine.connect() as conn:
+            return await conn.run_sync(read_rows)
+
+    rows = run(scenario())
+    legacy, nohash = rows['legacy'], rows['nohash']
+    assert legacy.params == '{"group_id":"g1"}'
+    assert legacy.payload_version == PAYLOAD_VERSION
+    assert legacy.params_hash == params_hash({'group_id': 'g1'})
+    assert legacy.target_id == 'g1' and legacy.result_success
+    assert nohash.params_hash == params_hash({'q': 'a'})
+    assert nohash.result == '"[1]"'
@@ -0,0 +1,44 @@
+"""
+Task history listing: accounts are loaded with one query per page
+"""
+
+import pytest
+
+pytest.importorskip('fastapi')
+pytest.importorskip('sqlalchemy')
+
+from sqlalchemy import event
+
+from api.task_manager_api import get_task_history
+from core import crud
+from core.database import AsyncSessionLocal, engine
+
+
+@pytest.mark.parametrize('expand_children', [False, True])
+def test_history_loads_accounts_in_one_query(run, account, expand_children):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            for n in range(5):
+                await crud.create_task(db, {'task_id': f'h{n}', 'account_id': account, 'task_type': 'scan',
+                                            'task_name': 'Scan'})
+            await crud.create_task(db, {'task_id': 'orphan', 'account_id': account + 1000, 'task_type': 'scan',
+                                        'task_name': 'Scan'})
+        event.listen(engine.sync_engine, 'before_cursor_execute', record)
+        try:
+            async with AsyncSessionLocal() as db:
+                return await get_task_history(expand_children=expand_children, db=db)
+        finally:
+            event.remove(engine.sync_engine, 'before_cursor_execute', record)
+
+    rows = run(scenario())
+    assert len(rows) == 6
+    names = {row.task_id: row.account_name for row in rows}
+    assert names['orphan'] is None
+    assert {names[f'h{n}'] for n in range(5)} == {'Test'}
+    account_queries = [sql for sql in statements if 'FROM accounts' in sql]
+    assert len(account_queries) == 1
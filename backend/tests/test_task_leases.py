@@ -0,0 +1,109 @@
+"""
+Task leases: heartbeat, reaping expired leases and the attempt budget
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from core import crud
+from core.database import AsyncSessionLocal
+from services.task_leases import LeaseManager
+from services.task_retry import RETRY_POLICIES, RetryPolicy
+
+
+@pytest.fixture(autouse=True)
+def lease_policy():
+    RETRY_POLICIES['lease_test'] = RetryPolicy(max_attempts=2)
+    yield
+    del RETRY_POLICIES['lease_test']
+
+
+async def _processing(account_id, task_id, worker_id, expires_in, attempts=0):
+    async with AsyncSessionLocal() as db:
+        task = await crud.create_task(db, {'task_id': task_id, 'account_id': account_id, 'task_type': 'lease_test'})
+        task.status = 'processing'
+        task.worker_id = worker_id
+        task.lease_expires_at = datetime.now() + timedelta(seconds=expires_in)
+        task.attempts = attempts
+        await db.commit()
+
+
+async def _get(task_id):
+    async with AsyncSessionLocal() as db:
+        return await crud.get_task(db, task_id)
+
+
+def test_expired_lease_is_requeued_then_failed_when_out_of_attempts(run, account):
+    reaper = LeaseManager(worker_id='reaper')
+
+    async def scenario():
+        await _processing(account, 'crashed', 'dead-node', -5)
+        await _processing(account, 'last_try', 'dead-node', -5, attempts=1)
+        await _processing(account, 'alive', 'other-node', 60)
+        return await reaper.reap(), [await _get(task_id) for task_id in ('crashed', 'last_try', 'alive')]
+
+    counts, (crashed, last_try, alive) = run(scenario())
+    assert counts == {'requeued': 1, 'failed': 1}
+    assert crashed.status == 'pending' and crashed.attempts == 1
+    assert crashed.worker_id is None and crashed.lease_expires_at is None
+    assert crashed.error_class == 'worker_lost'
+    assert last_try.status == 'failed' and last_try.attempts == 2
+    assert alive.status == 'processing' and alive.worker_id == 'other-node'
+
+
+def test_heartbeat_renews_held_leases_and_reports_lost_ones(run, account):
+    worker = LeaseManager(worker_id='me', lease_seconds=30)
+    lost = []
+    worker.on_lost = lost.append
+
+    async def scenario():
+        await _processing(account, 'mine', 'me', 1)
+        await _processing(account, 'taken', 'me', 1)
+        worker.hold('mine')
+        worker.hold('taken')
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'taken')
+            task.status = 'pending'
+            task.worker_id = None
+            await db.commit()
+        return await worker.heartbeat(), await _get('mine')
+
+    renewed, mine = run(scenario())
+    assert renewed == 1
+    assert mine.lease_expires_at > datetime.now() + timedelta(seconds=20)
+    assert lost == ['taken']
+    assert worker.held == {'mine'}
+
+
+def test_reaper_skips_the_tasks_it_holds(run, account):
+    worker = LeaseManager(worker_id='me')
+
+    async def scenario():
+        await _processing(account, 'running_here', 'me', -1)
+        worker.hold('running_here')
+        return await worker.reap(), await _get('running_here')
+
+    counts, task = run(scenario())
+    assert counts == {'requeued': 0, 'failed': 0}
+    assert task.status == 'processing'
+
+
+def test_reconcile_expires_own_orphans_and_leases_unleased_rows(run, account):
+    worker = LeaseManager(worker_id='restarted', lease_seconds=30)
+
+    async def scenario():
+        await _processing(account, 'orphan', 'restarted', 60)
+        await _processing(account, 'unleased', None, 0)
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'unleased')
+            task.lease_expires_at = None
+            await db.commit()
+        return await worker.reconcile(), await _get('orphan'), await _get('unleased')
+
+    counts, orphan, unleased = run(scenario())
+    assert counts['requeued'] == 1
+    assert orphan.status == 'pending'
+    assert unleased.status == 'processing' and unleased.lease_expires_at is not None
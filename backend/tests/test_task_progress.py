@@ -0,0 +1,65 @@
+"""
+Task progress registry: pruning of in-memory states
+"""
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from services.task_cancellation import task_cancellation
+from services.task_progress import TaskProgressRegistry
+
+
+def test_prune_drops_stale_states_not_running_here():
+    registry = TaskProgressRegistry(retention=10)
+    for task_id, status in (('done', 'completed'), ('abandoned', 'processing'), ('running', 'processing'),
+                            ('fresh', 'pending'), ('unflushed', 'failed')):
+        registry.update(task_id, status=status, persist=task_id == 'unflushed')
+        registry._states[task_id].updated_at -= 20
+    registry.update('fresh', progress=1, persist=False)
+    task_cancellation.register('running')
+    try:
+        assert registry.prune() == 2
+    finally:
+        task_cancellation.release('running')
+    assert registry.get('done') is None
+    assert registry.get('abandoned') is None
+    assert registry.get('running')['status'] == 'processing'
+    assert registry.get('fresh') is not None
+    assert registry.get('unflushed') is not None
+
+
+def test_flush_does_not_revive_a_task_requeued_by_another_node(run, account):
+    from datetime import datetime, timedelta
+
+    from core import crud
+    from core.database import AsyncSessionLocal
+    from services.task_leases import LeaseManager, task_leases
+
+    registry = TaskProgressRegistry()
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            task = await crud.create_task(db, {'task_id': 'moved', 'account_id': account, 'task_type': 'job'})
+            task.status = 'processing'
+            task.worker_id = task_leases.worker_id
+            task.lease_expires_at = datetime.now() - timedelta(seconds=5)
+            await db.commit()
+        registry.update('moved', progress=40, status='processing')
+        # Node B reaps the expired lease, then this node's write-behind flush runs
+        assert (await LeaseManager(worker_id='node-b').reap())['requeued'] == 1
+        await registry.flush()
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'moved')
+            return task.status, task.worker_id, task.lease_expires_at, task.progress
+
+    assert run(scenario()) == ('pending', None, None, 0)
+
+
+def test_lost_lease_drops_the_local_state(run):
+    from services.task_progress import task_progress
+    from services.task_scheduler import TaskScheduler
+
+    task_progress.update('lost', progress=10, status='processing')
+    run(TaskScheduler(workers=1).lease_lost('lost'))
+    assert task_progress.get('lost') is None
@@ -0,0 +1,129 @@
+"""
+Retry policies: error classes, backoff, failure streaks and dead-lettering
+"""
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from core import crud
+from core.database import AsyncSessionLocal
+from services.task_retry import RetryEngine, RetryPolicy, RETRY_POLICIES, classify_error
+
+
+class WebDriverException(Exception):
+    """Stand-in with Selenium's exception name"""
+
+
+def test_classify_error():
+    assert classify_error(ConnectionError("net::ERR_PROXY_CONNECTION_FAILED")) == 'proxy'
+    assert classify_error(TimeoutError()) == 'timeout'
+    assert classify_error(ConnectionResetError()) == 'network'
+    assert classify_error(WebDriverException("boom")) == 'browser'
+    assert classify_error(RuntimeError("Account in checkpoint")) == 'auth'
+    assert classify_error(KeyError('x')) == 'unknown'
+
+
+def test_policy_retries_only_retryable_classes_within_budget():
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.should_retry(1, 'proxy')
+    assert policy.should_retry(2, 'timeout')
+    assert not policy.should_retry(3, 'proxy')
+    assert not policy.should_retry(1, 'auth')
+    assert not policy.should_retry(1, 'unknown')
+
+
+def test_send_message_retries_only_proxy_failures():
+    policy = RETRY_POLICIES['send_message']
+    assert policy.should_retry(1, 'proxy')
+    assert not any(policy.should_retry(1, error_class) for error_class in ('network', 'browser', 'timeout'))
+
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=10, max_delay=100, jitter=0)
+    assert [policy.delay(attempt) for attempt in (1, 2, 3, 4, 5)] == [10, 20, 40, 80, 100]
+    assert policy.delay(1, streak_level=2) == 40
+    jittered = RetryPolicy(base_delay=10, jitter=0.5)
+    assert all(5 <= jittered.delay(1) <= 10 for _ in range(50))
+
+
+def test_success_decays_only_its_own_task_type_streaks():
+    engine = RetryEngine(streak_step=2)
+    engine._streaks = {('join_groups', 'proxy'): 4, ('send_message', 'proxy'): 3, ('join_groups', 'timeout'): 1}
+    assert engine.streak_level('proxy') == 3
+
+    engine.record_success('join_groups')
+    assert engine._streaks == {('join_groups', 'proxy'): 2, ('send_message', 'proxy'): 3}
+    assert engine.streak_level('proxy') == 2
+    assert engine.stats()['failure_streaks'] == {'join_groups:proxy': 2, 'send_message:proxy': 3}
+
+
+def _processing_task(account_id, task_id, task_type, attempts=0):
+    async def create():
+        async with AsyncSessionLocal() as db:
+            task = await crud.create_task(db, {'task_id': task_id, 'account_id': account_id, 'task_type': task_type})
+            task.status = 'processing'
+            task.attempts = attempts
+            await db.commit()
+    return create()
+
+
+async def _get(task_id):
+    async with AsyncSessionLocal() as db:
+        return await crud.get_task(db, task_id)
+
+
+@pytest.fixture
+def flaky_policy():
+    RETRY_POLICIES['flaky_test'] = RetryPolicy(max_attempts=2, base_delay=60)
+    yield RETRY_POLICIES['flaky_test']
+    del RETRY_POLICIES['flaky_test']
+
+
+def test_retryable_failure_is_rescheduled(run, account, flaky_policy):
+    engine = RetryEngine()
+
+    async def scenario():
+        await _processing_task(account, 'f1', 'flaky_test')
+        run_at = await engine.handle_failure('f1', 'flaky_test', ConnectionError("ERR_PROXY_CONNECTION_FAILED"))
+        return run_at, await _get('f1')
+
+    run_at, task = run(scenario())
+    assert run_at is not None
+    assert task.status == 'pending' and task.run_at == run_at
+    assert task.attempts == 1 and task.error_class == 'proxy'
+    assert task.worker_id is None
+    assert engine.retried == 1
+
+
+def test_out_of_attempts_or_non_retryable_is_dead_lettered(run, account, flaky_policy):
+    engine = RetryEngine()
+
+    async def scenario():
+        await _processing_task(account, 'last', 'flaky_test', attempts=1)
+        await _processing_task(account, 'bad', 'flaky_test')
+        last = await engine.handle_failure('last', 'flaky_test', TimeoutError("timed out"))
+        bad = await engine.handle_failure('bad', 'flaky_test', ValueError("bad input"))
+        return last, bad, await _get('last'), await _get('bad')
+
+    last, bad, last_task, bad_task = run(scenario())
+    assert last is None and bad is None
+    assert last_task.status == 'failed' and last_task.attempts == 2 and last_task.error_class == 'timeout'
+    assert bad_task.status == 'failed' and bad_task.attempts == 1 and bad_task.error_class == 'unknown'
+    assert engine.dead_lettered == 2
+
+
+def test_cancelled_task_is_not_retried(run, account, flaky_policy):
+    engine = RetryEngine()
+
+    async def scenario():
+        await _processing_task(account, 'gone', 'flaky_test')
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'gone')
+            task.status = 'cancelled'
+            await db.commit()
+        return await engine.handle_failure('gone', 'flaky_test', TimeoutError()), await _get('gone')
+
+    run_at, task = run(scenario())
+    assert run_at is None
+    assert task.status == 'cancelled' and not task.attempts
@@ -0,0 +1,125 @@
+"""
+Task scheduler: lanes, claiming and the final state of handled tasks
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip('sqlalchemy')
+
+from core import crud
+from core.database import AsyncSessionLocal
+from services.task_progress import task_progress
+from services.task_scheduler import TaskScheduler, WeightedLanePicker, priority_for, TASK_BULK_THRESHOLD
+
+
+async def _create(account_id, task_id, task_type='job', **fields):
+    async with AsyncSessionLocal() as db:
+        await crud.create_task(db, {'task_id': task_id, 'account_id': account_id, 'task_type': task_type, **fields})
+
+
+async def _status(task_id):
+    async with AsyncSessionLocal() as db:
+        task = await crud.get_task(db, task_id)
+        return task.status, task.error_message
+
+
+async def _drain(scheduler):
+    while scheduler.running:
+        await asyncio.gather(*list(scheduler.running.values()), return_exceptions=True)
+
+
+def test_weighted_lane_picker_follows_weights():
+    picker = WeightedLanePicker({'interactive': 5, 'normal': 3, 'bulk': 1})
+    picks = [picker.pick(['interactive', 'normal', 'bulk']) for _ in range(9)]
+    assert picks.count('interactive') == 5
+    assert picks.count('normal') == 3
+    assert picks.count('bulk') == 1
+    assert picker.pick(['bulk']) == 'bulk'
+    assert picker.pick([]) is None
+
+
+def test_priority_for_large_lists_goes_to_bulk():
+    assert priority_for('join_groups', {'group_ids': ['1'] * TASK_BULK_THRESHOLD}) == 'bulk'
+    assert priority_for('join_groups', {'group_ids': ['1']}) == 'normal'
+    assert priority_for('check_account', None) == 'normal'
+
+
+def test_interactive_lane_keeps_a_reserved_slot(run, account):
+    started = []
+
+    async def handler(task_id, account_id, params):
+        started.append(task_id)
+        await asyncio.sleep(0.05)
+        await task_progress.finish(task_id, 'completed')
+
+    async def scenario():
+        scheduler = TaskScheduler(workers=2, interactive_reserved=1)
+        scheduler.register('job', handler)
+        for n in range(3):
+            await _create(account, f'bulk{n}', priority='bulk')
+        assert await scheduler.dispatch() == 1
+        await _create(account, 'click', priority='interactive')
+        assert await scheduler.dispatch() == 1
+        await _drain(scheduler)
+
+    run(scenario())
+    assert started[:2] == ['bulk0', 'click']
+
+
+def test_claim_marks_processing_once(run, account):
+    async def scenario():
+        scheduler = TaskScheduler(workers=1, interactive_reserved=0)
+        scheduler.register('job', lambda *args: asyncio.sleep(0))
+        await _create(account, 'only')
+        async with AsyncSessionLocal() as db:
+            first = await scheduler._claim(db, 'normal')
+            second = await scheduler._claim(db, 'normal')
+        async with AsyncSessionLocal() as db:
+            task = await crud.get_task(db, 'only')
+        return first, second, task
+
+    first, second, task = run(scenario())
+    assert first.task_id == 'only'
+    assert second is None
+    assert task.status == 'processing'
+    assert task.worker_id is not None and task.lease_expires_at is not None
+
+
+def test_handler_without_final_status_is_completed(run, account):
+    async def scenario():
+        scheduler = TaskScheduler(workers=1, interactive_reserved=0)
+        scheduler.register('job', lambda *args: asyncio.sleep(0))
+        await _create(account, 'silent')
+        await scheduler.dispatch()
+        await _drain(scheduler)
+        return await _status('silent')
+
+    assert run(scenario()) == ('completed', None)
+
+
+def test_check_account_fails_when_account_is_missing(run, account):
+    from api.account_checker_api import run_check_account
+
+    async def scenario():
+        await _create(account, 'check', task_type='check_account')
+        await run_check_account('check', account + 1000, {})
+        return await _status('check')
+
+    status, error = run(scenario())
+    assert status == 'failed'
+    assert 'not found' in error
+
+
+def test_run_task_rejects_non_object_params(run, account):
+    fastapi = pytest.importorskip('fastapi')
+    from api.task_status_api import run_task
+
+    async def scenario():
+        async with AsyncSessionLocal() as db:
+            await run_task({'task_type': 'job', 'account_id': account, 'params': ['a', 'b']}, db)
+
+    with pytest.raises(fastapi.HTTPException) as error:
+        run(scenario())
+    assert error.value.status_code == 422
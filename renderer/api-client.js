@@ -176,6 +176,52 @@ const apiClient = {
         return await this.request(`/api/task/${taskId}`);
     },
 
+    // Get status of many tasks in one request
+    async getTaskStatuses(taskIds) {
+        return await this.request('/api/task/status/batch', {
+            method: 'POST',
+            body: JSON.stringify({ task_ids: taskIds })
+        });
+    },
+
+    // Live task progress over WebSocket (reconnects automatically).
+    // onUpdate(task) is called for every change; empty taskIds = all tasks.
+    subscribeTaskUpdates(taskIds, onUpdate) {
+        let socket = null;
+        let closed = false;
+        let filter = taskIds || [];
+
+        const connect = () => {
+            socket = new WebSocket(`${API_URL.replace(/^http/, 'ws')}/api/task/ws`);
+            socket.onopen = () => socket.send(JSON.stringify({ subscribe: filter }));
+            socket.onmessage = (event) => {
+                const message = JSON.parse(event.data);
+                if (message.type === 'snapshot') {
+                    Object.values(message.tasks).forEach(onUpdate);
+                } else {
+                    onUpdate(message);
+                }
+            };
+            socket.onclose = () => {
+                if (!closed) setTimeout(connect, 2000);
+            };
+        };
+        connect();
+
+        return {
+            setTaskIds(newTaskIds) {
+                filter = newTaskIds || [];
+                if (socket && socket.readyState === WebSocket.OPEN) {
+                    socket.send(JSON.stringify({ subscribe: filter }));
+                }
+            },
+            close() {
+                closed = true;
+                if (socket) socket.close();
+            }
+        };
+    },
+
     // Account operations
     async getAccounts(skip = 0, limit = 100, status = null) {
         let endpoint = `/api/accounts?skip=${skip}&limit=${limit}`;